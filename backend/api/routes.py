@@ -1,11 +1,133 @@
+import io
 import os
-import uuid
-from flask import Blueprint, request, jsonify, send_file
-from core.config import add_log, get_logs
-from core.downloader import validate_youtube_url, DownloadThread, download_tasks
+import json
+import time
+import threading
+from flask import Blueprint, Response, current_app, g, request, jsonify, send_file
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from core.batch import PlaylistBatch, batch_summary, iter_zip, zip_entries
+from core.cache import VIDEO_QUALITIES, download_cache
+from core.config import CONFIG, LOG_LEVELS, add_log, format_log_record, log_store
+from core.downloader import (
+    validate_youtube_url, validate_playlist_url, create_task, submit_task, download_tasks, update_task
+)
+from core.events import broker
+from core.governor import governor
+from core.info import get_info, info_cache, summarize_info
+from core.metrics import CallbackMetric, REQUESTS, REQUEST_SECONDS, registry
+from core.network import parse_network_options
+from core.postprocess import parse_audio_quality, postprocess_pool
+from core.scheduler import scheduler, QueueFullError
+from core.streaming import is_streamable, iter_growing_file
+from core.upstream import breaker
+from core.workers import process_pool
+from core.ytdl import download_error, ydl_pool
+from core.reaper import TaskReaper, directory_size
+from startup import startup_timer
+
+SUPPORTED_FORMATS = ['mp4', 'mp3', 'm4a', 'wav', 'ogg', 'flac', 'opus']
+
+# The mimetypes module misses or misnames several of these on some platforms
+MEDIA_TYPES = {
+    '.mp4': 'video/mp4',
+    '.webm': 'video/webm',
+    '.mkv': 'video/x-matroska',
+    '.mp3': 'audio/mpeg',
+    '.m4a': 'audio/mp4',
+    '.wav': 'audio/wav',
+    '.ogg': 'audio/ogg',
+    '.oga': 'audio/ogg',
+    '.flac': 'audio/flac',
+    '.opus': 'audio/ogg; codecs=opus',
+}
 
 api_bp = Blueprint('api', __name__)
 temp_directories = set()
+reaper = TaskReaper(temp_directories)
+
+@api_bp.before_request
+def _start_request_timer():
+    g.request_started = time.monotonic()
+
+@api_bp.after_request
+def _record_request_metrics(response):
+    # Streamed bodies (events, stream-through, ZIPs) are timed up to their first byte
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    started = g.get('request_started')
+    if started is not None:
+        REQUEST_SECONDS.observe(time.monotonic() - started, route=route, method=request.method)
+    REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    return response
+
+def _parse_download_request(data, validate_url=validate_youtube_url, url_error='Invalid YouTube URL'):
+    """Validate the fields of a download request.
+
+    Returns (params, None) on success and (None, error message) otherwise.
+    """
+    if not isinstance(data, dict):
+        return None, 'Invalid JSON data'
+
+    url = data.get('url')
+    format_type = data.get('format', 'mp4')
+    quality = data.get('quality')
+    priority = data.get('priority', 0)
+
+    if not url:
+        add_log("URL is not specified", 'WARNING')
+        return None, 'URL is required'
+
+    if format_type not in SUPPORTED_FORMATS:
+        add_log(f"Invalid format: {format_type}", 'WARNING')
+        return None, f"Invalid format. Choose from {', '.join(SUPPORTED_FORMATS)}"
+
+    if not isinstance(url, str) or not validate_url(url):
+        add_log(f"Invalid URL: {url}", 'WARNING')
+        return None, url_error
+
+    if not isinstance(priority, int) or isinstance(priority, bool):
+        add_log(f"Invalid priority: {priority}", 'WARNING')
+        return None, 'Priority must be an integer'
+
+    if quality is not None and quality not in VIDEO_QUALITIES:
+        add_log(f"Invalid quality: {quality}", 'WARNING')
+        return None, f"Invalid quality. Choose from {', '.join(VIDEO_QUALITIES)}"
+
+    audio_quality, error = parse_audio_quality(data.get('audio_quality'))
+    if error:
+        add_log(f"Invalid audio quality: {data.get('audio_quality')}", 'WARNING')
+        return None, error
+
+    network, error = parse_network_options(data.get('network'))
+    if error:
+        add_log(f"Invalid network options: {error}", 'WARNING')
+        return None, error
+
+    stream = data.get('stream', False)
+    if not isinstance(stream, bool):
+        return None, 'stream must be a boolean'
+    if stream and not is_streamable(format_type, quality):
+        add_log(f"Streaming not available for {format_type} ({quality})", 'WARNING')
+        return None, 'Streaming is only available for single-stream downloads: mp4 (auto, medium or low quality) or m4a'
+
+    return {'url': url, 'format_type': format_type, 'quality': quality, 'priority': priority,
+            'audio_quality': audio_quality, 'network': network, 'stream': stream}, None
+
+def _start_download(params):
+    """Create and submit a task for validated params and return its ID.
+
+    Raises QueueFullError after discarding the task.
+    """
+    fields = {'stream': True} if params['stream'] else {}
+    task_id = create_task(params['url'], params['format_type'], **fields)
+    try:
+        submit_task(task_id, params['url'], params['format_type'], params['quality'],
+                    params['priority'], temp_directories, network=params['network'],
+                    audio_quality=params['audio_quality'], stream=params['stream'])
+    except QueueFullError:
+        download_tasks.pop(task_id, None)
+        add_log(f"Download queue is full, rejecting task: {task_id}", 'WARNING')
+        raise
+    return task_id
 
 @api_bp.route('/download', methods=['POST'])
 def download_video():
@@ -13,66 +135,205 @@ def download_video():
         add_log("Received download request")
         
         if not request.is_json:
-            add_log("Request is not in JSON format")
+            add_log("Request is not in JSON format", 'WARNING')
             return jsonify({'error': 'Content-Type must be application/json'}), 400
         
         data = request.get_json()
         if not data:
-            add_log("Failed to parse JSON data")
+            add_log("Failed to parse JSON data", 'WARNING')
             return jsonify({'error': 'Invalid JSON data'}), 400
         
         add_log(f"Received data: {data}")
         
-        url = data.get('url')
-        format_type = data.get('format', 'mp4')
-        quality = data.get('quality')
-
-        if not url:
-            add_log("URL is not specified")
-            return jsonify({'error': 'URL is required'}), 400
+        params, error = _parse_download_request(data)
+        if error:
+            return jsonify({'error': error}), 400
 
-        if format_type not in ['mp4', 'mp3', 'm4a', 'wav', 'ogg', 'flac', 'opus']:
-            add_log(f"Invalid format: {format_type}")
-            return jsonify({'error': 'Invalid format. Choose from mp4, mp3, m4a, wav, ogg, flac, opus'}), 400
+        try:
+            task_id = _start_download(params)
+        except QueueFullError as e:
+            return _queue_full_response(e)
 
-        if not validate_youtube_url(url):
-            add_log(f"Invalid YouTube URL: {url}")
-            return jsonify({'error': 'Invalid YouTube URL'}), 400
+        status = _task_status(task_id)
+        return jsonify({'task_id': task_id, 'status': status['status'], 'queue_position': status['queue_position']})
+        
+    except Exception as e:
+        add_log(f"Download request processing error: {e}", 'ERROR')
+        return jsonify({'error': f'Internal server error: {e}'}), 500
 
-        task_id = str(uuid.uuid4())
-        add_log(f"Generated Task ID: {task_id}")
+@api_bp.route('/download/batch', methods=['POST'])
+def download_batch():
+    data = request.get_json(silent=True)
+    items = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'A non-empty list of items is required'}), 400
+    if len(items) > CONFIG['BATCH_MAX_ITEMS']:
+        return jsonify({'error': f"At most {CONFIG['BATCH_MAX_ITEMS']} items per request"}), 400
 
-        download_tasks[task_id] = {
-            'status': 'processing',
-            'format': format_type,
-            'url': url
-        }
+    add_log(f"Received batch download request with {len(items)} items")
+    results = []
+    for index, item in enumerate(items):
+        params, error = _parse_download_request(item)
+        if error:
+            results.append({'index': index, 'error': error})
+            continue
+        try:
+            task_id = _start_download(params)
+        except QueueFullError as e:
+            results.append({'index': index, 'error': 'Download queue is full', 'retry_after': e.retry_after})
+            continue
+        results.append({'index': index, 'task_id': task_id})
 
-        thread = DownloadThread(url, format_type, task_id, quality, temp_directories)
-        thread.start()
+    # Look up the resulting states together once every item is submitted
+    statuses = _task_statuses([result['task_id'] for result in results if 'task_id' in result])
+    for result in results:
+        status = statuses.get(result.get('task_id'))
+        if status is not None:
+            result['status'] = status['status']
+            result['queue_position'] = status['queue_position']
 
-        add_log(f"Download task started: {task_id}")
-        return jsonify({'task_id': task_id, 'status': 'processing'})
-        
-    except Exception as e:
-        add_log(f"Download request processing error: {e}")
-        return jsonify({'error': f'Internal server error: {e}'}), 500
+    accepted = sum(1 for result in results if 'task_id' in result)
+    return jsonify({'results': results, 'accepted': accepted, 'rejected': len(results) - accepted})
 
-@api_bp.route('/status/<task_id>', methods=['GET'])
-def check_status(task_id):
-    if task_id not in download_tasks:
-        return jsonify({'error': 'Task not found'}), 404
+def _queue_full_response(error):
+    response = jsonify({'error': 'Download queue is full', 'retry_after': error.retry_after})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
 
-    task = download_tasks[task_id]
-    return jsonify({
+def _status_payload(task, queue_position):
+    return {
         'status': task['status'],
         'format': task['format'],
         'url': task['url'],
         'error': task.get('error'),
         'progress': task.get('progress'),
-        'speed': task.get('speed')
+        'speed': task.get('speed'),
+        'downloaded_bytes': task.get('downloaded_bytes'),
+        'total_bytes': task.get('total_bytes'),
+        'queue_position': queue_position
+    }
+
+def _task_status(task_id):
+    """Build the public status payload for a task, or None if it is unknown."""
+    task = download_tasks.get(task_id)
+    if task is None:
+        return None
+
+    queue_position = scheduler.queue_position(task_id) if task['status'] == 'queued' else None
+    return _status_payload(task, queue_position)
+
+def _task_statuses(task_ids):
+    """Build status payloads for the known tasks among task_ids."""
+    tasks = download_tasks.get_many(task_ids)
+    positions = scheduler.queue_positions() if any(t['status'] == 'queued' for t in tasks.values()) else {}
+    return {
+        task_id: _status_payload(task, positions.get(task_id) if task['status'] == 'queued' else None)
+        for task_id, task in tasks.items()
+    }
+
+def _bulk_status_response(task_ids):
+    if not task_ids:
+        return jsonify({'error': 'At least one task ID is required'}), 400
+    if len(task_ids) > CONFIG['BATCH_MAX_ITEMS']:
+        return jsonify({'error': f"At most {CONFIG['BATCH_MAX_ITEMS']} task IDs per request"}), 400
+
+    statuses = _task_statuses(task_ids)
+    return jsonify({
+        'tasks': statuses,
+        'missing': [task_id for task_id in task_ids if task_id not in statuses]
     })
 
+@api_bp.route('/status', methods=['GET'])
+def check_status_many():
+    task_ids = [task_id for task_id in request.args.get('ids', '').split(',') if task_id]
+    return _bulk_status_response(task_ids)
+
+@api_bp.route('/status/batch', methods=['POST'])
+def check_status_batch():
+    data = request.get_json(silent=True)
+    task_ids = data.get('ids') if isinstance(data, dict) else None
+    if not isinstance(task_ids, list) or not all(isinstance(task_id, str) for task_id in task_ids):
+        return jsonify({'error': 'ids must be a list of task IDs'}), 400
+    return _bulk_status_response(task_ids)
+
+@api_bp.route('/status/<task_id>', methods=['GET'])
+def check_status(task_id):
+    status = _task_status(task_id)
+    if status is None:
+        return jsonify({'error': 'Task not found'}), 404
+    return jsonify(status)
+
+@api_bp.route('/info', methods=['GET'])
+def video_info():
+    url = request.args.get('url', '')
+    if not validate_youtube_url(url):
+        return jsonify({'error': 'Invalid YouTube URL'}), 400
+
+    try:
+        info, cached = get_info(url)
+    except download_error() as e:
+        add_log(f"Info extraction failed: {e}", 'WARNING')
+        return jsonify({'error': str(e)}), 502
+
+    payload = summarize_info(info)
+    payload['cached'] = cached
+    return jsonify(payload)
+
+def _event_stream(subscription, task_ids):
+    """Yield Server-Sent Events for changed tasks, with periodic heartbeats."""
+    heartbeat = CONFIG['SSE_HEARTBEAT_INTERVAL']
+    # With a shared store the job may run in another process, so poll as well
+    wait = min(CONFIG['SSE_POLL_INTERVAL'], heartbeat) if download_tasks.shared else heartbeat
+    idle = 0
+    last_sent = {}
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            for task_id in sorted(task_ids):
+                status = _task_status(task_id)
+                if status is None or last_sent.get(task_id) == status:
+                    continue
+                last_sent[task_id] = status
+                payload = json.dumps(dict(status, task_id=task_id))
+                yield f"event: status\ndata: {payload}\n\n"
+
+                # A single-task stream ends once the task is finished
+                if subscription.task_id is not None and status['status'] in ('completed', 'error'):
+                    return
+
+            task_ids = subscription.wait(wait)
+            if task_ids:
+                idle = 0
+                continue
+
+            if download_tasks.shared:
+                task_ids = {subscription.task_id} if subscription.task_id else set(download_tasks)
+            idle += wait
+            if idle >= heartbeat:
+                idle = 0
+                yield ": heartbeat\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+def _event_response(stream):
+    response = Response(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@api_bp.route('/events/<task_id>', methods=['GET'])
+def task_events(task_id):
+    if task_id not in download_tasks:
+        return jsonify({'error': 'Task not found'}), 404
+
+    subscription = broker.subscribe(task_id)
+    return _event_response(_event_stream(subscription, {task_id}))
+
+@api_bp.route('/events', methods=['GET'])
+def all_events():
+    subscription = broker.subscribe()
+    return _event_response(_event_stream(subscription, set(download_tasks)))
+
 @api_bp.route('/download/<task_id>', methods=['GET'])
 def get_download(task_id):
     if task_id not in download_tasks:
@@ -83,15 +344,234 @@ def get_download(task_id):
         return jsonify({'error': 'Download not completed yet'}), 400
 
     file_path = task['file_path']
-    if not os.path.exists(file_path):
+    as_attachment = request.args.get('inline', 'false').lower() != 'true'
+    ext = os.path.splitext(file_path)[1] or f".{task['format']}"
+    filename = f"download{ext}"
+
+    if current_app.config['USE_X_SENDFILE']:
+        # The fronting server sends the file, so the end of the transfer is never seen
+        if not os.path.exists(file_path):
+            return jsonify({'error': 'File not found'}), 404
+        response = send_file(file_path, as_attachment=as_attachment, download_name=filename,
+                             mimetype=MEDIA_TYPES.get(ext.lower()),
+                             etag=_file_etag(file_path, os.stat(file_path)))
+        update_task(task_id, fetched_at=time.time())
+        return response
+
+    # The reaper expires the task a while after the transfer has finished
+    try:
+        f = _FetchTrackingFile(file_path, lambda: update_task(task_id, fetched_at=time.time()))
+    except FileNotFoundError:
         return jsonify({'error': 'File not found'}), 404
+    stat = os.fstat(f.fileno())
+
+    # Passing the open file keeps wsgi.file_wrapper (and so sendfile) in play
+    # for full transfers; ranges are answered below by make_conditional.
+    response = send_file(f, as_attachment=as_attachment, download_name=filename,
+                         mimetype=MEDIA_TYPES.get(ext.lower()),
+                         etag=_file_etag(file_path, stat), last_modified=stat.st_mtime,
+                         conditional=False)
+    response.content_length = stat.st_size
+    try:
+        return response.make_conditional(request.environ, accept_ranges=True, complete_length=stat.st_size)
+    except RequestedRangeNotSatisfiable:
+        f.close(notify=False)
+        raise
+
+@api_bp.route('/stream/<task_id>', methods=['GET'])
+def stream_download(task_id):
+    """Send a download while it is still running, as a chunked response.
+
+    Finished downloads are served by get_download, with range support.
+    """
+    task = download_tasks.get(task_id)
+    if task is None:
+        return jsonify({'error': 'Task not found'}), 404
+    if task['status'] == 'completed':
+        return get_download(task_id)
+    if task['status'] == 'error':
+        return jsonify({'error': f"Download failed: {task.get('error')}"}), 400
+    if not task.get('stream'):
+        return jsonify({'error': 'Streaming was not requested for this download'}), 400
+
+    ext = f".{task['format']}"
+    disposition = 'inline' if request.args.get('inline', 'false').lower() == 'true' else 'attachment'
+
+    def generate():
+        yield from iter_growing_file(task_id)
+        update_task(task_id, fetched_at=time.time())
+
+    response = Response(generate(), mimetype=MEDIA_TYPES.get(ext))
+    response.headers['Content-Disposition'] = f'{disposition}; filename=download{ext}'
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+class _FetchTrackingFile(io.FileIO):
+    """Read-only file that calls on_close once the server is done sending it."""
+
+    def __init__(self, path, on_close):
+        super().__init__(path, 'rb')
+        self._on_close = on_close
 
-    filename = f"download.{task['format']}"
-    return send_file(file_path, as_attachment=True, download_name=filename)
+    def close(self, notify=True):
+        if self.closed:
+            return
+        super().close()
+        if notify:
+            self._on_close()
+
+def _file_etag(file_path, stat):
+    """Strong ETag for a finished download.
+
+    Cache lookups touch the mtime of cached files, so those are identified by
+    their cache key and size instead.
+    """
+    cache_dir = os.path.abspath(download_cache.directory)
+    if os.path.dirname(os.path.abspath(file_path)) == cache_dir:
+        key = os.path.splitext(os.path.basename(file_path))[0]
+        return f"{key}-{stat.st_size:x}"
+    return f"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+@api_bp.route('/playlist', methods=['POST'])
+def download_playlist():
+    data = request.get_json(silent=True)
+    params, error = _parse_download_request(data, validate_playlist_url, 'Invalid YouTube playlist URL')
+    if error:
+        return jsonify({'error': error}), 400
+    if params['stream']:
+        add_log("Streaming requested for a playlist", 'WARNING')
+        return jsonify({'error': 'Streaming is not available for playlists'}), 400
+
+    url, format_type = params['url'], params['format_type']
+    quality, priority = params['quality'], params['priority']
+    concurrency = data.get('concurrency', CONFIG['PLAYLIST_CONCURRENCY'])
+    if not isinstance(concurrency, int) or isinstance(concurrency, bool) or concurrency < 1:
+        return jsonify({'error': 'Concurrency must be a positive integer'}), 400
+
+    # A single batch never takes more than the whole worker pool
+    concurrency = min(concurrency, scheduler.max_workers)
+    batch_id = create_task(url, format_type, type='playlist', children=[])
+    batch = PlaylistBatch(url, format_type, batch_id, quality, priority, concurrency,
+                          temp_directories, params['network'], params['audio_quality'])
+    try:
+        position = scheduler.submit(batch, priority)
+    except QueueFullError as e:
+        download_tasks.pop(batch_id, None)
+        return _queue_full_response(e)
+
+    add_log(f"Playlist batch queued: {batch_id} (position {position})", task_id=batch_id)
+    return jsonify({'batch_id': batch_id, 'status': 'queued', 'queue_position': position})
+
+@api_bp.route('/playlist/<batch_id>', methods=['GET'])
+def playlist_status(batch_id):
+    summary = batch_summary(batch_id)
+    if summary is None:
+        return jsonify({'error': 'Playlist not found'}), 404
+    return jsonify(summary)
+
+@api_bp.route('/playlist/<batch_id>/zip', methods=['GET'])
+def playlist_zip(batch_id):
+    summary = batch_summary(batch_id)
+    if summary is None:
+        return jsonify({'error': 'Playlist not found'}), 404
+    if summary['status'] != 'completed':
+        return jsonify({'error': 'Playlist not completed yet'}), 400
+
+    entries = zip_entries(batch_id)
+    if not entries:
+        return jsonify({'error': 'File not found'}), 404
+
+    def generate():
+        yield from iter_zip(entries)
+        # Only a fully sent archive counts as fetching its files
+        now = time.time()
+        for _, _, task_id in entries:
+            update_task(task_id, fetched_at=now)
+        update_task(batch_id, fetched_at=now)
+
+    response = Response(generate(), mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename=playlist.zip'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @api_bp.route('/logs', methods=['GET'])
 def fetch_logs():
-    return jsonify({'logs': get_logs()})
+    since = request.args.get('since', 0, type=int)
+    task_id = request.args.get('task_id')
+    level = request.args.get('level')
+    if level is not None:
+        level = level.upper()
+        if level not in LOG_LEVELS:
+            return jsonify({'error': f"Invalid level. Choose from {', '.join(LOG_LEVELS)}"}), 400
+
+    records, cursor = log_store.since(since, task_id=task_id, level=level)
+    return jsonify({
+        'logs': [format_log_record(record) for record in records],
+        'entries': records,
+        'cursor': cursor
+    })
+
+@api_bp.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    stats = download_cache.stats()
+    stats['info'] = info_cache.stats()
+    return jsonify(stats)
+
+@api_bp.route('/reaper/stats', methods=['GET'])
+def reaper_stats():
+    return jsonify(reaper.stats())
+
+@api_bp.route('/resources', methods=['GET'])
+def resource_stats():
+    stats = governor.stats()
+    stats['scheduler'] = scheduler.stats()
+    stats['postprocessing'] = postprocess_pool.stats()
+    stats['youtubedl_pool'] = ydl_pool.stats()
+    stats['process_pool'] = dict(process_pool.stats(), enabled=CONFIG['EXECUTION_BACKEND'] == 'process')
+    stats['upstream'] = breaker.stats()
+    return jsonify(stats)
+
+def _cache_lookups():
+    values = {}
+    for name, cache in (('download', download_cache), ('info', info_cache)):
+        stats = cache.stats()
+        values[(name, 'hit')] = stats['hits']
+        values[(name, 'miss')] = stats['misses']
+    return values
+
+def _job_counts():
+    scheduler_stats = scheduler.stats()
+    postprocess_stats = postprocess_pool.stats()
+    return {
+        ('download', 'active'): scheduler_stats['active'],
+        ('download', 'queued'): scheduler_stats['queued'],
+        ('postprocess', 'active'): postprocess_stats['running'],
+        ('postprocess', 'queued'): postprocess_stats['queued'],
+    }
+
+registry.register(CallbackMetric(
+    'ytdl_cache_lookups_total', 'Download and info cache lookups by result.',
+    _cache_lookups, 'counter', ('cache', 'result')))
+registry.gauge('ytdl_cache_bytes', 'Bytes held by the download cache.',
+               lambda: download_cache.stats()['bytes'])
+registry.gauge('ytdl_jobs', 'Download and post-processing jobs by state.', _job_counts, ('pool', 'state'))
+registry.gauge('ytdl_ffmpeg_running', 'Post-processors holding an ffmpeg slot.',
+               lambda: governor.stats()['ffmpeg']['running'])
+registry.gauge('ytdl_threads', 'Live threads in this process.', threading.active_count)
+registry.gauge('ytdl_upstream_circuit_open', 'Whether the upstream circuit breaker is open (1), half-open (0.5) or closed (0).',
+               lambda: {'closed': 0, 'half_open': 0.5, 'open': 1}[breaker.state])
+registry.gauge('ytdl_download_concurrency_limit', 'Download jobs allowed to run at once.', lambda: scheduler.limit)
+registry.gauge('ytdl_worker_processes', 'Download worker processes by state.',
+               lambda: {(state,): process_pool.stats()[state] for state in ('idle', 'busy')}, ('state',))
+registry.gauge('ytdl_temp_disk_bytes', 'Bytes in temporary download directories.',
+               lambda: sum(directory_size(d) for d in list(temp_directories)))
+registry.gauge('ytdl_startup_phase_seconds', 'Seconds each startup phase took in this process.',
+               lambda: {(name,): seconds for name, seconds in startup_timer.durations().items()}, ('phase',))
+
+@api_bp.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
 
 @api_bp.route('/update-yt-dlp', methods=['POST'])
 def update_yt_dlp():
@@ -2,16 +2,20 @@ import os
 import sys
 import atexit
 import shutil
-from flask import Flask, jsonify
+from flask import Flask, abort, jsonify, request
 from flask_cors import CORS
-from static_server import start_static_server
-from core.config import add_log
-from api.routes import api_bp, temp_directories
+from static_server import frontend_dist_dir, load_static_assets
+from startup import startup_timer
+from core.config import CONFIG, add_log
+from api.routes import api_bp, temp_directories, reaper
+from core.recovery import recover_jobs, recoverable_dirs
+from core.ytdl import preload
 
 app = Flask(__name__)
+app.config['USE_X_SENDFILE'] = CONFIG['USE_X_SENDFILE']
 
 # Config CORS with environment
-cors_origins = os.environ.get('CORS_ORIGINS', 'http://localhost:5173,http://127.0.0.1:5173')
+cors_origins = os.environ.get('CORS_ORIGINS', 'http://localhost:5173,http://127.0.0.1:5173,http://127.0.0.1:5000')
 CORS(app, origins=cors_origins.split(','))
 
 # Register modular routes
@@ -19,7 +23,11 @@ app.register_blueprint(api_bp)
 
 def cleanup_temp_files():
     """Cleanup temporary downloaded files upon exit."""
+    # Partial and finished downloads the job journal resumes on the next start
+    keep = recoverable_dirs()
     for temp_dir in list(temp_directories):
+        if temp_dir in keep:
+            continue
         try:
             if os.path.exists(temp_dir):
                 shutil.rmtree(temp_dir)
@@ -30,22 +38,45 @@ def cleanup_temp_files():
 
 atexit.register(cleanup_temp_files)
 
+# Expire finished tasks and their temp files while the server runs
+reaper.start()
+
+# The built frontend, when there is one, is served from memory by this process
+with startup_timer.phase('static'):
+    static_assets = load_static_assets()
+if static_assets is not None:
+    add_log(f"Serving {len(static_assets)} frontend file(s) from {static_assets.static_dir}")
+
 @app.route('/')
 def index():
-    """Root path ping / health check for internal readiness."""
+    """Root path ping / health check for internal readiness.
+
+    Browsers asking for HTML get the frontend instead.
+    """
+    if (static_assets is not None and static_assets.index is not None
+            and request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'text/html'):
+        return static_assets.response(request, static_assets.index)
     return jsonify({'message': 'YouTube Downloader API is running', 'status': 'ok'})
 
+def frontend_asset(path):
+    """Files of the built frontend; the API's own routes take precedence."""
+    asset = static_assets.find(path)
+    if asset is None:
+        abort(404)
+    return static_assets.response(request, asset)
+
+if static_assets is not None:
+    app.add_url_rule('/<path:path>', view_func=frontend_asset)
+
 if __name__ == '__main__':
     is_production = getattr(sys, 'frozen', False)
+    recover_jobs(temp_directories)
+    # yt-dlp is imported while the server starts listening
+    preload()
     
-    if is_production:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        frontend_dist = os.path.join(base_dir, 'frontend', 'dist')
-        if os.path.exists(frontend_dist):
-            start_static_server(frontend_dist, port=5173)
-        else:
-            print("Warning: Frontend build dist not found")
-            print(f"Looked in: {frontend_dist}")
+    if is_production and static_assets is None:
+        print("Warning: Frontend build dist not found")
+        print(f"Looked in: {frontend_dist_dir()}")
     
     debug_mode = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
     app.run(
@@ -0,0 +1,67 @@
+"""Helpers shared by the benchmark scripts."""
+import http.client
+import json
+import os
+import socket
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def to_ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def wait_until_ready(port, timeout=30, process=None):
+    """Poll / until the server answers 200. Gives up early if process exits."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def request_json(port, method, path, body=None, conn=None, timeout=10):
+    """Send a request and return (status, decoded JSON body)."""
+    conn = conn or http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    headers = {}
+    payload = None
+    if body is not None:
+        payload = json.dumps(body)
+        headers['Content-Type'] = 'application/json'
+    conn.request(method, path, payload, headers)
+    response = conn.getresponse()
+    data = response.read()
+    return response.status, json.loads(data) if data else None
+
+
+def write_results(results, output=None):
+    text = json.dumps(results, indent=2)
+    print(text)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text)
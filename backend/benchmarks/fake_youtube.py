@@ -0,0 +1,196 @@
+"""Offline stand-in for YouTube used by the benchmark suite.
+
+MediaServer serves synthetic MP4 files over HTTP, with range requests, an
+optional per-connection rate limit and an optional share of requests that
+are answered with 429 Too Many Requests, like a throttling upstream. FakeYoutubeIE replaces yt-dlp's
+extractors and resolves watch URLs to files on that server, so whole jobs
+run without network access.
+
+Run as a script, it serves the API with waitress as webview_app does:
+
+    python benchmarks/fake_youtube.py --port 5000 --media-url http://127.0.0.1:8000
+"""
+import argparse
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchlib import BACKEND_DIR  # noqa: F401 (puts the backend on sys.path)
+
+import yt_dlp
+from yt_dlp.extractor.common import InfoExtractor
+
+BLOCK = bytes(64 * 1024)
+
+
+def video_id(kind, n):
+    """Watch ID whose first character selects the media profile on the server."""
+    return f'{kind}{n:010d}'
+
+
+def watch_url(vid):
+    return f'https://www.youtube.com/watch?v={vid}'
+
+
+class MediaServer:
+    """Serves /media/<kind>/<id>.mp4 with the size, rate and 429 share configured for kind."""
+
+    def __init__(self, sizes, rates=None, throttled=None, seed=0):
+        self.sizes = sizes
+        self.rates = rates or {}
+        self.throttled = throttled or {}
+        self.throttled_responses = 0
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _throttle(self, kind):
+        share = self.throttled.get(kind)
+        if not share:
+            return False
+        with self._random_lock:
+            throttled = self._random.random() < share
+            self.throttled_responses += throttled
+        return throttled
+
+    def _handler(self):
+        media = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                match = re.match(r'^/media/(\w)/[\w-]+\.mp4$', self.path)
+                size = media.sizes.get(match.group(1)) if match else None
+                if size is None:
+                    self.send_error(404)
+                    return
+                if media._throttle(match.group(1)):
+                    self.send_response(429)
+                    self.send_header('Retry-After', '1')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                start, end = 0, size - 1
+                requested = re.match(r'^bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+                if requested:
+                    start = int(requested.group(1))
+                    if requested.group(2):
+                        end = min(int(requested.group(2)), size - 1)
+                    if start > end:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f'bytes */{size}')
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+                else:
+                    self.send_response(200)
+                self.send_header('Content-Type', 'video/mp4')
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('Content-Length', str(end - start + 1))
+                self.end_headers()
+                self._send(end - start + 1, media.rates.get(match.group(1)))
+
+            def _send(self, length, rate):
+                sent = 0
+                started = time.monotonic()
+                while sent < length:
+                    chunk = BLOCK[:min(len(BLOCK), length - sent)]
+                    try:
+                        self.wfile.write(chunk)
+                    except (BrokenPipeError, ConnectionResetError):
+                        return
+                    sent += len(chunk)
+                    if rate:
+                        ahead = sent / rate - (time.monotonic() - started)
+                        if ahead > 0:
+                            time.sleep(ahead)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class FakeYoutubeIE(InfoExtractor):
+    """Resolves YouTube watch URLs to a single progressive MP4 on a MediaServer."""
+
+    _VALID_URL = r'https?://(?:www\.)?youtube\.com/watch\?v=(?P<id>[0-9A-Za-z_-]{11})'
+    media_url = None
+
+    def _real_extract(self, url):
+        vid = self._match_id(url)
+        return {
+            'id': vid,
+            'title': f'Benchmark {vid}',
+            'duration': 60,
+            'formats': [{
+                'format_id': '18',
+                'url': f'{self.media_url}/media/{vid[0]}/{vid}.mp4',
+                'ext': 'mp4',
+                'vcodec': 'avc1.42001E',
+                'acodec': 'mp4a.40.2',
+            }],
+        }
+
+
+def install(media_url):
+    """Make every YoutubeDL in this process use FakeYoutubeIE only."""
+    FakeYoutubeIE.media_url = media_url
+    yt_dlp.YoutubeDL.add_default_info_extractors = lambda self: self.add_info_extractor(FakeYoutubeIE())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the API against a fake YouTube')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--media-url', required=True)
+    parser.add_argument('--workers', type=int, help='MAX_CONCURRENT_DOWNLOADS')
+    parser.add_argument('--work-dir', help='temp and cache directory, a new one if omitted')
+    parser.add_argument('--upstream-cooldown', type=float, help='UPSTREAM_COOLDOWN, seconds')
+    parser.add_argument('--upstream-max-cooldown', type=float, help='UPSTREAM_MAX_COOLDOWN, seconds')
+    parser.add_argument('--retry-delay', type=float, help='UPSTREAM_RETRY_BASE_DELAY, seconds')
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='fake-youtube-')
+    tempfile.tempdir = work_dir
+
+    # CONFIG is read when the app modules are imported
+    from core.config import CONFIG
+    CONFIG['CACHE_DIR'] = os.path.join(work_dir, 'cache')
+    if args.workers:
+        CONFIG['MAX_CONCURRENT_DOWNLOADS'] = args.workers
+    if args.upstream_cooldown:
+        CONFIG['UPSTREAM_COOLDOWN'] = args.upstream_cooldown
+    if args.upstream_max_cooldown:
+        CONFIG['UPSTREAM_MAX_COOLDOWN'] = args.upstream_max_cooldown
+    if args.retry_delay:
+        CONFIG['UPSTREAM_RETRY_BASE_DELAY'] = args.retry_delay
+    install(args.media_url)
+
+    from waitress import serve
+    from app import app
+    serve(app, host='127.0.0.1', port=args.port, threads=CONFIG['SERVER_THREADS'])
+
+
+if __name__ == '__main__':
+    main()
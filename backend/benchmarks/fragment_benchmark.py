@@ -0,0 +1,113 @@
+"""Fragment download benchmark against a local HLS fixture server.
+
+Serves an HLS playlist whose segments each take --latency seconds to start
+and downloads it with yt-dlp at several concurrent fragment settings, using
+the same network options a DownloadThread would. Prints JSON results.
+
+    cd backend
+    python benchmarks/fragment_benchmark.py --fragments 1 4 8
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchlib import write_results
+
+
+def make_handler(segments, segment_bytes, latency):
+    payload = os.urandom(segment_bytes)
+    playlist = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:2', '#EXT-X-MEDIA-SEQUENCE:0']
+    for n in range(segments):
+        playlist += ['#EXTINF:2.0,', f'seg-{n}.ts']
+    playlist = ('\n'.join(playlist + ['#EXT-X-ENDLIST']) + '\n').encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if self.path.startswith('/stream.m3u8'):
+                body, content_type = playlist, 'application/vnd.apple.mpegurl'
+            elif self.path.startswith('/seg-'):
+                # Simulate a high-latency origin: each request waits before answering
+                time.sleep(latency)
+                body, content_type = payload, 'video/mp2t'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def run_download(url, fragments, work_dir):
+    import yt_dlp
+    from core.network import network_ydl_opts
+
+    out_dir = tempfile.mkdtemp(dir=work_dir)
+    opts = {
+        'outtmpl': os.path.join(out_dir, 'download.%(ext)s'),
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+        'fixup': 'never',
+        'hls_prefer_native': True,
+    }
+    opts.update(network_ydl_opts({'concurrent_fragments': fragments}))
+    started = time.monotonic()
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        ydl.download([url])
+    elapsed = time.monotonic() - started
+    size = sum(os.path.getsize(os.path.join(out_dir, name)) for name in os.listdir(out_dir))
+    shutil.rmtree(out_dir, ignore_errors=True)
+    return elapsed, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fragments', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--segments', type=int, default=40)
+    parser.add_argument('--segment-kb', type=int, default=512)
+    parser.add_argument('--latency', type=float, default=0.1, help='seconds before each segment response')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(args.segments, args.segment_kb * 1024, args.latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/stream.m3u8'
+
+    work_dir = tempfile.mkdtemp(prefix='fragment-bench-')
+    results = []
+    try:
+        for fragments in args.fragments:
+            elapsed, size = run_download(url, fragments, work_dir)
+            results.append({
+                'concurrent_fragments': fragments,
+                'seconds': round(elapsed, 3),
+                'bytes': size,
+                'mb_per_s': round(size / 1024 / 1024 / elapsed, 2),
+            })
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = results[0]['seconds'] if results else None
+    for result in results:
+        result['speedup'] = round(baseline / result['seconds'], 2)
+
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
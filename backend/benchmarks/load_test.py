@@ -0,0 +1,182 @@
+"""Load test comparing gunicorn serving profiles.
+
+Starts the API under each GUNICORN_PROFILE, holds many idle /events
+connections open, polls /status from several clients and downloads a
+large completed file at the same time. Prints JSON results.
+
+    cd backend
+    python benchmarks/load_test.py --profiles sync gthread --idle 200
+"""
+import argparse
+import http.client
+import os
+import select
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchlib import BACKEND_DIR, free_port, percentile, wait_until_ready, write_results
+
+
+def seed_tasks(store_path, work_dir, file_mb):
+    from core.task_store import SQLiteTaskStore
+
+    file_path = os.path.join(work_dir, 'large.mp4')
+    with open(file_path, 'wb') as f:
+        f.truncate(file_mb * 1024 * 1024)
+
+    store = SQLiteTaskStore(store_path)
+    store['bench-status'] = {'status': 'processing', 'format': 'mp4', 'url': '', 'progress': 42.0}
+    store['bench-file'] = {'status': 'completed', 'format': 'mp4', 'url': '',
+                           'file_path': file_path, 'finished_at': time.time()}
+
+
+def open_idle_streams(port, count):
+    """Open event-stream connections and return the sockets that got a response."""
+    opened = []
+    for _ in range(count):
+        try:
+            sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+            sock.sendall(b'GET /events HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n')
+            opened.append(sock)
+        except OSError:
+            pass
+
+    # Give the server a few seconds in total to answer every stream
+    established = []
+    pending = set(opened)
+    deadline = time.monotonic() + 5
+    while pending and time.monotonic() < deadline:
+        readable, _, _ = select.select(list(pending), [], [], max(0.0, deadline - time.monotonic()))
+        for sock in readable:
+            pending.discard(sock)
+            try:
+                if sock.recv(1024).startswith(b'HTTP/1.1 200'):
+                    established.append(sock)
+                    continue
+            except OSError:
+                pass
+            sock.close()
+    for sock in pending:
+        sock.close()
+    return established
+
+
+def poll_status(port, duration, latencies, errors):
+    deadline = time.monotonic() + duration
+    conn = None
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/status/bench-status')
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                raise OSError(f"HTTP {response.status}")
+            latencies.append(time.monotonic() - started)
+        except (OSError, http.client.HTTPException):
+            errors.append(time.monotonic() - started)
+            if conn is not None:
+                conn.close()
+            conn = None
+
+
+def fetch_file(port, results):
+    started = time.monotonic()
+    received = 0
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        conn.request('GET', '/download/bench-file')
+        response = conn.getresponse()
+        while True:
+            chunk = response.read(1024 * 1024)
+            if not chunk:
+                break
+            received += len(chunk)
+        results.append({'ok': response.status == 200, 'bytes': received,
+                        'seconds': time.monotonic() - started})
+    except (OSError, http.client.HTTPException) as e:
+        results.append({'ok': False, 'bytes': received, 'error': str(e),
+                        'seconds': time.monotonic() - started})
+
+
+def run_profile(profile, args):
+    work_dir = tempfile.mkdtemp(prefix=f'loadtest-{profile}-')
+    store_path = os.path.join(work_dir, 'tasks.db')
+    seed_tasks(store_path, work_dir, args.file_mb)
+
+    port = free_port()
+    env = dict(os.environ, GUNICORN_PROFILE=profile, TASK_STORE='sqlite', TASK_STORE_PATH=store_path)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py',
+         '-b', f'127.0.0.1:{port}', '--access-logfile', os.devnull, 'app:app'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not wait_until_ready(port):
+            return {'profile': profile, 'error': 'server did not become ready'}
+
+        streams = open_idle_streams(port, args.idle)
+
+        latencies, errors, transfers = [], [], []
+        threads = [threading.Thread(target=poll_status, args=(port, args.duration, latencies, errors))
+                   for _ in range(args.pollers)]
+        threads += [threading.Thread(target=fetch_file, args=(port, transfers))
+                    for _ in range(args.transfers)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        for sock in streams:
+            sock.close()
+
+        completed = [t for t in transfers if t['ok']]
+        return {
+            'profile': profile,
+            'idle_streams_requested': args.idle,
+            'idle_streams_established': len(streams),
+            'status_requests': len(latencies),
+            'status_errors': len(errors),
+            'status_rps': round(len(latencies) / elapsed, 1),
+            'status_p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            'status_p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+            'transfers_completed': len(completed),
+            'transfers_failed': len(transfers) - len(completed),
+            'transfer_mb_per_s': round(
+                sum(t['bytes'] for t in completed) / 1024 / 1024 / max(elapsed, 1e-9), 1),
+        }
+    finally:
+        server.terminate()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profiles', nargs='+', default=['sync', 'gthread'])
+    parser.add_argument('--idle', type=int, default=200, help='idle /events connections')
+    parser.add_argument('--pollers', type=int, default=10, help='concurrent /status pollers')
+    parser.add_argument('--transfers', type=int, default=2, help='concurrent large file downloads')
+    parser.add_argument('--file-mb', type=int, default=256)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to poll for')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = [run_profile(profile, args) for profile in args.profiles]
+    write_results(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
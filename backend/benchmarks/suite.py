@@ -0,0 +1,398 @@
+"""End-to-end benchmark suite that runs offline against a fake YouTube.
+
+Starts benchmarks/fake_youtube.py (the API with a stub extractor) against a
+local media server and runs these scenarios:
+
+    startup  - seconds until the API answers, and the import time of app.py
+    burst    - many jobs submitted at once: submit latency and jobs/sec
+    pollers  - status latency under concurrent pollers and idle /events clients
+    memory   - resident memory added per active (throttled) download job
+    large    - one large job: download time, delivery rate and stream-through
+               time to first byte
+    degraded - goodput of a burst while the media server answers a share of
+               requests with 429, and how often jobs still fail. Backoff and
+               circuit cooldown are scaled down by --retry-delay and
+               --upstream-cooldown so that the run stays short
+
+Prints JSON results. With --baseline, metrics that are worse than the
+baseline by more than --tolerance are reported and the exit code is 1.
+
+    cd backend
+    python benchmarks/suite.py --output results.json
+    python benchmarks/suite.py --baseline results.json --tolerance 0.25
+
+load_test.py compares gunicorn profiles and fragment_benchmark.py measures
+fragment concurrency; both share benchlib with this suite.
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchlib import (
+    BACKEND_DIR, free_port, percentile, request_json, to_ms, wait_until_ready, write_results
+)
+from fake_youtube import MediaServer, video_id, watch_url
+
+SCENARIOS = ('startup', 'burst', 'pollers', 'memory', 'large', 'degraded')
+
+# Whether a larger value is better, for the baseline comparison
+HIGHER_IS_BETTER = {
+    'jobs_per_sec': True,
+    'status_rps': True,
+    'delivery_mb_per_s': True,
+    'download_mb_per_s': True,
+    'goodput_jobs_per_sec': True,
+}
+LOWER_IS_BETTER_SUFFIXES = ('_ms', '_seconds', '_bytes_per_job')
+
+
+class AppServer:
+    """The API running in fake_youtube.py in a subprocess."""
+
+    def __init__(self, media_url, workers, extra_args=()):
+        self.port = free_port()
+        self.work_dir = tempfile.mkdtemp(prefix='bench-suite-')
+        self.started = time.monotonic()
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(BACKEND_DIR, 'benchmarks', 'fake_youtube.py'),
+             '--port', str(self.port), '--media-url', media_url,
+             '--workers', str(workers), '--work-dir', self.work_dir, *extra_args],
+            cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        if not wait_until_ready(self.port, process=self.process):
+            self.stop()
+            raise RuntimeError('API server did not become ready')
+        self.ready_seconds = time.monotonic() - self.started
+
+    def rss_bytes(self):
+        """Resident set size of the server process (Linux only)."""
+        try:
+            with open(f'/proc/{self.process.pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return None
+
+    def submit(self, vid, **fields):
+        status, data = request_json(self.port, 'POST', '/download', {'url': watch_url(vid), 'format': 'mp4', **fields})
+        if status != 200:
+            raise RuntimeError(f"Submit failed with HTTP {status}: {data}")
+        return data['task_id']
+
+    def wait_for(self, task_ids, statuses=('completed',), timeout=300):
+        """Poll bulk status until every task reached one of statuses. Returns the statuses.
+
+        A failed task raises, unless 'error' is one of statuses.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            _, data = request_json(self.port, 'POST', '/status/batch', {'ids': list(task_ids)})
+            tasks = data['tasks']
+            if 'error' not in statuses and any(task.get('status') == 'error' for task in tasks.values()):
+                raise RuntimeError(f"Job failed: {tasks}")
+            if all(task.get('status') in statuses for task in tasks.values()):
+                return tasks
+            time.sleep(0.05)
+        raise RuntimeError(f"Timed out waiting for {len(task_ids)} tasks")
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+def _run_threads(target, count, *args):
+    threads = [threading.Thread(target=target, args=args) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def bench_startup(media, args):
+    ready = []
+    for _ in range(args.startup_runs):
+        server = AppServer(media.url, args.workers)
+        ready.append(server.ready_seconds)
+        server.stop()
+
+    imports = []
+    for _ in range(args.startup_runs):
+        started = time.monotonic()
+        subprocess.run([sys.executable, '-c', 'import app'], cwd=BACKEND_DIR, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        imports.append(time.monotonic() - started)
+
+    return {
+        'ready_ms': to_ms(statistics.median(ready)),
+        'import_ms': to_ms(statistics.median(imports)),
+        'runs': args.startup_runs,
+    }
+
+
+def bench_burst(server, args):
+    ids = iter(range(args.burst))
+    lock = threading.Lock()
+    task_ids, latencies = [], []
+
+    def submitter():
+        while True:
+            with lock:
+                n = next(ids, None)
+            if n is None:
+                return
+            started = time.monotonic()
+            task_id = server.submit(video_id('s', n))
+            with lock:
+                latencies.append(time.monotonic() - started)
+                task_ids.append(task_id)
+
+    started = time.monotonic()
+    _run_threads(submitter, args.clients)
+    server.wait_for(task_ids)
+    elapsed = time.monotonic() - started
+    return {
+        'jobs': args.burst,
+        'clients': args.clients,
+        'jobs_per_sec': round(args.burst / elapsed, 2),
+        'submit_p50_ms': to_ms(percentile(latencies, 50)),
+        'submit_p99_ms': to_ms(percentile(latencies, 99)),
+    }
+
+
+def _open_idle_streams(port, count):
+    streams = []
+    for _ in range(count):
+        try:
+            sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+            sock.sendall(b'GET /events HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n')
+            streams.append(sock)
+        except OSError:
+            pass
+    return streams
+
+
+def bench_pollers(server, args):
+    # Keep slow jobs running so the pollers see live progress updates
+    busy = [server.submit(video_id('w', n)) for n in range(args.workers)]
+    streams = _open_idle_streams(server.port, args.idle)
+    latencies, errors = [], []
+
+    def poller():
+        conn = None
+        deadline = time.monotonic() + args.duration
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                conn = conn or http.client.HTTPConnection('127.0.0.1', server.port, timeout=5)
+                status, _ = request_json(server.port, 'GET', f'/status/{busy[0]}', conn=conn)
+                if status != 200:
+                    raise OSError(f"HTTP {status}")
+                latencies.append(time.monotonic() - started)
+            except (OSError, http.client.HTTPException):
+                errors.append(time.monotonic() - started)
+                if conn is not None:
+                    conn.close()
+                conn = None
+
+    _run_threads(poller, args.pollers)
+    for sock in streams:
+        sock.close()
+    server.wait_for(busy)
+    return {
+        'pollers': args.pollers,
+        'idle_streams': len(streams),
+        'status_requests': len(latencies),
+        'status_errors': len(errors),
+        'status_rps': round(len(latencies) / args.duration, 1),
+        'status_p50_ms': to_ms(percentile(latencies, 50)),
+        'status_p99_ms': to_ms(percentile(latencies, 99)),
+    }
+
+
+def bench_memory(server, args):
+    baseline = server.rss_bytes()
+    if baseline is None:
+        return {'error': 'resident memory is only measured on Linux'}
+
+    task_ids = [server.submit(video_id('w', 1000 + n)) for n in range(args.workers)]
+    server.wait_for(task_ids, statuses=('processing',))
+    # Let every job get past extraction and into its transfer
+    time.sleep(1.0)
+    active = server.rss_bytes()
+    server.wait_for(task_ids)
+    return {
+        'active_jobs': args.workers,
+        'baseline_rss_bytes': baseline,
+        'active_rss_bytes': active,
+        'rss_bytes_per_job': max(0, active - baseline) // args.workers,
+    }
+
+
+def _read_body(port, path):
+    """GET path and return (seconds to first byte, total seconds, bytes)."""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    started = time.monotonic()
+    conn.request('GET', path)
+    response = conn.getresponse()
+    first_byte = None
+    received = 0
+    while True:
+        chunk = response.read(1024 * 1024)
+        if not chunk:
+            break
+        if first_byte is None:
+            first_byte = time.monotonic() - started
+        received += len(chunk)
+    conn.close()
+    if response.status != 200:
+        raise RuntimeError(f"GET {path} returned HTTP {response.status}")
+    return first_byte, time.monotonic() - started, received
+
+
+def bench_large(server, args):
+    size = args.large_mb * 1024 * 1024
+
+    started = time.monotonic()
+    task_id = server.submit(video_id('l', 0))
+    server.wait_for([task_id])
+    download_seconds = time.monotonic() - started
+    _, delivery_seconds, received = _read_body(server.port, f'/download/{task_id}')
+
+    # Stream-through delivers while the next copy is still downloading
+    stream_id = server.submit(video_id('l', 1), stream=True)
+    stream_first_byte, stream_seconds, streamed = _read_body(server.port, f'/stream/{stream_id}')
+
+    return {
+        'file_bytes': size,
+        'download_seconds': round(download_seconds, 3),
+        'download_mb_per_s': round(size / 1024 / 1024 / download_seconds, 1),
+        'delivery_mb_per_s': round(received / 1024 / 1024 / delivery_seconds, 1),
+        'stream_first_byte_ms': to_ms(stream_first_byte),
+        'stream_seconds': round(stream_seconds, 3),
+        'stream_complete': streamed == size,
+    }
+
+
+def bench_degraded(server, args, media):
+    throttled_before = media.throttled_responses
+    started = time.monotonic()
+    task_ids = [server.submit(video_id('t', n)) for n in range(args.degraded_jobs)]
+    tasks = server.wait_for(task_ids, statuses=('completed', 'error'), timeout=600)
+    elapsed = time.monotonic() - started
+
+    completed = sum(1 for task in tasks.values() if task.get('status') == 'completed')
+    _, resources = request_json(server.port, 'GET', '/resources')
+    return {
+        'jobs': args.degraded_jobs,
+        'throttled_share': args.throttled_share,
+        'throttled_responses': media.throttled_responses - throttled_before,
+        'completed': completed,
+        'failed': len(task_ids) - completed,
+        'goodput_jobs_per_sec': round(completed / elapsed, 2),
+        'goodput_mb_per_s': round(completed * args.small_kb / 1024 / elapsed, 2),
+        'circuit_opened': resources['upstream']['opened'],
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a message for every metric that regressed beyond tolerance."""
+    regressions = []
+    for scenario, metrics in results.items():
+        for name, value in metrics.items():
+            before = baseline.get(scenario, {}).get(name)
+            if not isinstance(value, (int, float)) or isinstance(value, bool) or not before:
+                continue
+            if HIGHER_IS_BETTER.get(name):
+                worse = value < before * (1 - tolerance)
+            elif name.endswith(LOWER_IS_BETTER_SUFFIXES):
+                worse = value > before * (1 + tolerance)
+            else:
+                continue
+            if worse:
+                regressions.append(f"{scenario}.{name}: {before} -> {value}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--workers', type=int, default=3, help='MAX_CONCURRENT_DOWNLOADS of the server')
+    parser.add_argument('--burst', type=int, default=50, help='jobs submitted in the burst')
+    parser.add_argument('--clients', type=int, default=10, help='concurrent submitting clients')
+    parser.add_argument('--pollers', type=int, default=20, help='concurrent /status pollers')
+    parser.add_argument('--idle', type=int, default=100, help='idle /events connections')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds to poll for')
+    parser.add_argument('--small-kb', type=int, default=256, help='size of burst jobs')
+    parser.add_argument('--large-mb', type=int, default=64, help='size of the large-file job')
+    parser.add_argument('--slow-rate-kb', type=int, default=512, help='per-job rate of throttled jobs, KiB/s')
+    parser.add_argument('--degraded-jobs', type=int, default=20, help='jobs submitted while upstream throttles')
+    parser.add_argument('--throttled-share', type=float, default=0.3, help='share of media requests answered with 429')
+    parser.add_argument('--retry-delay', type=float, default=0.25, help='retry backoff base of the degraded server, s')
+    parser.add_argument('--upstream-cooldown', type=float, default=2.0, help='circuit cooldown of the degraded server, s')
+    parser.add_argument('--upstream-max-cooldown', type=float, default=8.0,
+                        help='longest circuit cooldown of the degraded server, s')
+    parser.add_argument('--startup-runs', type=int, default=3)
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    parser.add_argument('--baseline', help='results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression')
+    args = parser.parse_args()
+
+    slow_bytes = max(args.slow_rate_kb * 1024 * (int(args.duration) + 2), args.small_kb * 1024)
+    media = MediaServer(
+        sizes={'s': args.small_kb * 1024, 'l': args.large_mb * 1024 * 1024, 'w': slow_bytes,
+               't': args.small_kb * 1024},
+        rates={'w': args.slow_rate_kb * 1024},
+        throttled={'t': args.throttled_share},
+    ).start()
+
+    results = {}
+    try:
+        if 'startup' in args.scenarios:
+            results['startup'] = bench_startup(media, args)
+        for scenario in ('burst', 'pollers', 'memory', 'large', 'degraded'):
+            if scenario not in args.scenarios:
+                continue
+            # A fresh server per scenario keeps caches and memory independent
+            if scenario == 'degraded':
+                server = AppServer(media.url, args.workers, ('--retry-delay', str(args.retry_delay),
+                                                             '--upstream-cooldown', str(args.upstream_cooldown),
+                                                             '--upstream-max-cooldown', str(args.upstream_max_cooldown)))
+                extra = (media,)
+            else:
+                server = AppServer(media.url, args.workers)
+                extra = ()
+            try:
+                results[scenario] = globals()[f'bench_{scenario}'](server, args, *extra)
+            finally:
+                server.stop()
+    finally:
+        media.stop()
+
+    write_results(results, args.output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"Regression: {message}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+import os
+import re
+import threading
+import time
+import zipfile
+from collections import deque
+
+from core.config import CONFIG, add_log
+from core.downloader import create_task, download_tasks, submit_task, update_task
+from core.scheduler import QueueFullError
+from core.ytdl import ydl_pool
+
+CHANNEL_ROOT_PATTERN = re.compile(r'^(https?://(www\.)?youtube\.com/(@[^/?#]+|channel/[^/?#]+|c/[^/?#]+|user/[^/?#]+))/?$')
+UNSAFE_FILENAME_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+class PlaylistBatch:
+    """Scheduler job that flattens a playlist into child download tasks.
+
+    The batch only holds a worker while the playlist is extracted. Children
+    are then submitted to the scheduler like normal downloads, at most
+    `concurrency` at a time, and the next one is started whenever a child
+    finishes.
+    """
+
+    def __init__(self, url, format_type, batch_id, quality=None, priority=0,
+                 concurrency=None, temp_directories=None, network=None, audio_quality=None):
+        self.url = url
+        self.format_type = format_type
+        self.task_id = batch_id
+        self.task_ids = [batch_id]
+        self.quality = quality
+        self.priority = priority
+        self.concurrency = concurrency or CONFIG['PLAYLIST_CONCURRENCY']
+        self.temp_directories = temp_directories
+        self.network = network
+        self.audio_quality = audio_quality
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._running = 0
+
+    def run(self):
+        update_task(self.task_id, status='processing')
+        add_log(f"Extracting playlist: {self.url}", task_id=self.task_id)
+        try:
+            title, entries = self._extract()
+        except Exception as e:
+            add_log(f"Playlist extraction error: {e}", 'ERROR', self.task_id)
+            self.fail(str(e))
+            return
+        if not entries:
+            self.fail('Playlist has no videos')
+            return
+
+        children = []
+        for index, entry in enumerate(entries, 1):
+            url = f"https://www.youtube.com/watch?v={entry['id']}"
+            task_id = create_task(url, self.format_type, batch_id=self.task_id,
+                                  title=entry.get('title'), index=index)
+            children.append(task_id)
+            self._pending.append((task_id, url))
+        update_task(self.task_id, title=title, children=children)
+        add_log(f"Playlist has {len(children)} videos, downloading {self.concurrency} at a time", task_id=self.task_id)
+        self._fill()
+
+    def fail(self, error):
+        update_task(self.task_id, status='error', error=error, finished_at=time.time())
+
+    def _extract(self):
+        url = self.url
+        # A channel's home page lists its tabs, not its videos
+        match = CHANNEL_ROOT_PATTERN.match(url)
+        if match:
+            url = match.group(1) + '/videos'
+
+        opts = {
+            'skip_download': True,
+            'extract_flat': 'in_playlist',
+            'playlistend': CONFIG['PLAYLIST_MAX_ENTRIES'],
+        }
+        with ydl_pool.borrow(opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+
+        # Skip nested playlists and anything else that is not a single video
+        entries = [
+            entry for entry in info.get('entries') or []
+            if entry and entry.get('id') and entry.get('ie_key', 'Youtube') == 'Youtube'
+        ]
+        return info.get('title'), entries
+
+    def _fill(self):
+        """Submit pending children until the batch's concurrency limit is reached."""
+        while True:
+            with self._lock:
+                if not self._pending or self._running >= self.concurrency:
+                    break
+                task_id, url = self._pending.popleft()
+                self._running += 1
+
+            try:
+                job = submit_task(task_id, url, self.format_type, self.quality, self.priority,
+                                  self.temp_directories, network=self.network,
+                                  audio_quality=self.audio_quality)
+            except QueueFullError:
+                job = None  # the child task is already marked as failed
+
+            if job is None:
+                with self._lock:
+                    self._running -= 1
+            else:
+                job.add_done_callback(self._child_done)
+        self._check_finished()
+
+    def _child_done(self):
+        with self._lock:
+            self._running -= 1
+        self._fill()
+
+    def _check_finished(self):
+        with self._lock:
+            if self._pending or self._running:
+                return
+        summary = batch_summary(self.task_id)
+        if summary is None or summary['status'] in ('completed', 'error'):
+            return
+        status = 'completed' if summary['completed'] else 'error'
+        fields = {'status': status, 'progress': 100.0, 'finished_at': time.time()}
+        if status == 'error':
+            fields['error'] = 'Every video in the playlist failed'
+        update_task(self.task_id, **fields)
+        add_log(f"Playlist finished: {summary['completed']} completed, {summary['failed']} failed", task_id=self.task_id)
+
+
+def batch_summary(batch_id):
+    """Aggregate status of a playlist batch and its children, or None if unknown."""
+    batch = download_tasks.get(batch_id)
+    if batch is None or batch.get('type') != 'playlist':
+        return None
+
+    children = []
+    for task_id in batch.get('children', []):
+        task = download_tasks.get(task_id)
+        if task is None:
+            continue
+        children.append({
+            'task_id': task_id,
+            'title': task.get('title'),
+            'status': task['status'],
+            'progress': 100.0 if task['status'] == 'completed' else task.get('progress') or 0.0,
+            'error': task.get('error'),
+        })
+
+    completed = sum(1 for child in children if child['status'] == 'completed')
+    failed = sum(1 for child in children if child['status'] == 'error')
+    total = len(batch.get('children', []))
+    # Finished children count as done whether or not they succeeded
+    done = sum(100.0 if child['status'] in ('completed', 'error') else child['progress'] for child in children)
+    return {
+        'batch_id': batch_id,
+        'status': batch['status'],
+        'url': batch['url'],
+        'format': batch['format'],
+        'title': batch.get('title'),
+        'error': batch.get('error'),
+        'total': total,
+        'completed': completed,
+        'failed': failed,
+        'progress': done / total if total else 0.0,
+        'children': children,
+    }
+
+
+def zip_entries(batch_id):
+    """Return (archive name, file path, task_id) for each completed child of a batch."""
+    entries = []
+    for task_id in download_tasks.get(batch_id, {}).get('children', []):
+        task = download_tasks.get(task_id)
+        if not task or task['status'] != 'completed' or not os.path.exists(task['file_path']):
+            continue
+        title = UNSAFE_FILENAME_CHARS.sub('_', task.get('title') or task_id).strip()[:150]
+        ext = os.path.splitext(task['file_path'])[1]
+        entries.append((f"{task.get('index', 0):03d} - {title}{ext}", task['file_path'], task_id))
+    return entries
+
+
+class _StreamBuffer:
+    """Write-only, unseekable file object whose contents are drained as they are written."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip(entries, chunk_size=1024 * 1024):
+    """Yield a ZIP archive of entries while it is being built.
+
+    Media files are already compressed, so they are stored as-is. The
+    output stream is not seekable, which makes zipfile write sizes in data
+    descriptors instead of going back to patch the local headers.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for arcname, path, _ in entries:
+            with open(path, 'rb') as source, archive.open(arcname, 'w', force_zip64=True) as target:
+                while True:
+                    chunk = source.read(chunk_size)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+    yield buffer.drain()
@@ -0,0 +1,197 @@
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlparse, parse_qs
+
+from core.config import CONFIG, add_log
+
+VIDEO_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+TEMP_PREFIX = '.tmp-'
+# mp4 qualities with their own format selector; anything else downloads as 'auto'
+VIDEO_QUALITIES = ('highest', 'high', 'medium', 'low', 'auto')
+
+
+def extract_video_id(url):
+    """Return the canonical video ID of a supported YouTube URL, or None."""
+    try:
+        parsed = urlparse(url)
+    except Exception:
+        return None
+
+    host = parsed.netloc.lower()
+    path = parsed.path.strip('/')
+    video_id = None
+    if host.endswith('youtu.be'):
+        video_id = path.split('/')[0]
+    elif path == 'watch':
+        video_id = parse_qs(parsed.query).get('v', [None])[0]
+    elif path.startswith(('embed/', 'shorts/')):
+        video_id = path.split('/')[1]
+
+    if video_id and VIDEO_ID_PATTERN.match(video_id):
+        return video_id
+    return None
+
+
+def normalize_quality(quality):
+    """Map a video quality to one of VIDEO_QUALITIES; missing or unknown values mean 'auto'."""
+    return quality if quality in VIDEO_QUALITIES else 'auto'
+
+
+def cache_key(url, format_type, quality=None, audio_quality=None, stream=False):
+    """Build the cache key for a request, or None if the URL has no video ID."""
+    video_id = extract_video_id(url)
+    if video_id is None:
+        return None
+    if format_type == 'mp4':
+        key = f"{video_id}-{format_type}-{normalize_quality(quality)}"
+    else:
+        # Audio is converted to the requested format at the requested quality
+        key = f"{video_id}-{format_type}-q{audio_quality if audio_quality is not None else 'default'}"
+    # Streamed files are neither fixed up nor converted, so they never stand in for regular ones
+    return f"{key}-stream" if stream else key
+
+
+class DownloadCache:
+    """Size-bounded LRU cache of finished downloads on disk.
+
+    Entries are stored as ``<key>.<ext>`` inside the cache directory and are
+    published with an atomic rename, so readers never see a partial file.
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or CONFIG['CACHE_DIR']
+        self.max_bytes = max_bytes or CONFIG['CACHE_MAX_BYTES']
+        self._lock = threading.Lock()
+        self._fill_locks = {}  # key -> [lock, holders and waiters]
+        self._entries = None  # key -> (path, size), least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def reset(self, directory=None):
+        """Forget the in-memory index and counters, optionally switching directory."""
+        with self._lock:
+            if directory is not None:
+                self.directory = directory
+            self._entries = None
+            self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, record=True):
+        """Return the cached file for key and mark it recently used, or None.
+
+        Pass record=False for repeated lookups on behalf of a request whose
+        hit or miss has already been counted.
+        """
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(key)
+            if entry is None or not os.path.exists(entry[0]):
+                entries.pop(key, None)
+                if record:
+                    self.misses += 1
+                return None
+            entries.move_to_end(key)
+            if record:
+                self.hits += 1
+        try:
+            os.utime(entry[0])  # persist LRU order across restarts
+        except OSError:
+            pass
+        return entry[0]
+
+    def put(self, key, source_path):
+        """Move a finished download into the cache and return its cached path."""
+        os.makedirs(self.directory, exist_ok=True)
+        ext = os.path.splitext(source_path)[1]
+        final_path = os.path.join(self.directory, key + ext)
+        fd, temp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=self.directory)
+        os.close(fd)
+        shutil.move(source_path, temp_path)
+        os.replace(temp_path, final_path)
+        size = os.path.getsize(final_path)
+
+        with self._lock:
+            entries = self._load()
+            entries[key] = (final_path, size)
+            entries.move_to_end(key)
+            self._evict(entries, keep=key)
+        return final_path
+
+    @contextmanager
+    def fill_lock(self, key):
+        """Hold the lock serializing downloads that would fill the same key."""
+        with self._lock:
+            entry = self._fill_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            # Forget the lock once nobody holds or waits for it
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1] and self._fill_locks.get(key) is entry:
+                    del self._fill_locks[key]
+
+    def stats(self):
+        with self._lock:
+            entries = self._load()
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(entries),
+                'bytes': sum(size for _, size in entries.values()),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+            }
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+
+        found = []
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if name.startswith(TEMP_PREFIX):
+                    # Left behind by an interrupted publish
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, os.path.splitext(name)[0], path, stat.st_size))
+
+        self._entries = OrderedDict(
+            (key, (path, size)) for _, key, path, size in sorted(found)
+        )
+        return self._entries
+
+    def _evict(self, entries, keep):
+        total = sum(size for _, size in entries.values())
+        while total > self.max_bytes and len(entries) > 1:
+            key, (path, size) = next(iter(entries.items()))
+            if key == keep:
+                break
+            del entries[key]
+            total -= size
+            self.evictions += 1
+            try:
+                os.unlink(path)
+                add_log(f"Evicted cached download: {key} ({size} bytes)", 'DEBUG')
+            except OSError:
+                pass
+
+
+download_cache = DownloadCache()
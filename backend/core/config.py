@@ -1,24 +1,205 @@
 import os
+import sys
+import time
+import queue
+import atexit
+import tempfile
+import threading
+from collections import deque
 
 CONFIG = {
     'MAX_LOG_MESSAGES': 100,
     'TEMP_FILE_CLEANUP_INTERVAL': 3600,  # 1 hour
     'ALLOWED_DOMAINS': ['youtube.com', 'youtu.be', 'www.youtube.com'],
-    'MAX_URL_LENGTH': 500
+    'MAX_URL_LENGTH': 500,
+    'MAX_CONCURRENT_DOWNLOADS': 3,
+    'MAX_QUEUE_SIZE': 100,
+    'QUEUE_RETRY_AFTER': 5,  # seconds
+    'SSE_HEARTBEAT_INTERVAL': 15,  # seconds
+    'PROGRESS_MAX_UPDATES_PER_SEC': 4,
+    'PROGRESS_MAX_INTERVAL': 1.0,  # seconds
+    'PROGRESS_MIN_DELTA': 1.0,  # percent
+    'ASYNC_LOG_WRITER': True,
+    'LOG_WRITER_BATCH_SIZE': 200,
+    'CACHE_ENABLED': True,
+    'CACHE_DIR': os.path.join(tempfile.gettempdir(), 'youtube-downloader-cache'),
+    'CACHE_MAX_BYTES': 5 * 1024 ** 3,  # 5 GiB
+    # Extracted video info is reused by /info and downloads; stream URLs in it expire
+    'INFO_CACHE_TTL': 1800,  # seconds
+    'INFO_CACHE_MAX_ENTRIES': 256,
+    # Playlist batches: videos downloaded at the same time per batch, and a cap on videos
+    'PLAYLIST_CONCURRENCY': 2,
+    'PLAYLIST_MAX_ENTRIES': 500,
+    'BATCH_MAX_ITEMS': 1000,  # items per bulk submit or bulk status request
+    # Network tuning for each download; requests may override the first three
+    'CONCURRENT_FRAGMENT_DOWNLOADS': 4,  # DASH/HLS fragments fetched in parallel
+    'HTTP_CHUNK_SIZE': 10 * 1024 ** 2,  # bytes per ranged request, avoids throttled long reads
+    'DOWNLOAD_BUFFER_SIZE': None,  # initial read buffer in bytes, yt-dlp default if None
+    'EXTERNAL_DOWNLOADER': os.environ.get('EXTERNAL_DOWNLOADER') or None,
+    'EXTERNAL_DOWNLOADERS': ('aria2c', 'axel', 'curl', 'wget'),
+    'EXTERNAL_DOWNLOADER_ARGS': {'aria2c': ['-x', '8', '-s', '8', '-k', '1M']},
+    'GLOBAL_RATE_LIMIT': int(os.environ['GLOBAL_RATE_LIMIT']) if os.environ.get('GLOBAL_RATE_LIMIT') else None,  # bytes/s shared by all downloads
+    'RATE_LIMIT_BURST_SECONDS': 1.0,  # bytes a job may take ahead of its share, in seconds of that share
+    'AUDIO_QUALITY': 5,  # default for converted audio: 0-10 VBR (0 is best) or a kbps bitrate
+    'FFMPEG_CONCURRENCY': os.cpu_count() or 1,  # post-processors (merges, transcodes) running at once
+    'YDL_POOL_SIZE': None,  # idle YoutubeDL instances kept for reuse, MAX_CONCURRENT_DOWNLOADS + 1 if None
+    # 'thread' runs yt-dlp in the server process; 'process' runs it in a pool of worker processes
+    'EXECUTION_BACKEND': os.environ.get('EXECUTION_BACKEND', 'thread'),
+    'WORKER_MAX_JOBS': 50,  # jobs a worker process runs before it is replaced
+    'WORKER_MAX_RSS_BYTES': 512 * 1024 ** 2,  # a worker above this after a job is replaced
+    'WORKER_MEMORY_LIMIT_BYTES': 2 * 1024 ** 3,  # a worker above this resident memory during a job exits, failing it
+    # Retries of throttled or failed downloads, with full-jitter exponential backoff
+    'UPSTREAM_MAX_RETRIES': 3,
+    'UPSTREAM_RETRY_BASE_DELAY': 2.0,  # seconds
+    'UPSTREAM_RETRY_MAX_DELAY': 60,  # seconds
+    # Circuit breaker: pause the queue when this share of recent attempts failed upstream
+    'UPSTREAM_WINDOW': 60,  # seconds of attempts considered
+    'UPSTREAM_FAILURE_THRESHOLD': 0.5,
+    'UPSTREAM_MIN_SAMPLES': 5,
+    'UPSTREAM_COOLDOWN': 30,  # seconds the queue stays paused, doubled on each reopening
+    'UPSTREAM_MAX_COOLDOWN': 600,
+    # Downloads slower than this (bytes/s) are restarted with fresh stream URLs, None to disable
+    'THROTTLED_RATE_LIMIT': 20 * 1024,
+    'TASK_TTL': 6 * 3600,  # seconds after a task finished
+    'DOWNLOAD_RETENTION_AFTER_FETCH': 600,  # seconds after the file was fetched
+    'TEMP_DISK_BUDGET_BYTES': 10 * 1024 ** 3,  # 10 GiB
+    # 'memory' keeps tasks per process; 'sqlite' shares them between gunicorn workers
+    'TASK_STORE': os.environ.get('TASK_STORE', 'memory'),
+    'TASK_STORE_PATH': os.environ.get(
+        'TASK_STORE_PATH', os.path.join(tempfile.gettempdir(), 'youtube-downloader-tasks.db')),
+    'SSE_POLL_INTERVAL': 1,  # seconds, only used with a shared task store
+    # Append-only journal of task changes, replayed on startup to resume unfinished
+    # jobs; only used with the in-process 'memory' store
+    'JOB_JOURNAL': os.environ.get('JOB_JOURNAL', 'True').lower() == 'true',
+    'JOB_JOURNAL_PATH': os.environ.get(
+        'JOB_JOURNAL_PATH', os.path.join(tempfile.gettempdir(), 'youtube-downloader-journal.db')),
+    'JOB_JOURNAL_COMPACT_EVERY': 1000,  # journal rows appended between compactions
+    # Request threads for the bundled waitress server; event streams and file
+    # transfers each hold one for as long as they stay open
+    'SERVER_THREADS': 64,
+    # Seconds to wait for the API, static server and frontend to accept connections at startup
+    'STARTUP_TIMEOUT': 30,
+    # Hand completed downloads to a fronting nginx/Apache via X-Sendfile
+    'USE_X_SENDFILE': os.environ.get('USE_X_SENDFILE', 'False').lower() == 'true',
+    # Stream-through: bytes read from the growing file per chunk, and how often to look for more
+    'STREAM_CHUNK_SIZE': 256 * 1024,
+    'STREAM_POLL_INTERVAL': 0.25,  # seconds
 }
 
-log_messages = []
+LOG_LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
 
-def add_log(message):
+
+def format_log_record(record):
+    """Render a structured log record as a single display line."""
+    timestamp = time.strftime("%H:%M:%S", time.localtime(record['timestamp']))
+    return f"[{timestamp}] {record['message']}"
+
+
+class LogStore:
+    """Thread-safe ring buffer of structured log records.
+
+    Every record gets a monotonically increasing sequence number so clients
+    can fetch only the records added after the last one they saw.
+    """
+
+    def __init__(self, maxlen):
+        self.records = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._seq = 0
+
+    def append(self, message, level='INFO', task_id=None):
+        with self._lock:
+            self._seq += 1
+            record = {
+                'seq': self._seq,
+                'timestamp': time.time(),
+                'level': level,
+                'task_id': task_id,
+                'message': message
+            }
+            self.records.append(record)
+        return record
+
+    def since(self, seq=0, task_id=None, level=None):
+        """Return records newer than seq, optionally filtered, and the new cursor."""
+        min_level = LOG_LEVELS.get(level, 0)
+        with self._lock:
+            cursor = self._seq
+            records = list(self.records)
+        # Records are ordered by seq, so skip the old ones from the right
+        start = len(records)
+        while start > 0 and records[start - 1]['seq'] > seq:
+            start -= 1
+        return [
+            record for record in records[start:]
+            if (task_id is None or record['task_id'] == task_id)
+            and LOG_LEVELS.get(record['level'], 0) >= min_level
+        ], cursor
+
+
+class LogWriter(threading.Thread):
+    """Background thread that formats log records and writes them to stdout in batches."""
+
+    def __init__(self, stream=None):
+        super().__init__(name='log-writer', daemon=True)
+        self.stream = stream
+        self._queue = queue.SimpleQueue()
+
+    def write(self, record):
+        self._queue.put(record)
+
+    def run(self):
+        while True:
+            records = [self._queue.get()]
+            self._drain(records)
+            self._emit(records)
+
+    def flush(self):
+        """Write out everything queued so far from the calling thread."""
+        records = []
+        self._drain(records)
+        if records:
+            self._emit(records)
+
+    def _drain(self, records):
+        while len(records) < CONFIG['LOG_WRITER_BATCH_SIZE']:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+    def _emit(self, records):
+        stream = self.stream or sys.stdout
+        try:
+            stream.write(''.join(format_log_record(record) + '\n' for record in records))
+            stream.flush()
+        except (OSError, ValueError):
+            pass
+
+
+log_store = LogStore(CONFIG['MAX_LOG_MESSAGES'])
+log_messages = log_store.records
+_log_writer = None
+_log_writer_lock = threading.Lock()
+
+def _get_log_writer():
+    global _log_writer
+    if _log_writer is None:
+        with _log_writer_lock:
+            if _log_writer is None:
+                writer = LogWriter()
+                writer.start()
+                atexit.register(writer.flush)
+                _log_writer = writer
+    return _log_writer
+
+def add_log(message, level='INFO', task_id=None):
     """Add a log message with timestamp."""
-    import time
-    timestamp = time.strftime("%H:%M:%S")
-    log_message = f"[{timestamp}] {message}"
-    log_messages.append(log_message)
-    # Remove older messages exceeding the max limit
-    if len(log_messages) > CONFIG['MAX_LOG_MESSAGES']:
-        log_messages.pop(0)
-    print(log_message)  # Also output to console
+    record = log_store.append(message, level, task_id)
+    if CONFIG['ASYNC_LOG_WRITER']:
+        _get_log_writer().write(record)
+    else:
+        print(format_log_record(record))  # Also output to console
 
 def get_logs():
-    return log_messages
+    return [format_log_record(record) for record in log_store.since()[0]]
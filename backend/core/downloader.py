@@ -1,14 +1,53 @@
 import os
+import time
+import shutil
 import threading
 import tempfile
-import yt_dlp
+import uuid
 from urllib.parse import urlparse
 import re
 
+from core.cache import cache_key, download_cache, extract_video_id
 from core.config import CONFIG, add_log
+from core.events import broker
+from core.info import get_info, info_cache
+from core.governor import governor
+from core.metrics import DOWNLOAD_JOBS, DOWNLOAD_RETRIES, PHASE_SECONDS
+from core.network import network_ydl_opts
+from core.postprocess import AUDIO_CODECS, extract_audio, postprocess_pool
+from core.progress import PROGRESS_FIELDS, ProgressReporter
+from core.scheduler import scheduler, QueueFullError
+from core.singleflight import inflight, request_key
+from core.task_store import create_task_store
+from core.upstream import backoff_delay, breaker, classify_error
+from core.workers import process_pool
+from core.ytdl import ydl_pool
 
-# Share task state across the application
-download_tasks = {}
+# Share task state across the application (and across processes with the SQLite store)
+download_tasks = create_task_store()
+
+YOUTUBE_URL_PATTERNS = [
+    re.compile(r'^https?://(www\.)?youtube\.com/watch\?v='),
+    re.compile(r'^https?://youtu\.be/'),
+    re.compile(r'^https?://(www\.)?youtube\.com/embed/'),
+    re.compile(r'^https?://(www\.)?youtube\.com/shorts/')
+]
+
+YOUTUBE_PLAYLIST_PATTERNS = [
+    re.compile(r'^https?://(www\.)?youtube\.com/playlist\?(.*&)?list='),
+    re.compile(r'^https?://(www\.)?youtube\.com/watch\?(.*&)?list='),
+    re.compile(r'^https?://(www\.)?youtube\.com/(@[^/?#]+|channel/[^/?#]+|c/[^/?#]+|user/[^/?#]+)')
+]
+
+# Task fields written by a download job, shared with every task attached to it.
+# The rest (batch, title, created_at, ...) belongs to each task.
+JOB_FIELDS = PROGRESS_FIELDS | {'status', 'file_path', 'error', 'error_category', 'finished_at',
+                                'temp_dir', 'retries', 'stream_path', 'stream_file', 'stream_size'}
+
+def update_task(task_id, **fields):
+    """Update a task's state and notify event-stream subscribers."""
+    if download_tasks.merge(task_id, fields):
+        broker.publish(task_id)
 
 def validate_youtube_url(url):
     """Validate if the given URL is a supported YouTube URL."""
@@ -21,37 +60,211 @@ def validate_youtube_url(url):
         
         if not any(allowed in domain for allowed in CONFIG['ALLOWED_DOMAINS']):
             return False
-            
-        youtube_patterns = [
-            r'^https?://(www\.)?youtube\.com/watch\?v=',
-            r'^https?://youtu\.be/',
-            r'^https?://(www\.)?youtube\.com/embed/',
-            r'^https?://(www\.)?youtube\.com/shorts/'
-        ]
-        
-        return any(re.match(pattern, url) for pattern in youtube_patterns)
+
+        return any(pattern.match(url) for pattern in YOUTUBE_URL_PATTERNS)
+    except Exception:
+        return False
+
+def validate_playlist_url(url):
+    """Validate if the given URL is a supported YouTube playlist or channel URL."""
+    if not url or len(url) > CONFIG['MAX_URL_LENGTH']:
+        return False
+
+    try:
+        domain = urlparse(url).netloc.lower()
+        if not any(allowed in domain for allowed in CONFIG['ALLOWED_DOMAINS']):
+            return False
+
+        return any(pattern.match(url) for pattern in YOUTUBE_PLAYLIST_PATTERNS)
     except Exception:
         return False
 
+def create_task(url, format_type, **fields):
+    """Register a new queued task and return its ID."""
+    task_id = str(uuid.uuid4())
+    add_log(f"Generated Task ID: {task_id}", task_id=task_id)
+
+    download_tasks[task_id] = {
+        'status': 'queued',
+        'format': format_type,
+        'url': url,
+        'created_at': time.time(),
+        **fields
+    }
+    broker.publish(task_id)
+    return task_id
+
+def submit_task(task_id, url, format_type, quality=None, priority=0, temp_directories=None,
+                network=None, audio_quality=None, stream=False, resume_dir=None):
+    """Start the download for a queued task.
+
+    resume_dir is the temp directory of an interrupted run whose partial
+    files the job continues from.
+
+    Returns the job producing the file, or None when it came from the cache.
+    Raises QueueFullError after marking the job as failed.
+    """
+    # Kept with the task so that an interrupted job can be submitted again
+    update_task(task_id, job={'quality': quality, 'priority': priority, 'network': network,
+                              'audio_quality': audio_quality, 'stream': stream})
+
+    # A cached result completes immediately without using a worker
+    key = cache_key(url, format_type, quality, audio_quality, stream)
+    cached_path = download_cache.get(key) if CONFIG['CACHE_ENABLED'] else None
+    if cached_path:
+        update_task(
+            task_id,
+            status='completed',
+            file_path=cached_path,
+            progress=100.0,
+            speed='Cached',
+            finished_at=time.time()
+        )
+        add_log(f"Download task served from cache: {task_id}", task_id=task_id)
+        DOWNLOAD_JOBS.inc(result='cached')
+        return None
+
+    # Identical requests in flight share a single job
+    key = request_key(url, format_type, quality, audio_quality, stream)
+    thread, created = inflight.join_or_register(
+        key, task_id,
+        lambda: DownloadThread(url, format_type, task_id, quality, temp_directories,
+                               network=network, audio_quality=audio_quality, stream=stream,
+                               resume_dir=resume_dir)
+    )
+    if not created:
+        add_log(f"Download task attached to in-flight job {thread.task_id}: {task_id}", task_id=task_id)
+        return thread
+
+    try:
+        position = scheduler.submit(thread, priority)
+    except QueueFullError:
+        # Tasks that attached in the meantime see the rejection as an error
+        thread.fail('Download queue is full')
+        raise
+
+    add_log(f"Download task queued: {task_id} (position {position})", task_id=task_id)
+    return thread
+
 class DownloadThread(threading.Thread):
-    def __init__(self, url, format_type, task_id, quality=None, temp_directories=None):
+    def __init__(self, url, format_type, task_id, quality=None, temp_directories=None,
+                 network=None, audio_quality=None, stream=False, resume_dir=None):
         threading.Thread.__init__(self)
         self.url = url
         self.format_type = format_type
         self.task_id = task_id
+        self.task_ids = [task_id]
+        self._tasks_lock = threading.Lock()
         self.quality = quality
+        self.network = network or {}
+        self.audio_quality = audio_quality
+        # Publish the growing file so that clients can read it before the download ends
+        self.stream = stream
+        self._stream_path = None
+        self.resume_dir = resume_dir
+        self.ffmpeg_location = None
         self.file_path = None
         self.error = None
+        self.progress = ProgressReporter()
         self.temp_directories = temp_directories if temp_directories is not None else set()
+        self.cache_key = cache_key(url, format_type, quality, audio_quality, stream) if CONFIG['CACHE_ENABLED'] else None
+        self.request_key = request_key(url, format_type, quality, audio_quality, stream)
+        self.queued_at = time.monotonic()
+        self._postprocess_started = None
+        self._postprocess_seconds = 0.0
+        self._done = False
+        self._done_callbacks = []
+
+    def attach(self, task_id):
+        """Share this job's progress and result with another task."""
+        with self._tasks_lock:
+            self.task_ids.append(task_id)
+            primary = download_tasks.get(self.task_id) or {}
+            state = {field: primary[field] for field in JOB_FIELDS if field in primary}
+            update_task(task_id, **state)
+
+    def add_done_callback(self, callback):
+        """Call callback once the job has finished, or now if it already has."""
+        with self._tasks_lock:
+            if not self._done:
+                self._done_callbacks.append(callback)
+                return
+        callback()
+
+    def _finish(self):
+        with self._tasks_lock:
+            if self._done:
+                return
+            self._done = True
+            callbacks, self._done_callbacks = self._done_callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                add_log(f"Done callback failed: {e}", 'ERROR', self.task_id)
+
+    def _update(self, **fields):
+        with self._tasks_lock:
+            for task_id in self.task_ids:
+                update_task(task_id, **fields)
 
     def run(self):
+        # Set when the file was handed to the post-processing pool, which then finishes the job
+        handed_off = False
+        PHASE_SECONDS.observe(time.monotonic() - self.queued_at, phase='queue')
         try:
-            add_log(f"Starting download: {self.url} ({self.format_type})")
-            
-            # Create a temporary directory
-            temp_dir = tempfile.mkdtemp()
+            if self.cache_key is None:
+                handed_off = self._download()
+                return
+
+            # Identical jobs wait for the first one and then reuse its cached result.
+            # The lookup was already counted when the request was submitted.
+            with download_cache.fill_lock(self.cache_key):
+                cached_path = download_cache.get(self.cache_key, record=False)
+                if cached_path:
+                    add_log(f"Serving from cache: {self.cache_key}", task_id=self.task_id)
+                    self._complete(cached_path, progress=100.0, speed='Cached')
+                    DOWNLOAD_JOBS.inc(result='cached')
+                    return
+                handed_off = self._download()
+        finally:
+            if not handed_off:
+                inflight.finish(self.request_key, self)
+                self._finish()
+
+    def _complete(self, file_path, temp_dir=None, **fields):
+        # Detach first so that no task can join after the consumers are counted
+        inflight.finish(self.request_key, self)
+        self.file_path = file_path
+        if temp_dir is not None:
+            with self._tasks_lock:
+                task_ids = list(self.task_ids)
+            inflight.track(file_path, task_ids, lambda: self._remove_temp_dir(temp_dir))
+        self._update(status='completed', file_path=file_path, finished_at=time.time(), **fields)
+
+    def fail(self, error):
+        """Mark every task attached to this job as failed."""
+        inflight.finish(self.request_key, self)
+        self.error = error
+        self._update(status='error', error=error, finished_at=time.time())
+        DOWNLOAD_JOBS.inc(result='error')
+        self._finish()
+
+    def _download(self):
+        try:
+            self._update(status='processing')
+            add_log(f"Starting download: {self.url} ({self.format_type})", task_id=self.task_id)
+
+            if self.resume_dir and os.path.isdir(self.resume_dir):
+                # yt-dlp continues its .part files from where the previous run stopped
+                temp_dir = self.resume_dir
+                add_log(f"Resuming partial download in: {temp_dir}", task_id=self.task_id)
+            else:
+                # Create a temporary directory
+                temp_dir = tempfile.mkdtemp()
+                add_log(f"Temporary directory created: {temp_dir}", task_id=self.task_id)
             self.temp_directories.add(temp_dir)
-            add_log(f"Temporary directory created: {temp_dir}")
+            self._update(temp_dir=temp_dir)
             
             base_filename = os.path.join(temp_dir, 'download')
             self.file_path = base_filename
@@ -60,10 +273,19 @@ class DownloadThread(threading.Thread):
                 'outtmpl': base_filename + '.%(ext)s',
                 'quiet': True,
                 'no_warnings': False,
-                'ignoreerrors': True,
+                # Errors must reach the retry policy instead of ending in a missing file
+                'ignoreerrors': False,
                 'extract_flat': False,
+                'continuedl': True,
                 'progress_hooks': [self.progress_hook],
+                'postprocessor_hooks': [self.postprocessor_hook],
             }
+            ydl_opts.update(network_ydl_opts(self.network))
+            if CONFIG['THROTTLED_RATE_LIMIT']:
+                ydl_opts['throttledratelimit'] = CONFIG['THROTTLED_RATE_LIMIT']
+            if self.stream:
+                # Streamed bytes must match the final file, so never rewrite it afterwards
+                ydl_opts['fixup'] = 'warn'
 
             # Setup FFmpeg path (using embedded ffmpeg)
             # Find root backend dir based on this file's path (core/downloader.py -> backend)
@@ -72,50 +294,48 @@ class DownloadThread(threading.Thread):
             
             if os.path.exists(ffmpeg_path):
                 ydl_opts['ffmpeg_location'] = ffmpeg_path
-                add_log(f"Using FFmpeg at: {ffmpeg_path}")
+                self.ffmpeg_location = ffmpeg_path
+                add_log(f"Using FFmpeg at: {ffmpeg_path}", task_id=self.task_id)
             else:
-                add_log("Warning: FFmpeg not found. The highest quality streams may not merge properly.")
+                add_log("Warning: FFmpeg not found. The highest quality streams may not merge properly.", 'WARNING', self.task_id)
 
             # Set format options
             if self.format_type == 'mp3':
                 ydl_opts.update({'format': 'bestaudio[ext=mp3]/bestaudio'})
-                add_log("Downloading as MP3")
+                add_log("Downloading as MP3", task_id=self.task_id)
             elif self.format_type == 'm4a':
-                ydl_opts.update({'format': 'bestaudio[ext=m4a]/bestaudio'})
-                add_log("Downloading as M4A")
+                ydl_opts.update({'format': 'bestaudio[ext=m4a]' if self.stream else 'bestaudio[ext=m4a]/bestaudio'})
+                add_log("Downloading as M4A", task_id=self.task_id)
             elif self.format_type == 'wav':
                 ydl_opts.update({'format': 'bestaudio[ext=wav]/bestaudio'})
-                add_log("Downloading as WAV")
+                add_log("Downloading as WAV", task_id=self.task_id)
             elif self.format_type == 'ogg':
                 ydl_opts.update({'format': 'bestaudio[ext=ogg]/bestaudio'})
-                add_log("Downloading as OGG")
+                add_log("Downloading as OGG", task_id=self.task_id)
             elif self.format_type == 'flac':
                 ydl_opts.update({'format': 'bestaudio[ext=flac]/bestaudio'})
-                add_log("Downloading as FLAC")
+                add_log("Downloading as FLAC", task_id=self.task_id)
             elif self.format_type == 'opus':
-                ydl_opts.update({'format': 'bestaudio[ext=opus]/bestaudio'})
-                add_log("Downloading as Opus")
+                ydl_opts.update({'format': 'bestaudio[acodec=opus]/bestaudio'})
+                add_log("Downloading as Opus", task_id=self.task_id)
             else:  # mp4
                 if self.quality == 'highest':
                     ydl_opts.update({'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'})
-                    add_log("Downloading MP4 in highest quality")
+                    add_log("Downloading MP4 in highest quality", task_id=self.task_id)
                 elif self.quality == 'high':
                     ydl_opts.update({'format': '137+140/22/18'})  # 1080p + AAC / 720p / 360p
-                    add_log("Downloading MP4 in high quality")
+                    add_log("Downloading MP4 in high quality", task_id=self.task_id)
                 elif self.quality == 'medium':
                     ydl_opts.update({'format': '22/18'})  # 720p / 360p
-                    add_log("Downloading MP4 in medium quality")
+                    add_log("Downloading MP4 in medium quality", task_id=self.task_id)
                 elif self.quality == 'low':
                     ydl_opts.update({'format': '18'})  # 360p
-                    add_log("Downloading MP4 in low quality")
+                    add_log("Downloading MP4 in low quality", task_id=self.task_id)
                 else:
-                    ydl_opts.update({'format': 'best[ext=mp4]/best'})
-                    add_log("Downloading MP4 (Auto)")
+                    ydl_opts.update({'format': 'best[ext=mp4]' if self.stream else 'best[ext=mp4]/best'})
+                    add_log("Downloading MP4 (Auto)", task_id=self.task_id)
 
-            add_log("Starting yt-dlp...")
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                result = ydl.download([self.url])
-                add_log(f"yt-dlp result code: {result}")
+            self._run_with_retries(ydl_opts)
 
             # Locate the actual downloaded file
             actual_files = [f for f in os.listdir(temp_dir) if f.startswith('download')]
@@ -125,27 +345,25 @@ class DownloadThread(threading.Thread):
                 if os.path.exists(actual_file_path) and os.path.getsize(actual_file_path) > 0:
                     self.file_path = actual_file_path
                     size_bytes = os.path.getsize(actual_file_path)
-                    add_log(f"Download successful: {actual_file_path} ({size_bytes} bytes)")
-                    
-                    if self.task_id in download_tasks:
-                        download_tasks[self.task_id]['status'] = 'completed'
-                        download_tasks[self.task_id]['file_path'] = self.file_path
+                    add_log(f"Download successful: {actual_file_path} ({size_bytes} bytes)", task_id=self.task_id)
+
+                    # A streamed m4a is already in its final container
+                    if self.format_type in AUDIO_CODECS and not self.stream:
+                        # Converting is CPU-bound, so free this download worker for the next job
+                        self._update(speed='Converting')
+                        postprocess_pool.submit(self._convert, actual_file_path, temp_dir)
+                        return True
+                    self._store(actual_file_path, temp_dir)
                 else:
-                    add_log("Download failed: File is missing or empty")
-                    self.error = "File is missing or empty"
-                    if self.task_id in download_tasks:
-                        download_tasks[self.task_id].update({'status': 'error', 'error': self.error})
+                    add_log("Download failed: File is missing or empty", 'ERROR', self.task_id)
+                    self.fail("File is missing or empty")
             else:
-                add_log("Download failed: No output file found")
-                self.error = "No output file found"
-                if self.task_id in download_tasks:
-                    download_tasks[self.task_id].update({'status': 'error', 'error': self.error})
+                add_log("Download failed: No output file found", 'ERROR', self.task_id)
+                self.fail("No output file found")
 
         except Exception as e:
-            self.error = str(e)
-            if self.task_id in download_tasks:
-                download_tasks[self.task_id].update({'status': 'error', 'error': self.error})
-            add_log(f"Download error: {e}")
+            self.fail(str(e))
+            add_log(f"Download error: {e}", 'ERROR', self.task_id)
             
             # Clean up on error
             if self.file_path and os.path.exists(self.file_path):
@@ -153,44 +371,161 @@ class DownloadThread(threading.Thread):
                     os.unlink(self.file_path)
                 except:
                     pass
-    
-    def progress_hook(self, d):
-        """Hook to monitor download progress and update logs."""
-        if d['status'] == 'downloading':
-            percent = d.get('_percent_str', '')
-            speed = d.get('_speed_str', 'N/A')
-            
-            if speed and speed != 'N/A':
-                ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-                clean_speed = ansi_escape.sub('', speed).strip()
+
+    def _run_with_retries(self, ydl_opts):
+        """Run yt-dlp, retrying retryable upstream errors with jittered exponential backoff."""
+        run = self._run_in_worker if CONFIG['EXECUTION_BACKEND'] == 'process' else self._run_in_thread
+        max_retries = CONFIG['UPSTREAM_MAX_RETRIES']
+        attempt = 0
+        while True:
+            try:
+                run(ydl_opts)
+            except Exception as e:
+                failure = classify_error(e)
+                breaker.record_failure(failure)
+                if not failure.retryable or attempt >= max_retries:
+                    self._update(error_category=failure.category)
+                    raise
+
+                # Also wait out an open circuit instead of adding to the load
+                delay = max(backoff_delay(attempt), breaker.wait_time())
+                attempt += 1
+                DOWNLOAD_RETRIES.inc()
+                add_log(f"Upstream error ({failure.category}), retry {attempt}/{max_retries} in {delay:.1f}s: "
+                        f"{failure.message}", 'WARNING', self.task_id)
+                self._update(speed=f'Retrying in {delay:.0f}s', retries=attempt)
+                # The cached stream URLs may have expired or been throttled
+                video_id = extract_video_id(self.url)
+                if video_id:
+                    info_cache.discard(video_id)
+                time.sleep(delay)
             else:
-                clean_speed = speed
-            
-            progress_value = None
-            
-            if percent and '%' in percent:
-                try:
-                    cleaned = percent.strip().replace('%', '').strip()
-                    if cleaned:
-                        progress_value = float(cleaned)
-                except (ValueError, TypeError):
-                    pass
-            
-            if progress_value is None:
-                downloaded = d.get('downloaded_bytes', 0)
-                total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-                if total > 0:
-                    progress_value = (downloaded / total) * 100
-            
-            if progress_value is None:
-                progress_value = 0
-            
-            download_tasks[self.task_id]['progress'] = progress_value
-            download_tasks[self.task_id]['speed'] = clean_speed
-            
-            add_log(f"Downloading: {progress_value:.1f}% complete, Speed: {clean_speed}")
-                
+                breaker.record_success()
+                return
+
+    def _run_in_thread(self, ydl_opts):
+        # Reuse the info extracted by /info or an earlier job for the same video
+        started = time.monotonic()
+        info, cached = get_info(self.url, self.task_id)
+        if cached:
+            add_log("Using cached video info", task_id=self.task_id)
+        else:
+            PHASE_SECONDS.observe(time.monotonic() - started, phase='extract')
+
+        add_log("Starting yt-dlp...", task_id=self.task_id)
+        started = time.monotonic()
+        with governor.job(self.task_id), ydl_pool.borrow(ydl_opts) as ydl:
+            ydl.process_ie_result(info, download=True)
+            add_log("yt-dlp finished", task_id=self.task_id)
+        # Merges and fixups run inside process_ie_result and are timed separately
+        PHASE_SECONDS.observe(time.monotonic() - started - self._postprocess_seconds, phase='download')
+
+    def _run_in_worker(self, ydl_opts):
+        """Run extraction and download in the process pool; hook events come back to this thread."""
+        video_id = extract_video_id(self.url)
+        info = info_cache.get(video_id) if video_id else None
+        if info is not None:
+            add_log("Using cached video info", task_id=self.task_id)
+        extract_seconds = 0.0
+
+        def handle(kind, payload):
+            nonlocal extract_seconds
+            if kind == 'progress':
+                # The worker does not wait for progress events; it is told to pause instead
+                return self.progress_hook(payload, sleep=False)
+            if kind == 'postprocessor':
+                self.postprocessor_hook(payload)
+            elif kind == 'info':
+                extracted, extract_seconds = payload
+                PHASE_SECONDS.observe(extract_seconds, phase='extract')
+                add_log(f"Extracted info for {video_id} in {extract_seconds:.2f}s", 'DEBUG', self.task_id)
+                if video_id:
+                    info_cache.put(video_id, extracted)
+
+        opts = {key: value for key, value in ydl_opts.items() if not key.endswith('_hooks')}
+        add_log("Starting yt-dlp in a worker process...", task_id=self.task_id)
+        started = time.monotonic()
+        with governor.job(self.task_id):
+            process_pool.run(self.url, opts, info, handle)
+        add_log("yt-dlp finished", task_id=self.task_id)
+        PHASE_SECONDS.observe(time.monotonic() - started - extract_seconds - self._postprocess_seconds,
+                              phase='download')
+
+    def _convert(self, file_path, temp_dir):
+        """Convert the downloaded audio in the post-processing pool and finish the job."""
+        try:
+            with PHASE_SECONDS.time(phase='postprocess'):
+                converted_path = extract_audio(file_path, self.format_type, self.audio_quality,
+                                               self.ffmpeg_location, self.task_id)
+            add_log(f"Converted to {self.format_type}: {converted_path}", task_id=self.task_id)
+            self._store(converted_path, temp_dir)
+        except Exception as e:
+            add_log(f"Conversion error: {e}", 'ERROR', self.task_id)
+            self.fail(f"Conversion failed: {e}")
+            self._remove_temp_dir(temp_dir)
+        finally:
+            inflight.finish(self.request_key, self)
+            self._finish()
+
+    def _store(self, file_path, temp_dir):
+        if self.cache_key:
+            cached_path = download_cache.put(self.cache_key, file_path)
+            self._remove_temp_dir(temp_dir)
+            add_log(f"Stored in cache: {cached_path}", task_id=self.task_id)
+            self._complete(cached_path)
+        else:
+            self._complete(file_path, temp_dir)
+        DOWNLOAD_JOBS.inc(result='completed')
+
+    def _remove_temp_dir(self, temp_dir):
+        try:
+            shutil.rmtree(temp_dir)
+            self.temp_directories.discard(temp_dir)
+        except OSError as e:
+            add_log(f"Failed to delete temp dir: {e}", 'WARNING', self.task_id)
+
+    def progress_hook(self, d, sleep=True):
+        """Hook to monitor download progress and update logs.
+
+        Returns the seconds the job is held back for its bandwidth share;
+        with sleep=False they are left for the caller to wait.
+        """
+        delay = 0.0
+        if d['status'] == 'downloading':
+            # Sleeping here holds back this job's reads while it is over its share
+            delay = governor.throttle(self.task_id, d, sleep)
+        if self.stream:
+            self._publish_stream(d)
+
+        fields = self.progress.update(d)
+        if fields is None:
+            return delay
+
+        self._update(**fields)
+        if d['status'] == 'finished':
+            add_log("Download finished, post-processing...", task_id=self.task_id)
+        else:
+            add_log(f"Downloading: {fields['progress']:.1f}% complete, Speed: {fields['speed']}", 'DEBUG', self.task_id)
+        return delay
+
+    def _publish_stream(self, d):
+        if d['status'] == 'downloading':
+            path = d.get('tmpfilename')
+            if path and path != self._stream_path:
+                self._stream_path = path
+                self._update(stream_path=path)
         elif d['status'] == 'finished':
-            add_log("Download finished, post-processing...")
-            download_tasks[self.task_id]['progress'] = 100.0
-            download_tasks[self.task_id]['speed'] = 'Completed'
+            # The .part file has been renamed; readers continue from the final name
+            self._update(stream_file=d.get('filename'),
+                         stream_size=d.get('total_bytes') or d.get('downloaded_bytes'))
+
+    def postprocessor_hook(self, d):
+        """Hook that limits how many jobs run ffmpeg at the same time and times them."""
+        governor.postprocessor_hook(self.task_id, d)
+        if d['status'] == 'started':
+            self._postprocess_started = time.monotonic()
+        elif d['status'] == 'finished' and self._postprocess_started is not None:
+            elapsed = time.monotonic() - self._postprocess_started
+            self._postprocess_started = None
+            self._postprocess_seconds += elapsed
+            PHASE_SECONDS.observe(elapsed, phase='postprocess')
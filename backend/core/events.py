@@ -0,0 +1,60 @@
+import threading
+
+
+class Subscription:
+    """Pending task updates for one event-stream client.
+
+    Updates are coalesced: a task that changes several times between two
+    reads is only reported once.
+    """
+
+    def __init__(self, task_id=None):
+        self.task_id = task_id
+        self._pending = set()
+        self._cond = threading.Condition()
+
+    def notify(self, task_id):
+        if self.task_id is not None and task_id != self.task_id:
+            return
+        with self._cond:
+            self._pending.add(task_id)
+            self._cond.notify()
+
+    def wait(self, timeout):
+        """Block until updates arrive and return the changed task IDs."""
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(timeout)
+            changed, self._pending = self._pending, set()
+            return changed
+
+
+class EventBroker:
+    """Fan out task change notifications to event-stream subscribers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self, task_id=None):
+        subscription = Subscription(task_id)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, task_id):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.notify(task_id)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+broker = EventBroker()
@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from core.config import CONFIG, add_log
+from core.metrics import DOWNLOADED_BYTES
+
+
+class TokenBucket:
+    """Token bucket that lets consumers run into debt and then sleep it off."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate, burst):
+        with self._lock:
+            self._refill()
+            self.rate = rate
+            self.burst = burst
+            self._tokens = min(self._tokens, burst)
+
+    def consume(self, amount, sleep=True):
+        """Take amount tokens, sleeping while the bucket is in debt. Returns the seconds waited.
+
+        With sleep=False the caller is responsible for waiting the returned time.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait and sleep:
+            time.sleep(wait)
+        return wait
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class _JobState:
+    __slots__ = ('bucket', 'last_bytes', 'ffmpeg_held', 'lock')
+
+    def __init__(self):
+        self.bucket = None
+        self.last_bytes = {}  # filename -> downloaded_bytes at the previous hook
+        self.ffmpeg_held = False
+        self.lock = threading.Lock()
+
+
+class ResourceGovernor:
+    """Coordinates bandwidth and ffmpeg use between concurrent downloads.
+
+    GLOBAL_RATE_LIMIT is split into one token bucket per active job, so each
+    job gets an equal share; a share a job leaves unused is not lent out.
+    Jobs pay for the bytes reported by their progress hooks. Post-processing
+    (merges, transcodes) takes one of FFMPEG_CONCURRENCY slots.
+    """
+
+    RATE_WINDOW = 5.0  # seconds of history behind the measured throughput
+
+    def __init__(self, ffmpeg_slots=None):
+        self.ffmpeg_slots = ffmpeg_slots or CONFIG['FFMPEG_CONCURRENCY']
+        self._ffmpeg = threading.BoundedSemaphore(self.ffmpeg_slots)
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._window = deque()  # (time, bytes) over the last RATE_WINDOW seconds
+        self.ffmpeg_running = 0
+        self.ffmpeg_waiting = 0
+        self.throttled_seconds = 0.0
+
+    @contextmanager
+    def job(self, job_id):
+        """Register a downloading job for the duration of the block."""
+        with self._lock:
+            self._jobs[job_id] = _JobState()
+            self._rebalance()
+        try:
+            yield
+        finally:
+            with self._lock:
+                state = self._jobs.pop(job_id, None)
+                self._rebalance()
+            # A failed post-processor never reports 'finished'
+            if state is not None and state.ffmpeg_held:
+                state.ffmpeg_held = False
+                self._release_ffmpeg()
+
+    def throttle(self, job_id, d, sleep=True):
+        """Charge a job for the bytes downloaded since its previous progress hook.
+
+        Returns the seconds the job has to wait, which have already been
+        slept unless sleep is False.
+        """
+        with self._lock:
+            state = self._jobs.get(job_id)
+        downloaded = d.get('downloaded_bytes')
+        if state is None or downloaded is None:
+            return 0.0
+
+        key = d.get('filename')
+        with state.lock:
+            delta = downloaded - state.last_bytes.get(key, 0)
+            state.last_bytes[key] = downloaded
+            bucket = state.bucket
+        if delta <= 0:
+            return 0.0
+
+        DOWNLOADED_BYTES.inc(delta)
+        now = time.monotonic()
+        with self._lock:
+            self._window.append((now, delta))
+            self._trim(now)
+        if bucket is None:
+            return 0.0
+        waited = bucket.consume(delta, sleep)
+        if waited:
+            with self._lock:
+                self.throttled_seconds += waited
+        return waited
+
+    def postprocessor_hook(self, job_id, d):
+        """Hold an ffmpeg slot while a job's post-processor runs."""
+        with self._lock:
+            state = self._jobs.get(job_id)
+        if state is None:
+            return
+        if d['status'] == 'started' and not state.ffmpeg_held:
+            self._acquire_ffmpeg(job_id, d.get('postprocessor'))
+            state.ffmpeg_held = True
+        elif d['status'] == 'finished' and state.ffmpeg_held:
+            state.ffmpeg_held = False
+            self._release_ffmpeg()
+
+    @contextmanager
+    def ffmpeg_slot(self, job_id=None, label=None):
+        """Hold an ffmpeg slot for work that runs outside a download."""
+        self._acquire_ffmpeg(job_id, label)
+        try:
+            yield
+        finally:
+            self._release_ffmpeg()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            window_bytes = sum(n for _, n in self._window)
+            limit = CONFIG['GLOBAL_RATE_LIMIT']
+            try:
+                load = os.getloadavg()
+            except (AttributeError, OSError):
+                load = None
+            return {
+                'bandwidth': {
+                    'limit': limit,
+                    'bytes_per_sec': window_bytes / self.RATE_WINDOW,
+                    'utilization': window_bytes / self.RATE_WINDOW / limit if limit else None,
+                    'active_jobs': len(self._jobs),
+                    'per_job_limit': limit / len(self._jobs) if limit and self._jobs else None,
+                    'throttled_seconds': round(self.throttled_seconds, 3),
+                },
+                'ffmpeg': {
+                    'slots': self.ffmpeg_slots,
+                    'running': self.ffmpeg_running,
+                    'waiting': self.ffmpeg_waiting,
+                },
+                'cpu': {
+                    'count': os.cpu_count(),
+                    'load_average': list(load) if load else None,
+                },
+            }
+
+    def _acquire_ffmpeg(self, job_id, label):
+        with self._lock:
+            self.ffmpeg_waiting += 1
+        if not self._ffmpeg.acquire(blocking=False):
+            add_log(f"Waiting for a free ffmpeg slot ({label})", 'DEBUG', job_id)
+            self._ffmpeg.acquire()
+        with self._lock:
+            self.ffmpeg_waiting -= 1
+            self.ffmpeg_running += 1
+
+    def _release_ffmpeg(self):
+        with self._lock:
+            self.ffmpeg_running -= 1
+        self._ffmpeg.release()
+
+    def _rebalance(self):
+        limit = CONFIG['GLOBAL_RATE_LIMIT']
+        for state in self._jobs.values():
+            if not limit:
+                state.bucket = None
+                continue
+            rate = limit / len(self._jobs)
+            burst = max(rate * CONFIG['RATE_LIMIT_BURST_SECONDS'], 64 * 1024)
+            if state.bucket is None:
+                state.bucket = TokenBucket(rate, burst)
+            else:
+                state.bucket.set_rate(rate, burst)
+
+    def _trim(self, now):
+        while self._window and now - self._window[0][0] > self.RATE_WINDOW:
+            self._window.popleft()
+
+
+governor = ResourceGovernor()
@@ -0,0 +1,144 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from core.cache import extract_video_id
+from core.config import CONFIG, add_log
+from core.ytdl import ydl_pool
+
+# Fields of a format that are worth showing before a download
+FORMAT_FIELDS = ('format_id', 'ext', 'format_note', 'width', 'height', 'fps', 'vcodec',
+                 'acodec', 'abr', 'tbr', 'filesize', 'filesize_approx')
+
+
+class InfoCache:
+    """TTL + LRU cache of yt-dlp info dicts keyed by video ID.
+
+    Entries hold the unprocessed extractor result, so that each download can
+    run its own format selection on it with process_ie_result(). Stream URLs
+    inside the dict expire, which bounds the TTL.
+    """
+
+    def __init__(self, ttl=None, max_entries=None):
+        self.ttl = ttl or CONFIG['INFO_CACHE_TTL']
+        self.max_entries = max_entries or CONFIG['INFO_CACHE_MAX_ENTRIES']
+        self._lock = threading.Lock()
+        self._fill_locks = {}  # video_id -> [lock, holders and waiters]
+        self._entries = OrderedDict()  # video_id -> (expires_at, info), least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, video_id, record=True):
+        """Return a private copy of the cached info for video_id, or None."""
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is None or entry[0] <= time.monotonic():
+                self._entries.pop(video_id, None)
+                if record:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(video_id)
+            if record:
+                self.hits += 1
+            info = entry[1]
+        # yt-dlp mutates the dict while processing it
+        return copy.deepcopy(info)
+
+    def put(self, video_id, info):
+        with self._lock:
+            self._entries[video_id] = (time.monotonic() + self.ttl, copy.deepcopy(info))
+            self._entries.move_to_end(video_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, video_id):
+        """Forget a video, e.g. because its stream URLs stopped working."""
+        with self._lock:
+            self._entries.pop(video_id, None)
+
+    @contextmanager
+    def fill_lock(self, video_id):
+        """Hold the lock serializing extractions of the same video."""
+        with self._lock:
+            entry = self._fill_locks.setdefault(video_id, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            # Forget the lock once nobody holds or waits for it
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1] and self._fill_locks.get(video_id) is entry:
+                    del self._fill_locks[video_id]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._fill_locks.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+info_cache = InfoCache()
+
+
+def _extract(url):
+    with ydl_pool.borrow({'skip_download': True}) as ydl:
+        return ydl.extract_info(url, download=False, process=False)
+
+
+def get_info(url, task_id=None):
+    """Return the info dict for url, extracting it at most once per TTL.
+
+    Returns (info, cached). Raises yt_dlp.utils.DownloadError when the
+    extraction fails.
+    """
+    video_id = extract_video_id(url)
+    if video_id is None:
+        return _extract(url), False
+
+    info = info_cache.get(video_id)
+    if info is not None:
+        return info, True
+
+    # Concurrent requests for the same video wait for one extraction
+    with info_cache.fill_lock(video_id):
+        info = info_cache.get(video_id, record=False)
+        if info is not None:
+            return info, True
+        started = time.monotonic()
+        info = _extract(url)
+        add_log(f"Extracted info for {video_id} in {time.monotonic() - started:.2f}s", 'DEBUG', task_id)
+        info_cache.put(video_id, info)
+        return info, False
+
+
+def summarize_info(info):
+    """Reduce an info dict to the metadata and formats shown to clients."""
+    formats = [
+        {field: f.get(field) for field in FORMAT_FIELDS}
+        for f in info.get('formats') or []
+        if f.get('format_id') and f.get('protocol') != 'mhtml'  # skip storyboards
+    ]
+    return {
+        'id': info.get('id'),
+        'title': info.get('title'),
+        'duration': info.get('duration'),
+        'uploader': info.get('uploader'),
+        'thumbnail': info.get('thumbnail'),
+        'formats': formats,
+    }
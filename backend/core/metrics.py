@@ -0,0 +1,193 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from fast API calls up to long downloads
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            lines += self._samples()
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing value, one per label combination."""
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts plus the sum and count of observed values."""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block, including when it raises."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def count(self, **labels):
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def _samples(self):
+        lines = []
+        for key, (counts, total, count) in sorted(self._values.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+                lines.append(f'{self.name}_bucket{labels} {bucket_count}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Metric whose value is read from fn when scraped.
+
+    fn returns a number, or a dict of label value tuples to numbers.
+    """
+
+    def __init__(self, name, documentation, fn, type='gauge', labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.type = type
+        self._fn = fn
+
+    def _samples(self):
+        values = self._fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in sorted(values.items()) if value is not None]
+
+
+class MetricsRegistry:
+    """Metrics of this process, rendered in the Prometheus text format.
+
+    Each gunicorn worker keeps its own registry, so scrape every worker or
+    run a single one when the numbers have to be complete.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, fn, labelnames=()):
+        return self.register(CallbackMetric(name, documentation, fn, 'gauge', labelnames))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+REQUESTS = registry.counter(
+    'ytdl_http_requests_total', 'API requests by route, method and status code.',
+    ('route', 'method', 'status'))
+REQUEST_SECONDS = registry.histogram(
+    'ytdl_http_request_duration_seconds', 'Time to produce an API response, by route.',
+    ('route', 'method'))
+PHASE_SECONDS = registry.histogram(
+    'ytdl_download_phase_seconds',
+    'Time spent in each download phase: queue, extract, download and postprocess.',
+    ('phase',))
+DOWNLOADED_BYTES = registry.counter(
+    'ytdl_downloaded_bytes_total', 'Bytes received from upstream by download jobs.')
+PROGRESS_UPDATES = registry.counter(
+    'ytdl_progress_updates_total',
+    'Progress hook calls that were published as task updates or suppressed by throttling.', ('result',))
+DOWNLOAD_JOBS = registry.counter(
+    'ytdl_download_jobs_total', 'Finished download jobs by result.', ('result',))
+UPSTREAM_ERRORS = registry.counter(
+    'ytdl_upstream_errors_total', 'Failed extractions and downloads by error category.', ('category',))
+DOWNLOAD_RETRIES = registry.counter(
+    'ytdl_download_retries_total', 'Download attempts repeated after a retryable upstream error.')
@@ -0,0 +1,62 @@
+import shutil
+
+from core.config import CONFIG
+
+# Per-request overrides and their allowed ranges
+NETWORK_OPTION_LIMITS = {
+    'concurrent_fragments': (1, 16),
+    'http_chunk_size': (64 * 1024, 100 * 1024 ** 2),
+    'buffer_size': (1024, 16 * 1024 ** 2),
+}
+
+
+def parse_network_options(data):
+    """Validate the per-request network overrides. Returns (options, error)."""
+    if data is None:
+        return {}, None
+    if not isinstance(data, dict):
+        return None, 'network must be an object'
+
+    options = {}
+    for name, value in data.items():
+        if name == 'external_downloader':
+            if value is None:
+                continue
+            if value not in CONFIG['EXTERNAL_DOWNLOADERS']:
+                return None, f"external_downloader must be one of {', '.join(CONFIG['EXTERNAL_DOWNLOADERS'])}"
+            if shutil.which(value) is None:
+                return None, f"External downloader is not installed: {value}"
+            options[name] = value
+            continue
+
+        limits = NETWORK_OPTION_LIMITS.get(name)
+        if limits is None:
+            return None, f"Unknown network option: {name}"
+        if not isinstance(value, int) or isinstance(value, bool) or not limits[0] <= value <= limits[1]:
+            return None, f"{name} must be an integer between {limits[0]} and {limits[1]}"
+        options[name] = value
+    return options, None
+
+
+def network_ydl_opts(options=None):
+    """yt-dlp options for the CONFIG network defaults with per-job overrides applied."""
+    options = options or {}
+    opts = {
+        'concurrent_fragment_downloads': options.get('concurrent_fragments', CONFIG['CONCURRENT_FRAGMENT_DOWNLOADS']),
+    }
+
+    chunk_size = options.get('http_chunk_size', CONFIG['HTTP_CHUNK_SIZE'])
+    if chunk_size:
+        opts['http_chunk_size'] = chunk_size
+
+    buffer_size = options.get('buffer_size', CONFIG['DOWNLOAD_BUFFER_SIZE'])
+    if buffer_size:
+        opts['buffersize'] = buffer_size
+
+    external = options.get('external_downloader', CONFIG['EXTERNAL_DOWNLOADER'])
+    if external:
+        opts['external_downloader'] = {'default': external}
+        args = CONFIG['EXTERNAL_DOWNLOADER_ARGS'].get(external)
+        if args:
+            opts['external_downloader_args'] = {external: list(args)}
+    return opts
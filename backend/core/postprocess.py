@@ -0,0 +1,107 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from core.config import CONFIG, add_log
+from core.governor import governor
+from core.ytdl import ydl_pool
+
+# Requested audio format -> FFmpegExtractAudio codec
+AUDIO_CODECS = {
+    'mp3': 'mp3',
+    'm4a': 'm4a',
+    'wav': 'wav',
+    'ogg': 'vorbis',
+    'flac': 'flac',
+    'opus': 'opus',
+}
+
+# Formats that ignore the audio quality setting
+LOSSLESS_FORMATS = ('wav', 'flac')
+
+
+def parse_audio_quality(value):
+    """Validate an audio quality: 0-10 for VBR (0 is best) or a bitrate of 32-320 kbps.
+
+    Returns (quality, error).
+    """
+    if value is None:
+        return None, None
+    try:
+        quality = float(value)
+    except (TypeError, ValueError):
+        return None, 'audio_quality must be a number'
+    if isinstance(value, bool) or not (0 <= quality <= 10 or 32 <= quality <= 320):
+        return None, 'audio_quality must be 0-10 (VBR) or a bitrate between 32 and 320 kbps'
+    return int(quality) if quality.is_integer() else quality, None
+
+
+def extract_audio(file_path, format_type, audio_quality=None, ffmpeg_location=None, task_id=None):
+    """Convert a downloaded file to format_type and return the converted file's path.
+
+    Streams that already use the target codec are only remuxed.
+    """
+    from yt_dlp.postprocessor.ffmpeg import FFmpegExtractAudioPP
+
+    opts = {'ffmpeg_location': ffmpeg_location} if ffmpeg_location else {}
+    with ydl_pool.borrow(opts) as ydl:
+        quality = None if format_type in LOSSLESS_FORMATS else audio_quality or CONFIG['AUDIO_QUALITY']
+        pp = FFmpegExtractAudioPP(ydl, preferredcodec=AUDIO_CODECS[format_type], preferredquality=quality)
+        if not pp.available:
+            add_log(f"FFmpeg not found, keeping the original audio instead of converting to {format_type}", 'WARNING', task_id)
+            return file_path
+
+        info = {'filepath': file_path, 'ext': os.path.splitext(file_path)[1].lstrip('.')}
+        with governor.ffmpeg_slot(task_id, 'ExtractAudio'):
+            files_to_delete, info = pp.run(info)
+
+    for path in files_to_delete:
+        if path != info['filepath'] and os.path.exists(path):
+            os.unlink(path)
+    return info['filepath']
+
+
+class PostProcessingPool:
+    """Thread pool for CPU-bound post-processing, separate from the download workers.
+
+    A download worker hands its finished file over and moves on to the next
+    network-bound job while the conversion runs here.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or CONFIG['FFMPEG_CONCURRENCY']
+        self._executor = None
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='postprocess')
+            self.queued += 1
+        return self._executor.submit(self._run, fn, *args)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'queued': self.queued,
+                'running': self.running,
+                'completed': self.completed,
+            }
+
+    def _run(self, fn, *args):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+
+postprocess_pool = PostProcessingPool()
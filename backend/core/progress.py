@@ -0,0 +1,91 @@
+import time
+
+from core.config import CONFIG
+from core.metrics import PROGRESS_UPDATES
+
+_SPEED_UNITS = ('B/s', 'KiB/s', 'MiB/s', 'GiB/s')
+
+# Task fields that ProgressReporter publishes
+PROGRESS_FIELDS = frozenset(('progress', 'speed', 'speed_bps', 'downloaded_bytes', 'total_bytes',
+                             'progress_updates_suppressed'))
+
+
+def format_speed(speed):
+    """Format a speed in bytes per second the way yt-dlp displays it."""
+    if not speed:
+        return 'N/A'
+    for unit in _SPEED_UNITS:
+        if speed < 1024 or unit == _SPEED_UNITS[-1]:
+            return f"{speed:.2f}{unit}"
+        speed /= 1024
+
+
+class ProgressReporter:
+    """Turn yt-dlp progress hook calls into rate-limited task updates.
+
+    Only the numeric fields of the hook dict are read. An update is
+    published when progress moved by at least PROGRESS_MIN_DELTA percent or
+    PROGRESS_MAX_INTERVAL seconds have passed, but never more than
+    PROGRESS_MAX_UPDATES_PER_SEC times per second. Everything else is
+    counted as suppressed.
+    """
+
+    __slots__ = ('min_interval', 'max_interval', 'min_delta',
+                 '_last_time', '_last_percent', 'published', 'suppressed')
+
+    def __init__(self):
+        self.min_interval = 1.0 / CONFIG['PROGRESS_MAX_UPDATES_PER_SEC']
+        self.max_interval = CONFIG['PROGRESS_MAX_INTERVAL']
+        self.min_delta = CONFIG['PROGRESS_MIN_DELTA']
+        self._last_time = None
+        self._last_percent = 0.0
+        self.published = 0
+        self.suppressed = 0
+
+    def update(self, d):
+        """Return the task fields to publish for a hook call, or None to skip it."""
+        status = d['status']
+        if status == 'finished':
+            return self._publish(time.monotonic(), 100.0, {
+                'progress': 100.0,
+                'speed': 'Completed',
+                'downloaded_bytes': d.get('downloaded_bytes') or d.get('total_bytes'),
+                'total_bytes': d.get('total_bytes'),
+            })
+        if status != 'downloading':
+            return None
+
+        downloaded = d.get('downloaded_bytes') or 0
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        if total:
+            percent = downloaded * 100.0 / total
+        elif d.get('fragment_count'):
+            percent = d.get('fragment_index', 0) * 100.0 / d['fragment_count']
+        else:
+            percent = 0.0
+
+        now = time.monotonic()
+        if self._last_time is not None:
+            elapsed = now - self._last_time
+            if elapsed < self.min_interval or (
+                    elapsed < self.max_interval and abs(percent - self._last_percent) < self.min_delta):
+                self.suppressed += 1
+                PROGRESS_UPDATES.inc(result='suppressed')
+                return None
+
+        speed = d.get('speed')
+        return self._publish(now, percent, {
+            'progress': percent,
+            'speed': format_speed(speed),
+            'speed_bps': speed,
+            'downloaded_bytes': downloaded,
+            'total_bytes': total,
+        })
+
+    def _publish(self, now, percent, fields):
+        self._last_time = now
+        self._last_percent = percent
+        self.published += 1
+        PROGRESS_UPDATES.inc(result='published')
+        fields['progress_updates_suppressed'] = self.suppressed
+        return fields
@@ -0,0 +1,172 @@
+import os
+import shutil
+import threading
+import time
+
+from core.config import CONFIG, add_log
+from core.downloader import download_tasks
+from core.singleflight import inflight
+
+FINISHED_STATUSES = ('completed', 'error')
+
+
+def directory_size(path):
+    """Return the total size in bytes of the files below path."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class TaskReaper:
+    """Background sweeper that expires finished tasks and reclaims their files.
+
+    A finished task expires TASK_TTL seconds after it finished, or
+    DOWNLOAD_RETENTION_AFTER_FETCH seconds after its file was fetched. When
+    the temp directories exceed TEMP_DISK_BUDGET_BYTES, the oldest finished
+    tasks that still hold files in a temp directory are expired early until
+    usage is back under budget.
+    """
+
+    def __init__(self, temp_directories, interval=None):
+        self.temp_directories = temp_directories
+        self.interval = interval or CONFIG['TEMP_FILE_CLEANUP_INTERVAL']
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.tasks_reclaimed = 0
+        self.dirs_reclaimed = 0
+        self.bytes_reclaimed = 0
+        self.last_sweep = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='task-reaper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tasks_reclaimed': self.tasks_reclaimed,
+                'dirs_reclaimed': self.dirs_reclaimed,
+                'bytes_reclaimed': self.bytes_reclaimed,
+                'temp_bytes': sum(directory_size(d) for d in list(self.temp_directories)),
+                'last_sweep': self.last_sweep,
+            }
+
+    def sweep(self, now=None):
+        """Expire due tasks and enforce the disk budget. Returns the expired task IDs."""
+        now = time.time() if now is None else now
+        with self._lock:
+            finished = sorted(
+                (task.get('finished_at') or 0, task_id)
+                for task_id, task in list(download_tasks.items())
+                if task.get('status') in FINISHED_STATUSES
+            )
+            expired = [task_id for _, task_id in finished if self._is_due(download_tasks.get(task_id), now)]
+            for task_id in expired:
+                self._expire(task_id)
+
+            # Over budget: expire the oldest finished tasks whose files can be deleted
+            budget = CONFIG['TEMP_DISK_BUDGET_BYTES']
+            usage = sum(directory_size(d) for d in list(self.temp_directories))
+            for _, _, task_ids in self._reclaimable_dirs():
+                if usage <= budget:
+                    break
+                for task_id in task_ids:
+                    usage -= self._expire(task_id)
+                    expired.append(task_id)
+
+            self.last_sweep = now
+        if expired:
+            add_log(f"Reaper expired {len(expired)} task(s), {self.bytes_reclaimed} bytes reclaimed in total", 'DEBUG')
+        return expired
+
+    def _reclaimable_dirs(self):
+        """Temp dirs used only by finished tasks, oldest first, as (finished_at, temp_dir, task_ids).
+
+        Directories of running jobs and tasks whose file lives in the download
+        cache are left out: expiring those tasks would free nothing.
+        """
+        dirs = {}
+        active = set()
+        for task_id, task in list(download_tasks.items()):
+            temp_dir = task.get('temp_dir')
+            if not temp_dir:
+                continue
+            if task.get('status') not in FINISHED_STATUSES:
+                active.add(temp_dir)
+                continue
+            file_path = task.get('file_path')
+            if file_path and not file_path.startswith(os.path.join(temp_dir, '')):
+                continue
+            if not os.path.isdir(temp_dir):
+                continue
+            # A shared directory is freed only once all of its tasks have expired
+            finished_at, task_ids = dirs.get(temp_dir, (0, []))
+            dirs[temp_dir] = (max(finished_at, task.get('finished_at') or 0), task_ids + [task_id])
+        return sorted(
+            (finished_at, temp_dir, task_ids)
+            for temp_dir, (finished_at, task_ids) in dirs.items() if temp_dir not in active
+        )
+
+    def _is_due(self, task, now):
+        if task is None:
+            return False
+        fetched_at = task.get('fetched_at')
+        if fetched_at and now - fetched_at >= CONFIG['DOWNLOAD_RETENTION_AFTER_FETCH']:
+            return True
+        finished_at = task.get('finished_at')
+        return bool(finished_at) and now - finished_at >= CONFIG['TASK_TTL']
+
+    def _expire(self, task_id):
+        """Forget a task and delete its temp files. Returns the bytes reclaimed."""
+        task = download_tasks.pop(task_id, None)
+        if task is None:
+            return 0
+        self.tasks_reclaimed += 1
+
+        temp_dir = task.get('temp_dir')
+        if not temp_dir or not os.path.isdir(temp_dir):
+            return 0
+        file_path = task.get('file_path')
+        if file_path and inflight.pending_consumers(file_path):
+            # Shared with other tasks: the last one to go removes the directory
+            size = directory_size(temp_dir)
+            inflight.release(task_id, file_path)
+            if os.path.isdir(temp_dir):
+                return 0
+            self.dirs_reclaimed += 1
+            self.bytes_reclaimed += size
+            return size
+        return self._remove_dir(temp_dir)
+
+    def _remove_dir(self, temp_dir):
+        size = directory_size(temp_dir)
+        try:
+            shutil.rmtree(temp_dir)
+        except OSError as e:
+            add_log(f"Failed to delete temp dir: {e}", 'WARNING')
+            return 0
+        self.temp_directories.discard(temp_dir)
+        self.dirs_reclaimed += 1
+        self.bytes_reclaimed += size
+        return size
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                add_log(f"Reaper error: {e}", 'ERROR')
@@ -0,0 +1,90 @@
+import os
+import shutil
+import time
+
+from core.config import add_log
+from core.downloader import download_tasks, submit_task, update_task
+from core.scheduler import QueueFullError
+from core.singleflight import inflight
+
+UNFINISHED_STATUSES = ('queued', 'processing')
+
+
+def _journal():
+    return getattr(download_tasks, 'journal', None)
+
+
+def recover_jobs(temp_directories):
+    """Restore the tasks journaled by a previous run and resume its unfinished jobs.
+
+    Completed tasks whose file still exists keep working under their IDs.
+    Unfinished jobs are submitted again and continue their partial files.
+    Returns the IDs of the resubmitted tasks.
+    """
+    journal = _journal()
+    if journal is None:
+        return []
+
+    restored = {}
+    resume = []
+    for task_id, task in journal.replay().items():
+        status = task.get('status')
+        if status == 'completed' and not os.path.exists(task.get('file_path') or ''):
+            continue
+        if status in UNFINISHED_STATUSES:
+            if task.get('job') is None:
+                # Playlist batches and children that were never submitted
+                task.update(status='error', error='Interrupted by a restart', finished_at=time.time())
+            else:
+                task.update(status='queued', speed=None)
+                resume.append(task_id)
+        restored[task_id] = task
+
+    # The journal starts over from the restored state
+    journal.compact(restored)
+    shared_files = {}
+    for task_id, task in restored.items():
+        download_tasks.store[task_id] = task
+        temp_dir = task.get('temp_dir')
+        if temp_dir and os.path.isdir(temp_dir):
+            temp_directories.add(temp_dir)
+            if task['status'] == 'completed' and not task.get('fetched_at'):
+                shared_files.setdefault((task['file_path'], temp_dir), []).append(task_id)
+
+    # Files shared by several tasks are removed after the last fetch, as before the restart
+    for (file_path, temp_dir), task_ids in shared_files.items():
+        if len(task_ids) > 1:
+            inflight.track(file_path, task_ids, lambda d=temp_dir: _remove_dir(d, temp_directories))
+
+    resume.sort(key=lambda task_id: restored[task_id].get('created_at') or 0)
+    for task_id in resume:
+        task = restored[task_id]
+        job = task['job']
+        try:
+            submit_task(task_id, task['url'], task['format'], job.get('quality'), job.get('priority', 0),
+                        temp_directories, network=job.get('network'), audio_quality=job.get('audio_quality'),
+                        stream=job.get('stream', False), resume_dir=task.get('temp_dir'))
+        except QueueFullError:
+            update_task(task_id, status='error', error='Download queue is full', finished_at=time.time())
+
+    if restored:
+        add_log(f"Recovered {len(restored)} task(s) from the job journal, resuming {len(resume)}")
+    return resume
+
+
+def recoverable_dirs():
+    """Temp directories that the next start can still use."""
+    if _journal() is None:
+        return set()
+    return {
+        task['temp_dir'] for task in list(download_tasks.values())
+        if task.get('temp_dir') and task.get('status') != 'error'
+    }
+
+
+def _remove_dir(temp_dir, temp_directories):
+    try:
+        shutil.rmtree(temp_dir)
+        temp_directories.discard(temp_dir)
+    except OSError as e:
+        add_log(f"Failed to delete temp dir: {e}", 'WARNING')
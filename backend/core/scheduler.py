@@ -0,0 +1,154 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+
+from core.config import CONFIG, add_log
+from core.events import broker
+
+
+class QueueFullError(Exception):
+    """Raised when the download queue cannot accept more jobs."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Download queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class DownloadScheduler:
+    """Bounded worker pool that runs download jobs from a priority queue.
+
+    Jobs with a lower priority value run first; jobs with equal priority run
+    in submission (FIFO) order. At most limit jobs run at once; the upstream
+    circuit breaker lowers it while YouTube is throttling.
+    """
+
+    def __init__(self, max_workers=None, max_queue_size=None):
+        self.max_workers = max_workers or CONFIG['MAX_CONCURRENT_DOWNLOADS']
+        self.max_queue_size = max_queue_size or CONFIG['MAX_QUEUE_SIZE']
+        self._queue = []  # heap of (priority, seq, job)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._workers = []
+        self._active = {}
+        self._paused = False
+        self._avg_duration = None
+        self.limit = self.max_workers
+
+    def submit(self, job, priority=0):
+        """Queue a job and return its 1-based queue position."""
+        with self._cond:
+            if len(self._queue) >= self.max_queue_size:
+                raise QueueFullError(self._retry_after())
+            entry = (priority, next(self._seq), job)
+            heapq.heappush(self._queue, entry)
+            self._ensure_workers()
+            self._cond.notify()
+            return self._position(entry)
+
+    def queue_position(self, task_id):
+        """Return the 1-based queue position of a task, or None if not queued."""
+        with self._cond:
+            for entry in self._queue:
+                if task_id in entry[2].task_ids:
+                    return self._position(entry)
+        return None
+
+    def queue_positions(self):
+        """Return the 1-based queue position of every queued task."""
+        with self._cond:
+            ordered = sorted(self._queue)
+        positions = {}
+        for position, entry in enumerate(ordered, 1):
+            for task_id in entry[2].task_ids:
+                positions[task_id] = position
+        return positions
+
+    def stats(self):
+        with self._cond:
+            return {
+                'workers': self.max_workers,
+                'active': len(self._active),
+                'queued': len(self._queue),
+                'paused': self._paused,
+                'limit': self.limit,
+            }
+
+    def pause(self):
+        """Stop dispatching queued jobs; running jobs are not interrupted."""
+        with self._cond:
+            self._paused = True
+
+    def set_limit(self, limit):
+        """Allow at most limit jobs (0 to max_workers) to run at once.
+
+        Running jobs are not interrupted; the limit applies to starting new ones.
+        """
+        with self._cond:
+            self.limit = max(0, min(limit, self.max_workers))
+            self._cond.notify_all()
+
+    def resume(self):
+        with self._cond:
+            self._paused = False
+            self._cond.notify_all()
+
+    def clear(self):
+        """Cancel every queued job that has not started yet."""
+        with self._cond:
+            jobs = [entry[2] for entry in self._queue]
+            self._queue.clear()
+        for job in jobs:
+            job.fail('Download was cancelled')
+
+    def _position(self, entry):
+        # The heap is only partially ordered, so count the entries ahead of us
+        return sum(1 for other in self._queue if other < entry) + 1
+
+    def _retry_after(self):
+        avg = self._avg_duration or CONFIG['QUEUE_RETRY_AFTER']
+        estimate = math.ceil(avg * len(self._queue) / self.max_workers)
+        return max(CONFIG['QUEUE_RETRY_AFTER'], estimate)
+
+    def _ensure_workers(self):
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"download-worker-{len(self._workers) + 1}",
+                daemon=True
+            )
+            self._workers.append(worker)
+            worker.start()
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while self._paused or not self._queue or len(self._active) >= self.limit:
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._queue)
+                self._active[job.task_id] = job
+                waiting = [task_id for entry in self._queue for task_id in entry[2].task_ids]
+
+            # Every job still waiting has moved up one position
+            for task_id in waiting:
+                broker.publish(task_id)
+
+            started = time.monotonic()
+            try:
+                job.run()
+            except Exception as e:
+                add_log(f"Download worker error: {e}")
+            finally:
+                duration = time.monotonic() - started
+                with self._cond:
+                    self._active.pop(job.task_id, None)
+                    # A worker held back by the limit may start now
+                    self._cond.notify()
+                    if self._avg_duration is None:
+                        self._avg_duration = duration
+                    else:
+                        self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+
+
+scheduler = DownloadScheduler()
@@ -0,0 +1,76 @@
+import threading
+
+from core.cache import cache_key, normalize_quality
+
+
+def request_key(url, format_type, quality=None, audio_quality=None, stream=False):
+    """Key identifying download requests that produce the same file."""
+    key = cache_key(url, format_type, quality, audio_quality, stream)
+    if key is None:
+        key = f"{url}-{format_type}-{normalize_quality(quality)}-{audio_quality}" + ('-stream' if stream else '')
+    return key
+
+
+class InFlightRegistry:
+    """Single-flight registry that lets identical requests share one job.
+
+    While a job is queued or running, later requests with the same key are
+    attached to it instead of starting another download. Files that live in
+    a job's temp directory are reference counted per consuming task and the
+    directory is removed once every consumer has fetched the file.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._artifacts = {}  # file_path -> (consumers, cleanup)
+
+    def join_or_register(self, key, task_id, create_job):
+        """Attach task_id to the in-flight job for key, or register a new one.
+
+        Returns (job, created). create_job is only called when no job exists.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                job.attach(task_id)
+                return job, False
+            job = create_job()
+            self._jobs[key] = job
+            return job, True
+
+    def finish(self, key, job):
+        """Stop attaching new requests to job."""
+        with self._lock:
+            if self._jobs.get(key) is job:
+                del self._jobs[key]
+
+    def active_jobs(self):
+        with self._lock:
+            return len(self._jobs)
+
+    def track(self, file_path, task_ids, cleanup):
+        """Call cleanup once each of task_ids has fetched file_path."""
+        with self._lock:
+            self._artifacts[file_path] = (set(task_ids), cleanup)
+
+    def release(self, task_id, file_path):
+        """Record that task_id has fetched file_path, cleaning up after the last one."""
+        with self._lock:
+            artifact = self._artifacts.get(file_path)
+            if artifact is None:
+                return
+            consumers, cleanup = artifact
+            consumers.discard(task_id)
+            if consumers:
+                return
+            del self._artifacts[file_path]
+        cleanup()
+
+    def pending_consumers(self, file_path):
+        with self._lock:
+            artifact = self._artifacts.get(file_path)
+            return set(artifact[0]) if artifact else set()
+
+
+inflight = InFlightRegistry()
@@ -0,0 +1,75 @@
+from core.config import CONFIG, add_log
+from core.downloader import download_tasks
+from core.events import broker
+
+# mp4 qualities that select a single progressive stream, so nothing is merged afterwards
+STREAMABLE_MP4_QUALITIES = (None, 'auto', 'medium', 'low')
+
+
+class StreamAborted(Exception):
+    """Raised mid-response so that the client sees a truncated transfer."""
+
+
+def is_streamable(format_type, quality=None):
+    """Whether a request downloads a single stream that is served byte for byte."""
+    if format_type == 'mp4':
+        return quality in STREAMABLE_MP4_QUALITIES
+    # Every other audio format is converted after the download
+    return format_type == 'm4a'
+
+
+def _read_from(paths, offset, size):
+    """Read up to size bytes at offset from the first of paths that exists."""
+    for path in paths:
+        if not path:
+            continue
+        try:
+            # Reopened on every read: an open handle would stop yt-dlp from
+            # renaming the .part file on Windows
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                return f.read(size)
+        except FileNotFoundError:
+            continue
+    return None
+
+
+def iter_growing_file(task_id, chunk_size=None, poll_interval=None):
+    """Yield a task's file from the start while the download is still writing it.
+
+    Follows the file as it moves from yt-dlp's .part file to the finished
+    download and then into the cache, which all hold the same bytes.
+    """
+    chunk_size = chunk_size or CONFIG['STREAM_CHUNK_SIZE']
+    poll_interval = poll_interval or CONFIG['STREAM_POLL_INTERVAL']
+    subscription = broker.subscribe(task_id)
+    offset = 0
+    try:
+        while True:
+            task = download_tasks.get(task_id)
+            if task is None:
+                raise StreamAborted(f"Task disappeared while streaming: {task_id}")
+
+            completed = task['status'] == 'completed'
+            paths = (task.get('stream_path'), task.get('stream_file'), task.get('file_path'))
+            data = _read_from(paths, offset, chunk_size)
+            if data:
+                offset += len(data)
+                yield data
+                continue
+
+            if completed:
+                size = task.get('stream_size')
+                if size is not None and offset < size:
+                    raise StreamAborted(f"Streamed file ended early at {offset} of {size} bytes")
+                return
+            if task['status'] == 'error':
+                raise StreamAborted(f"Download failed while streaming: {task.get('error')}")
+
+            # Wake on the next task update, or poll for bytes written in between
+            subscription.wait(poll_interval)
+    except StreamAborted as e:
+        add_log(str(e), 'WARNING', task_id)
+        raise
+    finally:
+        broker.unsubscribe(subscription)
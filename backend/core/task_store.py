@@ -0,0 +1,333 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+
+from core.config import CONFIG
+from core.progress import PROGRESS_FIELDS
+
+
+class TaskStore(MutableMapping):
+    """Mapping of task_id -> task state dict.
+
+    Dicts returned by a store must be treated as read-only snapshots; use
+    merge() to change a task so that every backend sees the update.
+    """
+
+    # True when the state is shared with other processes
+    shared = False
+
+    def merge(self, task_id, fields):
+        """Update fields of an existing task. Returns False if the task is unknown."""
+        raise NotImplementedError
+
+    def get_many(self, task_ids):
+        """Return a dict of the known tasks among task_ids."""
+        tasks = {}
+        for task_id in task_ids:
+            task = self.get(task_id)
+            if task is not None:
+                tasks[task_id] = task
+        return tasks
+
+
+class InMemoryTaskStore(TaskStore):
+    """Task store backed by a dict; state is private to the current process."""
+
+    def __init__(self):
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, task_id):
+        return self._tasks[task_id]
+
+    def __setitem__(self, task_id, task):
+        with self._lock:
+            self._tasks[task_id] = dict(task)
+
+    def __delitem__(self, task_id):
+        with self._lock:
+            del self._tasks[task_id]
+
+    def __iter__(self):
+        return iter(list(self._tasks))
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __contains__(self, task_id):
+        return task_id in self._tasks
+
+    def merge(self, task_id, fields):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return False
+            task.update(fields)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._tasks.clear()
+
+
+class SQLiteTaskStore(TaskStore):
+    """Task store in a SQLite database in WAL mode, shared by every process.
+
+    Lets gunicorn workers answer /status for downloads started by another
+    worker. Each thread uses its own connection.
+    """
+
+    shared = True
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS tasks ('
+                'task_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)'
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def __getitem__(self, task_id):
+        row = self._connect().execute(
+            'SELECT data FROM tasks WHERE task_id = ?', (task_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(task_id)
+        return json.loads(row[0])
+
+    def __setitem__(self, task_id, task):
+        self._connect().execute(
+            'INSERT OR REPLACE INTO tasks (task_id, data, updated_at) VALUES (?, ?, ?)',
+            (task_id, json.dumps(task), time.time())
+        )
+
+    def __delitem__(self, task_id):
+        cursor = self._connect().execute('DELETE FROM tasks WHERE task_id = ?', (task_id,))
+        if cursor.rowcount == 0:
+            raise KeyError(task_id)
+
+    def __iter__(self):
+        rows = self._connect().execute('SELECT task_id FROM tasks').fetchall()
+        return iter([row[0] for row in rows])
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+
+    def __contains__(self, task_id):
+        return self._connect().execute(
+            'SELECT 1 FROM tasks WHERE task_id = ?', (task_id,)
+        ).fetchone() is not None
+
+    def items(self):
+        rows = self._connect().execute('SELECT task_id, data FROM tasks').fetchall()
+        return [(task_id, json.loads(data)) for task_id, data in rows]
+
+    def get_many(self, task_ids):
+        task_ids = list(dict.fromkeys(task_ids))
+        conn = self._connect()
+        tasks = {}
+        # Stay below SQLite's limit on bound parameters
+        for start in range(0, len(task_ids), 500):
+            chunk = task_ids[start:start + 500]
+            rows = conn.execute(
+                f"SELECT task_id, data FROM tasks WHERE task_id IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            tasks.update((task_id, json.loads(data)) for task_id, data in rows)
+        return tasks
+
+    def merge(self, task_id, fields):
+        conn = self._connect()
+        # Take the write lock up front so concurrent merges cannot lose updates
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT data FROM tasks WHERE task_id = ?', (task_id,)).fetchone()
+            if row is None:
+                conn.execute('ROLLBACK')
+                return False
+            task = json.loads(row[0])
+            task.update(fields)
+            conn.execute(
+                'UPDATE tasks SET data = ?, updated_at = ? WHERE task_id = ?',
+                (json.dumps(task), time.time(), task_id)
+            )
+            conn.execute('COMMIT')
+            return True
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def clear(self):
+        self._connect().execute('DELETE FROM tasks')
+
+
+class JobJournal:
+    """Append-only log of task changes in a SQLite database in WAL mode.
+
+    Each row is a full task ('set'), changed fields ('merge') or a removal
+    ('delete'); replay() folds them back into the latest task states.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connect().execute(
+            'CREATE TABLE IF NOT EXISTS journal ('
+            'seq INTEGER PRIMARY KEY AUTOINCREMENT, task_id TEXT NOT NULL, '
+            'op TEXT NOT NULL, data TEXT, recorded_at REAL NOT NULL)'
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def append(self, task_id, op, data=None):
+        self._connect().execute(
+            'INSERT INTO journal (task_id, op, data, recorded_at) VALUES (?, ?, ?, ?)',
+            (task_id, op, json.dumps(data) if data is not None else None, time.time())
+        )
+
+    def replay(self):
+        """Return a dict of task_id -> latest state, in order of first appearance."""
+        states = {}
+        for task_id, op, data in self._connect().execute('SELECT task_id, op, data FROM journal ORDER BY seq'):
+            if op == 'delete':
+                states.pop(task_id, None)
+            elif op == 'set':
+                states[task_id] = json.loads(data)
+            elif task_id in states:
+                states[task_id].update(json.loads(data))
+        return states
+
+    def compact(self, states):
+        """Replace the log with one 'set' row per task in states."""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM journal')
+            now = time.time()
+            conn.executemany(
+                'INSERT INTO journal (task_id, op, data, recorded_at) VALUES (?, ?, ?, ?)',
+                [(task_id, 'set', json.dumps(task), now) for task_id, task in states.items()]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM journal').fetchone()[0]
+
+
+class JournaledTaskStore(TaskStore):
+    """Wraps a task store and records every change in a JobJournal.
+
+    Progress-only updates are not journaled; a restarted job reports its own
+    progress again. After JOB_JOURNAL_COMPACT_EVERY appends the journal is
+    compacted to the current task states, so it stays bounded on a server
+    that runs for a long time.
+    """
+
+    VOLATILE_FIELDS = PROGRESS_FIELDS | {'eta'}
+
+    def __init__(self, store, journal, compact_every=None):
+        self.store = store
+        self.journal = journal
+        self.shared = store.shared
+        self.compact_every = compact_every or CONFIG['JOB_JOURNAL_COMPACT_EVERY']
+        # Held across each change and its journal row, so compaction never drops a change
+        self._lock = threading.Lock()
+        self._appends = 0
+
+    def __getitem__(self, task_id):
+        return self.store[task_id]
+
+    def __setitem__(self, task_id, task):
+        with self._lock:
+            self.store[task_id] = task
+            self._append(task_id, 'set', dict(task))
+
+    def __delitem__(self, task_id):
+        with self._lock:
+            del self.store[task_id]
+            self._append(task_id, 'delete')
+
+    def __iter__(self):
+        return iter(self.store)
+
+    def __len__(self):
+        return len(self.store)
+
+    def __contains__(self, task_id):
+        return task_id in self.store
+
+    def get_many(self, task_ids):
+        return self.store.get_many(task_ids)
+
+    def merge(self, task_id, fields):
+        if self.VOLATILE_FIELDS.issuperset(fields):
+            return self.store.merge(task_id, fields)
+        with self._lock:
+            if not self.store.merge(task_id, fields):
+                return False
+            self._append(task_id, 'merge', fields)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self.store.clear()
+            self.journal.compact({})
+            self._appends = 0
+
+    def compact(self):
+        """Replace the journal with the current state of every task."""
+        with self._lock:
+            self._compact()
+
+    def _append(self, task_id, op, data=None):
+        self.journal.append(task_id, op, data)
+        self._appends += 1
+        if self._appends >= self.compact_every:
+            self._compact()
+
+    def _compact(self):
+        states = {}
+        for task_id in self.store:
+            task = self.store.get(task_id)
+            if task is not None:
+                states[task_id] = dict(task)
+        self.journal.compact(states)
+        self._appends = 0
+
+
+def create_task_store(backend=None, path=None):
+    """Create the task store selected by CONFIG['TASK_STORE']."""
+    backend = backend or CONFIG['TASK_STORE']
+    if backend == 'memory':
+        if CONFIG['JOB_JOURNAL']:
+            return JournaledTaskStore(InMemoryTaskStore(), JobJournal(CONFIG['JOB_JOURNAL_PATH']))
+        return InMemoryTaskStore()
+    if backend == 'sqlite':
+        return SQLiteTaskStore(path or CONFIG['TASK_STORE_PATH'])
+    raise ValueError(f"Unknown task store backend: {backend}")
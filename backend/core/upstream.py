@@ -0,0 +1,212 @@
+import random
+import re
+import threading
+import time
+from collections import deque
+
+from core.config import CONFIG, add_log
+from core.metrics import UPSTREAM_ERRORS
+from core.scheduler import scheduler
+
+# (category, pattern, retryable), checked in order against the error message.
+# 'throttled' and 'forbidden' are what YouTube answers when it rate-limits a
+# client; a 403 is also what an expired stream URL gets, so it is retried with
+# freshly extracted info.
+ERROR_CLASSES = (
+    ('throttled', re.compile(r'HTTP Error 429|Too Many Requests|rate[- ]limit|throttl', re.I), True),
+    ('forbidden', re.compile(r'HTTP Error 403|Forbidden', re.I), True),
+    ('unavailable', re.compile(
+        r'Video unavailable|Private video|has been removed|not available|copyright|'
+        r'Sign in to confirm your age|members-only|HTTP Error 404|Unsupported URL', re.I), False),
+    ('server', re.compile(r'HTTP Error 5\d\d', re.I), True),
+    ('network', re.compile(
+        r'timed? ?out|Connection (reset|refused|aborted)|Remote end closed|IncompleteRead|'
+        r'Unable to download webpage|Temporary failure|Name or service not known|getaddrinfo', re.I), True),
+)
+
+# Categories that say something about the health of the upstream service
+UPSTREAM_CATEGORIES = ('throttled', 'forbidden', 'server', 'network')
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class UpstreamError:
+    """Classification of a failed extraction or download."""
+
+    __slots__ = ('category', 'retryable', 'message')
+
+    def __init__(self, category, retryable, message):
+        self.category = category
+        self.retryable = retryable
+        self.message = message
+
+    @property
+    def upstream(self):
+        return self.category in UPSTREAM_CATEGORIES
+
+
+def classify_error(error):
+    """Classify an exception (or message) raised by yt-dlp."""
+    message = str(error)
+    for category, pattern, retryable in ERROR_CLASSES:
+        if pattern.search(message):
+            return UpstreamError(category, retryable, message)
+    return UpstreamError('unknown', False, message)
+
+
+def backoff_delay(attempt, base=None, cap=None, rng=random):
+    """Full-jitter exponential backoff: a random delay up to base * 2**attempt, at most cap."""
+    base = CONFIG['UPSTREAM_RETRY_BASE_DELAY'] if base is None else base
+    cap = CONFIG['UPSTREAM_RETRY_MAX_DELAY'] if cap is None else cap
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Shared view of upstream health that steers the download scheduler.
+
+    Outcomes of download attempts are kept for UPSTREAM_WINDOW seconds. When
+    at least UPSTREAM_MIN_SAMPLES of them show a failure rate of
+    UPSTREAM_FAILURE_THRESHOLD or more, the circuit opens: the scheduler
+    starts no new jobs for a cooldown that doubles each time the circuit
+    opens again, up to UPSTREAM_MAX_COOLDOWN. Afterwards it is half-open
+    and runs one job at a time; every success allows one more concurrent job
+    until the full worker count is reached and the circuit closes. A
+    failure while half-open opens it again.
+
+    While closed, a throttled response halves the allowed concurrency (at
+    most once per UPSTREAM_WINDOW) and successes raise it again one by one.
+    """
+
+    def __init__(self, scheduler, window=None, threshold=None, min_samples=None,
+                 cooldown=None, max_cooldown=None):
+        self.scheduler = scheduler
+        self.window = window or CONFIG['UPSTREAM_WINDOW']
+        self.threshold = threshold or CONFIG['UPSTREAM_FAILURE_THRESHOLD']
+        self.min_samples = min_samples or CONFIG['UPSTREAM_MIN_SAMPLES']
+        self.base_cooldown = cooldown or CONFIG['UPSTREAM_COOLDOWN']
+        self.max_cooldown = max_cooldown or CONFIG['UPSTREAM_MAX_COOLDOWN']
+        self.cooldown = self.base_cooldown
+        self.state = CLOSED
+        self._outcomes = deque()  # (time, ok)
+        self._lock = threading.Lock()
+        self._timer = None
+        self._opened_until = None
+        self._last_decrease = None
+        self.opened = 0
+
+    @property
+    def max_concurrency(self):
+        return self.scheduler.max_workers
+
+    def record_success(self):
+        with self._lock:
+            self._record(True)
+            limit = self.scheduler.limit
+            if self.state == HALF_OPEN:
+                limit += 1
+                if limit >= self.max_concurrency:
+                    self._close()
+                    return
+                self.scheduler.set_limit(limit)
+            elif self.state == CLOSED and limit < self.max_concurrency:
+                self.scheduler.set_limit(limit + 1)
+
+    def record_failure(self, failure):
+        """Count a classified failure; only upstream failures affect the circuit."""
+        UPSTREAM_ERRORS.inc(category=failure.category)
+        if not failure.upstream:
+            return
+        with self._lock:
+            self._record(False)
+            if self.state == HALF_OPEN:
+                self._open(f"{failure.category} error while recovering")
+            elif self.state == CLOSED:
+                failures, total = self._failure_counts()
+                if total >= self.min_samples and failures / total >= self.threshold:
+                    self._open(f"{failures} of the last {total} attempts failed")
+                elif failure.category == 'throttled':
+                    self._decrease()
+
+    def wait_time(self):
+        """Seconds until the circuit stops being open, 0 if it is not."""
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self._opened_until - time.monotonic())
+
+    def stats(self):
+        with self._lock:
+            failures, total = self._failure_counts()
+            return {
+                'state': self.state,
+                'concurrency': self.scheduler.limit,
+                'max_concurrency': self.max_concurrency,
+                'failure_rate': failures / total if total else 0.0,
+                'samples': total,
+                'cooldown': self.cooldown,
+                'opened': self.opened,
+            }
+
+    def reset(self):
+        with self._lock:
+            self._outcomes.clear()
+            self.opened = 0
+            self._close()
+
+    def _record(self, ok):
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def _failure_counts(self):
+        return sum(1 for _, ok in self._outcomes if not ok), len(self._outcomes)
+
+    def _open(self, reason):
+        if self.state == HALF_OPEN:
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+        self.state = OPEN
+        self.opened += 1
+        self._opened_until = time.monotonic() + self.cooldown
+        self.scheduler.set_limit(0)
+        self._schedule(self.cooldown, self._half_open)
+        add_log(f"Upstream circuit opened ({reason}), pausing downloads for {self.cooldown:.0f}s", 'WARNING')
+
+    def _half_open(self):
+        with self._lock:
+            if self.state != OPEN:
+                return
+            self.state = HALF_OPEN
+            self._outcomes.clear()
+            self.scheduler.set_limit(1)
+        add_log("Upstream circuit half-open, resuming downloads one at a time")
+
+    def _close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self.state != CLOSED:
+            add_log("Upstream circuit closed, downloads run at full concurrency")
+        self.state = CLOSED
+        self.cooldown = self.base_cooldown
+        self.scheduler.set_limit(self.max_concurrency)
+
+    def _decrease(self):
+        now = time.monotonic()
+        if self._last_decrease is not None and now - self._last_decrease < self.window:
+            return
+        self._last_decrease = now
+        limit = max(1, self.scheduler.limit // 2)
+        if limit < self.scheduler.limit:
+            self.scheduler.set_limit(limit)
+            add_log(f"Upstream is throttling, lowering download concurrency to {limit}", 'WARNING')
+
+    def _schedule(self, delay, fn):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, fn)
+        self._timer.daemon = True
+        self._timer.start()
+
+
+breaker = CircuitBreaker(scheduler)
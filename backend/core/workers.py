@@ -0,0 +1,375 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+from contextlib import contextmanager
+
+from core.config import CONFIG, add_log
+
+# Hook fields that the parent's progress and post-processor handling read.
+# The rest (info_dict in particular) is large and may not pickle.
+HOOK_FIELDS = ('status', 'downloaded_bytes', 'total_bytes', 'total_bytes_estimate', 'speed', 'eta',
+               'elapsed', 'fragment_index', 'fragment_count', 'tmpfilename', 'filename', 'postprocessor')
+
+
+# Exit code of a worker that stopped itself for using more than its memory limit
+MEMORY_EXIT_CODE = 86
+MEMORY_CHECK_INTERVAL = 1.0  # seconds
+
+
+class WorkerError(Exception):
+    """A job failed inside a worker process; the message is the worker's error."""
+
+
+class WorkerCrashed(WorkerError):
+    """The worker process died while running a job."""
+
+
+class _Worker:
+    """One worker process and the parent's end of its pipe."""
+
+    def __init__(self, ctx, memory_limit):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=worker_main, args=(child_conn, memory_limit),
+                                   name='download-process', daemon=True)
+        self.process.start()
+        # Without the parent's copy of the child's end, recv() sees EOF when the child dies
+        child_conn.close()
+        self.jobs = 0
+        self.rss = None
+
+    def stop(self, timeout=5):
+        try:
+            self.conn.send(('stop', None))
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class ProcessPool:
+    """Worker processes that run the yt-dlp part of download jobs.
+
+    Extraction, format selection and the download itself run in a worker, so
+    they neither hold the server's GIL nor grow its memory. Progress events
+    are sent back over the worker's pipe without waiting for a reply and are
+    handled in the calling thread; when the governor holds the job back, the
+    worker is told to pause. Post-processor events wait for their reply, so
+    that ffmpeg slots are still shared. A worker is replaced after
+    WORKER_MAX_JOBS jobs, when its resident memory exceeds
+    WORKER_MAX_RSS_BYTES after a job, or when it dies. A worker whose resident
+    memory exceeds WORKER_MEMORY_LIMIT_BYTES exits at once, failing its job.
+
+    Workers are spawned without the parent's __main__ module, so starting
+    one does not run the server script (app.py or webview_app.py) again.
+    """
+
+    def __init__(self, max_workers=None, max_jobs=None, max_rss=None, memory_limit=None):
+        self.max_workers = max_workers or CONFIG['MAX_CONCURRENT_DOWNLOADS']
+        self.max_jobs = max_jobs or CONFIG['WORKER_MAX_JOBS']
+        self.max_rss = max_rss or CONFIG['WORKER_MAX_RSS_BYTES']
+        self.memory_limit = memory_limit or CONFIG['WORKER_MEMORY_LIMIT_BYTES']
+        self._ctx = multiprocessing.get_context('spawn')
+        self._idle = []
+        self._busy = 0
+        self._lock = threading.Lock()
+        self.started = 0
+        self.recycled = 0
+        self.crashed = 0
+
+    def run(self, url, opts, info, handler):
+        """Download url in a worker process and return once it has finished.
+
+        opts are YoutubeDL options without hooks. info is a cached extractor
+        result, or None to extract in the worker. handler(kind, payload) is
+        called with ('progress', d) and ('postprocessor', d) for the hooks and
+        with ('info', (info, seconds)) after an extraction; an exception it
+        raises aborts the job. For progress events it may return a number of
+        seconds for the worker to pause. Raises WorkerError when the job fails.
+        """
+        worker = self._take()
+        crashed = False
+        # False while the worker may still be running the job
+        finished = False
+        try:
+            self._send(worker, ('job', {'url': url, 'opts': opts, 'info': info}))
+            while True:
+                kind, payload = self._recv(worker)
+                if kind == 'done':
+                    finished = True
+                    worker.rss = payload.get('rss')
+                    return
+                if kind == 'error':
+                    finished = True
+                    raise WorkerError(payload)
+                try:
+                    result = handler(kind, payload)
+                except Exception as e:
+                    self._send(worker, ('abort', str(e)))
+                    raise
+                if kind == 'progress':
+                    if result:
+                        self._send(worker, ('pause', result))
+                elif kind == 'postprocessor':
+                    # The worker waits for this reply before the post-processor runs
+                    self._send(worker, ('ok', None))
+        except WorkerCrashed:
+            crashed = True
+            raise
+        finally:
+            worker.jobs += 1
+            self._give_back(worker, crashed, finished)
+
+    def _send(self, worker, message):
+        try:
+            worker.conn.send(message)
+        except OSError:
+            raise self._crashed(worker) from None
+
+    def _recv(self, worker):
+        try:
+            return worker.conn.recv()
+        except (EOFError, OSError):
+            raise self._crashed(worker) from None
+
+    def _crashed(self, worker):
+        worker.process.join(1)
+        if worker.process.exitcode == MEMORY_EXIT_CODE:
+            return WorkerCrashed(f"Download worker exceeded its memory limit of "
+                                 f"{self.memory_limit / 1024 ** 2:.0f} MiB")
+        return WorkerCrashed(f"Download worker exited unexpectedly (exit code {worker.process.exitcode})")
+
+    def warm(self, count=None):
+        """Start idle workers ahead of the first jobs."""
+        count = self.max_workers if count is None else min(count, self.max_workers)
+        while True:
+            with self._lock:
+                if len(self._idle) + self._busy >= count:
+                    return
+            worker = self._start()
+            with self._lock:
+                self._idle.append(worker)
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'idle': len(self._idle),
+                'busy': self._busy,
+                'started': self.started,
+                'recycled': self.recycled,
+                'crashed': self.crashed,
+                'max_jobs': self.max_jobs,
+                'max_rss_bytes': self.max_rss,
+            }
+
+    def _start(self):
+        with _spawn_lock, _without_main_module():
+            worker = _Worker(self._ctx, self.memory_limit)
+        with self._lock:
+            self.started += 1
+        return worker
+
+    def _take(self):
+        with self._lock:
+            self._busy += 1
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                self.crashed += 1
+        try:
+            return self._start()
+        except BaseException:
+            with self._lock:
+                self._busy -= 1
+            raise
+
+    def _give_back(self, worker, crashed, finished):
+        if crashed:
+            reason = None
+        elif not finished:
+            # Its remaining messages would be read by the next job
+            reason = "after an aborted job"
+        elif worker.jobs >= self.max_jobs:
+            reason = f"after {worker.jobs} jobs"
+        elif worker.rss and worker.rss > self.max_rss:
+            reason = f"at {worker.rss / 1024 ** 2:.0f} MiB resident"
+        else:
+            with self._lock:
+                self._busy -= 1
+                self._idle.append(worker)
+            return
+
+        with self._lock:
+            self._busy -= 1
+            if crashed:
+                self.crashed += 1
+            else:
+                self.recycled += 1
+        if reason:
+            add_log(f"Recycling download worker {worker.process.pid} {reason}", 'DEBUG')
+        worker.stop(timeout=5 if finished else 0)
+
+
+_spawn_lock = threading.Lock()
+
+
+@contextmanager
+def _without_main_module():
+    """Hide __main__ from multiprocessing while a worker is spawned.
+
+    spawn re-imports the parent's main script in the child, which for this
+    app would create another Flask app, start the reaper and load the
+    frontend. Workers only need this module, which they import to unpickle
+    worker_main.
+    """
+    main = sys.modules.get('__main__')
+    sys.modules['__main__'] = types.ModuleType('__main__')
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = main
+
+
+process_pool = ProcessPool()
+
+
+# --- Worker process side ---
+
+def worker_main(conn, memory_limit=None):
+    """Entry point of a worker process: run jobs until told to stop."""
+    _watch_memory(memory_limit)
+    while True:
+        try:
+            kind, job = conn.recv()
+        except (EOFError, OSError, KeyboardInterrupt):
+            return
+        if kind == 'stop':
+            return
+        if kind != 'job':
+            # A pause that arrived after the previous job had finished
+            continue
+        try:
+            _run_job(conn, job)
+        except Exception as e:
+            conn.send(('error', str(e)))
+        else:
+            conn.send(('done', {'rss': _resident_memory()}))
+
+
+def _run_job(conn, job):
+    from core.ytdl import ydl_pool
+
+    info = job['info']
+    if info is None:
+        started = time.monotonic()
+        with ydl_pool.borrow({'skip_download': True}) as ydl:
+            info = ydl.extract_info(job['url'], download=False, process=False)
+        conn.send(('info', (info, time.monotonic() - started)))
+
+    relay = _HookRelay(conn)
+    opts = dict(job['opts'], progress_hooks=[relay.progress], postprocessor_hooks=[relay.postprocessor])
+    with ydl_pool.borrow(opts) as ydl:
+        ydl.process_ie_result(info, download=True)
+
+
+class _HookRelay:
+    """Sends a job's hook events to the parent and applies its pause and abort messages."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.resume_at = 0.0
+
+    def progress(self, d):
+        self.conn.send(('progress', _hook_fields(d)))
+        while self.conn.poll():
+            self._handle(*self.conn.recv())
+        delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def postprocessor(self, d):
+        self.conn.send(('postprocessor', _hook_fields(d)))
+        # The parent answers once the post-processor may run
+        while self._handle(*self.conn.recv()) != 'ok':
+            pass
+
+    def _handle(self, kind, payload):
+        if kind == 'abort':
+            raise WorkerError(payload)
+        if kind == 'pause':
+            # Pauses sent for events still in the pipe overlap rather than add up
+            self.resume_at = max(self.resume_at, time.monotonic() + payload)
+        return kind
+
+
+def _hook_fields(d):
+    return {key: d[key] for key in HOOK_FIELDS if key in d}
+
+
+def _watch_memory(limit):
+    """Exit the worker as soon as its resident memory exceeds limit.
+
+    Resident memory rather than an address-space rlimit: RLIMIT_AS would also
+    count thread stacks and malloc arenas, and ffmpeg children inherit it.
+    The parent sees the exit code and reports the job as failed.
+    """
+    if not limit:
+        return
+
+    def watch():
+        while True:
+            time.sleep(MEMORY_CHECK_INTERVAL)
+            rss = _resident_memory()
+            if rss is not None and rss > limit:
+                os._exit(MEMORY_EXIT_CODE)
+
+    threading.Thread(target=watch, name='memory-watchdog', daemon=True).start()
+
+
+def _resident_memory():
+    """Current resident memory of this process in bytes, or None."""
+    try:
+        if sys.platform == 'win32':
+            return _windows_working_set()
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Peak rather than current; kilobytes except on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        return None
+
+
+def _windows_working_set():
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in (
+                'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return None
+    return counters.WorkingSetSize
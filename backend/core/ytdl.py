@@ -0,0 +1,203 @@
+import copy
+import threading
+import time
+from contextlib import contextmanager
+
+from core.config import CONFIG, add_log
+from startup import startup_timer
+
+_module = None
+_import_lock = threading.Lock()
+
+# Per-job state of a YoutubeDL that is reset before an instance is reused
+_RESET_ATTRIBUTES = {
+    '_download_retcode': lambda: 0,
+    '_num_downloads': lambda: 0,
+    '_num_videos': lambda: 0,
+    '_playlist_level': lambda: 0,
+    '_playlist_urls': set,
+    '_printed_messages': set,
+}
+
+# Internals that reconfiguring an instance relies on. yt-dlp does not promise
+# to keep them, so the pool falls back to fresh instances when one is missing.
+_REUSE_ATTRIBUTES = ('_parse_outtmpl', 'build_format_selector', 'format_selector',
+                     '_progress_hooks', '_postprocessor_hooks') + tuple(_RESET_ATTRIBUTES)
+
+
+def load():
+    """Import yt-dlp on first use and return the module.
+
+    Importing it takes a noticeable part of a second, so the server starts
+    without it and preload() imports it in the background.
+    """
+    global _module
+    if _module is None:
+        with _import_lock:
+            if _module is None:
+                started = time.monotonic()
+                import yt_dlp
+                _module = yt_dlp
+                add_log(f"Loaded yt-dlp {yt_dlp.version.__version__} in {time.monotonic() - started:.2f}s", 'DEBUG')
+    return _module
+
+
+def download_error():
+    """yt-dlp's DownloadError, for except clauses that must not import it early."""
+    return load().utils.DownloadError
+
+
+class YoutubeDLPool:
+    """Reusable YoutubeDL instances, each borrowed by one job at a time.
+
+    A YoutubeDL builds its extractor registry, cookie jar and HTTP handlers
+    when it is created. A reused instance skips that, keeps its extractors'
+    caches (such as YouTube's player code) and its keep-alive connections.
+    borrow() applies a job's options to the instance; an instance whose job
+    raised is closed instead of being reused. Reuse depends on yt-dlp
+    internals; if a release renames them, every job gets a new instance.
+    """
+
+    BASE_PARAMS = {'quiet': True, 'no_warnings': True}
+
+    def __init__(self, max_idle=None):
+        self.max_idle = max_idle or CONFIG['YDL_POOL_SIZE'] or CONFIG['MAX_CONCURRENT_DOWNLOADS'] + 1
+        self._idle = []
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        # Decided on the first instance, see _REUSE_ATTRIBUTES
+        self.reusable = None
+
+    @contextmanager
+    def borrow(self, opts=None):
+        if not self._check_reusable():
+            ydl = self._create(opts)
+            try:
+                yield ydl
+            finally:
+                self._discard(ydl)
+            return
+
+        ydl = self._take()
+        self._configure(ydl, opts or {})
+        try:
+            yield ydl
+        except BaseException:
+            self._discard(ydl)
+            raise
+        self._give_back(ydl)
+
+    def warm(self, count=None):
+        """Create idle instances ahead of the first jobs."""
+        count = self.max_idle if count is None else min(count, self.max_idle)
+        if not self._check_reusable():
+            return
+        while True:
+            with self._lock:
+                if len(self._idle) >= count:
+                    return
+            ydl = self._create()
+            with self._lock:
+                self._idle.append(ydl)
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for ydl in idle:
+            ydl.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'idle': len(self._idle),
+                'max_idle': self.max_idle,
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded,
+                'reusable': self.reusable,
+            }
+
+    def _check_reusable(self):
+        if self.reusable is None:
+            missing = missing_reuse_attributes(load().YoutubeDL)
+            if missing:
+                add_log(f"yt-dlp lacks {', '.join(missing)}; YoutubeDL instances will not be reused", 'WARNING')
+            self.reusable = not missing
+        return self.reusable
+
+    def _create(self, opts=None):
+        ydl = load().YoutubeDL(dict(self.BASE_PARAMS, **(opts or {})))
+        if opts is None:
+            # Includes the defaults __init__ filled in (compat_opts, http_headers, ...)
+            ydl._pool_params = copy.deepcopy(dict(ydl.params))
+        with self._lock:
+            self.created += 1
+        return ydl
+
+    def _take(self):
+        with self._lock:
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop()
+        return self._create()
+
+    def _configure(self, ydl, opts):
+        """Apply a job's options, mirroring what YoutubeDL.__init__ derives from them."""
+        params = copy.deepcopy(ydl._pool_params)
+        params.update(opts)
+        ydl.params = params
+        ydl._parse_outtmpl()
+        fmt = params.get('format')
+        ydl.format_selector = fmt if fmt in (None, '-') or callable(fmt) else ydl.build_format_selector(fmt)
+        ydl._progress_hooks = list(params.get('progress_hooks', []))
+        ydl._postprocessor_hooks = list(params.get('postprocessor_hooks', []))
+        for name, initial in _RESET_ATTRIBUTES.items():
+            setattr(ydl, name, initial())
+
+    def _give_back(self, ydl):
+        # Drop the job's hooks so that an idle instance does not keep it alive
+        self._configure(ydl, {})
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(ydl)
+                return
+        self._discard(ydl)
+
+    def _discard(self, ydl):
+        with self._lock:
+            self.discarded += 1
+        try:
+            ydl.close()
+        except Exception as e:
+            add_log(f"Failed to close a YoutubeDL instance: {e}", 'WARNING')
+
+
+def missing_reuse_attributes(youtube_dl_class):
+    """Return the internals of youtube_dl_class that the pool needs but cannot find."""
+    ydl = youtube_dl_class(dict(YoutubeDLPool.BASE_PARAMS))
+    try:
+        return [name for name in _REUSE_ATTRIBUTES if not hasattr(ydl, name)]
+    finally:
+        ydl.close()
+
+
+ydl_pool = YoutubeDLPool()
+
+
+def preload():
+    """Import yt-dlp and fill the instance pool (and process pool) in a background thread."""
+    def run():
+        try:
+            with startup_timer.phase('yt-dlp'):
+                ydl_pool.warm()
+            if CONFIG['EXECUTION_BACKEND'] == 'process':
+                from core.workers import process_pool
+                process_pool.warm()
+        except Exception as e:
+            add_log(f"Failed to preload yt-dlp: {e}", 'WARNING')
+
+    thread = threading.Thread(target=run, name='yt-dlp-preload', daemon=True)
+    thread.start()
+    return thread
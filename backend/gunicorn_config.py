@@ -1,4 +1,20 @@
-# Gunicorn configuration file
+"""Gunicorn configuration file.
+
+Downloads are scheduled inside the process that accepted them: each worker
+process has its own download scheduler, single-flight registry, cache index
+and task reaper. Only task state can be shared between processes (the
+SQLite task store). So the default runs a single gthread worker, where
+MAX_CONCURRENT_DOWNLOADS, MAX_QUEUE_SIZE, request deduplication, queue
+positions and disk cleanup all apply to the whole server.
+
+With GUNICORN_WORKERS > 1 (or the sync profile) every process schedules its
+own downloads: up to workers x MAX_CONCURRENT_DOWNLOADS run at once, the
+queue limit applies per process, identical requests served by different
+workers are downloaded twice, /status reports no queue position for jobs of
+another worker, and every worker's reaper sweeps the shared task store and
+cache directory.
+"""
+import os
 import multiprocessing
 
 # Server socket
@@ -6,11 +22,44 @@ bind = "127.0.0.1:5000"
 backlog = 2048
 
 # Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = 'sync'
-worker_connections = 1000
-timeout = 30
-keepalive = 2
+#
+# GUNICORN_PROFILE selects how connections are served:
+#   gthread (default) - a few processes with many threads each. Idle
+#                       status/event connections and long file transfers
+#                       only hold a thread, and the worker keeps sending
+#                       heartbeats while a transfer runs, so it is not
+#                       killed by the timeout.
+#   sync              - the previous setup: one request per process, so it
+#                       needs many processes and has the limitations above.
+profile = os.environ.get('GUNICORN_PROFILE', 'gthread')
+
+if profile == 'sync':
+    workers = multiprocessing.cpu_count() * 2 + 1
+    worker_class = 'sync'
+    worker_connections = 1000
+    timeout = 30
+    keepalive = 2
+elif profile == 'gthread':
+    # One process keeps scheduling, dedup and cleanup server-wide; downloads
+    # run on the scheduler's threads (or in worker processes with
+    # EXECUTION_BACKEND=process) rather than in gunicorn workers
+    workers = int(os.environ.get('GUNICORN_WORKERS', 1))
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 256))
+    worker_connections = 4096
+    timeout = 120
+    graceful_timeout = 30
+    keepalive = 75
+else:
+    raise ValueError(f"Unknown GUNICORN_PROFILE: {profile}")
+
+# Separate processes only see each other's tasks through a shared store;
+# a single process keeps the in-memory store and its job journal
+if workers > 1:
+    os.environ.setdefault('TASK_STORE', 'sqlite')
+
+# Let the server send completed downloads with sendfile()
+sendfile = True
 
 # Logging
 accesslog = '-'
@@ -44,6 +93,11 @@ def pre_fork(server, worker):
 def post_fork(server, worker):
     pass
 
+def post_worker_init(worker):
+    # The worker serves requests while yt-dlp is imported in the background
+    from core.ytdl import preload
+    preload()
+
 def pre_exec(server):
     server.log.info("Forked child, re-executing.")
 
@@ -0,0 +1,137 @@
+"""Startup orchestration: readiness probes and a per-phase startup timer.
+
+Only the standard library is imported here, so dev_start.py can use it
+before the backend's dependencies are installed.
+"""
+import http.client
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """Records how long each startup phase took.
+
+    Phases may overlap when they run in parallel; total() is the wall time
+    from the timer's origin to the end of the last phase.
+    """
+
+    def __init__(self, origin=None):
+        self.origin = time.monotonic() if origin is None else origin
+        self._phases = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(name, started)
+
+    def record(self, name, started, ended=None):
+        ended = time.monotonic() if ended is None else ended
+        with self._lock:
+            self._phases[name] = (started - self.origin, ended - started)
+
+    def durations(self):
+        """Seconds spent in each phase, in the order the phases started."""
+        with self._lock:
+            phases = sorted(self._phases.items(), key=lambda item: item[1][0])
+        return {name: duration for name, (_, duration) in phases}
+
+    def total(self):
+        with self._lock:
+            return max((offset + duration for offset, duration in self._phases.values()), default=0.0)
+
+    def summary(self):
+        phases = ', '.join(f"{name} {duration:.2f}s" for name, duration in self.durations().items())
+        return f"Startup phases: {phases} (total {self.total():.2f}s)"
+
+
+startup_timer = StartupTimer()
+
+
+def wait_for_http(host, port, path='/', timeout=30, process=None, ok=lambda status: status < 500):
+    """Poll an HTTP endpoint until ok(status) holds. Returns False on timeout.
+
+    Gives up early when process (a subprocess.Popen) has exited.
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.02
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=max(0.1, min(2, deadline - time.monotonic())))
+            conn.request('GET', path)
+            status = conn.getresponse().status
+            conn.close()
+            if ok(status):
+                return True
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(delay)
+        delay = min(delay * 2, 0.25)
+    return False
+
+
+def wait_for_port(host, port, timeout=30):
+    """Wait until a TCP connection to host:port succeeds. Returns False on timeout."""
+    deadline = time.monotonic() + timeout
+    delay = 0.02
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=max(0.1, min(2, deadline - time.monotonic()))):
+                return True
+        except OSError:
+            time.sleep(delay)
+            delay = min(delay * 2, 0.25)
+    return False
+
+
+def start_wsgi_server(app, host, port, name, threads=None):
+    """Bind a WSGI server now and serve it from a daemon thread.
+
+    The socket is listening when this returns, so the server is ready
+    without polling. waitress is used when threads is given, otherwise
+    werkzeug's threaded development server.
+    """
+    if threads:
+        from waitress import create_server
+        server = create_server(app, host=host, port=port, threads=threads)
+        run = server.run
+    else:
+        from werkzeug.serving import make_server
+        server = make_server(host, port, app, threaded=True)
+        run = server.serve_forever
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return server
+
+
+def run_parallel(steps, timeout=None):
+    """Run name -> callable steps in threads and wait for all of them.
+
+    Returns name -> (result or None, exception or None). Steps still running
+    after timeout are reported with a TimeoutError.
+    """
+    results = {}
+    threads = []
+
+    for name, fn in steps.items():
+        def run(name=name, fn=fn):
+            try:
+                results[name] = (fn(), None)
+            except Exception as e:
+                results[name] = (None, e)
+        thread = threading.Thread(target=run, name=f'startup-{name}', daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for thread in threads:
+        thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+    for name in steps:
+        results.setdefault(name, (None, TimeoutError(f"{name} did not finish within {timeout}s")))
+    return results
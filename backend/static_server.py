@@ -1,26 +1,134 @@
+import gzip
+import hashlib
+import mimetypes
 import os
-import threading
-from flask import Flask, send_from_directory
-
-def create_static_server(static_dir, port=5173):
-    """静的ファイルを提供するサーバーを作成"""
-    app = Flask(__name__)
-    
-    @app.route('/', defaults={'path': ''})
-    @app.route('/<path:path>')
-    def serve_static(path):
-        if path == '' or not os.path.exists(os.path.join(static_dir, path)):
-            path = 'index.html'
-        return send_from_directory(static_dir, path)
-    
-    def run_server():
-        app.run(host='127.0.0.1', port=port, debug=False, threaded=True)
-    
-    return run_server
-
-def start_static_server(static_dir, port=5173):
-    """静的ファイルサーバーをバックグラウンドで起動"""
-    server_thread = threading.Thread(target=create_static_server(static_dir, port))
-    server_thread.daemon = True
-    server_thread.start()
-    return server_thread
+from werkzeug.wrappers import Request, Response
+
+try:
+    import brotli
+except ImportError:  # 任意の依存関係。無い場合はビルド時に作られた.brだけを配信する
+    brotli = None
+
+# Viteがコンテンツのハッシュをファイル名に含めて出力するディレクトリ
+IMMUTABLE_PREFIX = 'assets/'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+# 圧縮しても小さくならないファイルは圧縮しない
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml', 'application/wasm')
+MIN_COMPRESS_SIZE = 1024
+
+# 事前圧縮されたファイルの拡張子と Content-Encoding（優先順）
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class StaticAsset:
+    """メモリに読み込んだ1ファイルと、その圧縮版"""
+
+    def __init__(self, path, body, mimetype, variants):
+        self.path = path
+        self.mimetype = mimetype
+        self.digest = hashlib.sha256(body).hexdigest()[:20]
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if path.startswith(IMMUTABLE_PREFIX) else REVALIDATE_CACHE_CONTROL
+        # encoding -> (body, etag)。identity は圧縮なし
+        self.variants = {'identity': (body, self.digest)}
+        for encoding, data in variants.items():
+            if len(data) < len(body):
+                self.variants[encoding] = (data, f'{self.digest}-{encoding}')
+
+    def select(self, accept_encodings):
+        """Accept-Encoding に合う最も小さい表現を選ぶ"""
+        for encoding, _ in ENCODINGS:
+            if encoding in self.variants and accept_encodings.quality(encoding) > 0:
+                return encoding
+        return 'identity'
+
+
+class StaticAssets:
+    """ビルド済みフロントエンド（frontend/dist）をメモリから配信するWSGIアプリ
+
+    起動時にすべてのファイルを読み込み、ETagとgzip/brotliの圧縮版を用意する。
+    リクエストごとのファイルシステムへのアクセスは無い。
+    """
+
+    def __init__(self, static_dir):
+        self.static_dir = static_dir
+        self.assets = {}
+        for root, _, files in os.walk(static_dir):
+            for name in files:
+                full_path = os.path.join(root, name)
+                path = os.path.relpath(full_path, static_dir).replace(os.sep, '/')
+                if any(path.endswith(suffix) and os.path.exists(full_path[:-len(suffix)]) for _, suffix in ENCODINGS):
+                    continue  # 元ファイルの圧縮版として読み込む
+                self.assets[path] = self._load(path, full_path)
+        self.index = self.assets.get('index.html')
+
+    def _load(self, path, full_path):
+        with open(full_path, 'rb') as f:
+            body = f.read()
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if path.endswith('.js'):
+            mimetype = 'application/javascript'  # Windowsのレジストリでは text/plain のことがある
+
+        variants = {}
+        for encoding, suffix in ENCODINGS:
+            if os.path.exists(full_path + suffix):
+                with open(full_path + suffix, 'rb') as f:
+                    variants[encoding] = f.read()
+        if len(body) >= MIN_COMPRESS_SIZE and mimetype.startswith(COMPRESSIBLE_TYPES):
+            if 'gzip' not in variants:
+                variants['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+            if 'br' not in variants and brotli is not None:
+                variants['br'] = brotli.compress(body)
+        return StaticAsset(path, body, mimetype, variants)
+
+    def __len__(self):
+        return len(self.assets)
+
+    def find(self, path):
+        """パスに対応するファイル。無ければ None"""
+        return self.assets.get(path.lstrip('/'))
+
+    def response(self, request, asset):
+        encoding = asset.select(request.accept_encodings)
+        body, etag = asset.variants[encoding]
+        response = Response(mimetype=asset.mimetype)
+        response.headers['Cache-Control'] = asset.cache_control
+        if len(asset.variants) > 1:
+            response.vary.add('Accept-Encoding')
+        response.set_etag(etag)
+        if request.if_none_match.contains(etag):
+            response.status_code = 304
+            return response
+        if encoding != 'identity':
+            response.content_encoding = encoding
+        response.set_data(body)
+        return response
+
+    def __call__(self, environ, start_response):
+        request = Request(environ)
+        asset = self.find(request.path)
+        if asset is None:
+            # SPAのルーティング: 未知のパスには index.html を返す
+            asset = self.index
+        if asset is None or request.method not in ('GET', 'HEAD'):
+            return Response(status=404 if asset is None else 405)(environ, start_response)
+        return self.response(request, asset)(environ, start_response)
+
+
+def frontend_dist_dir():
+    """ビルド済みフロントエンドのディレクトリ
+
+    PyInstallerでビルドされた場合、実行ファイルと同じディレクトリにfrontend/distが配置される。
+    FRONTEND_DIST 環境変数で変更できる。
+    """
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.environ.get('FRONTEND_DIST') or os.path.join(base_dir, 'frontend', 'dist')
+
+
+def load_static_assets(static_dir=None):
+    """frontend/dist があれば読み込む。無ければ None"""
+    static_dir = static_dir or frontend_dist_dir()
+    if not os.path.isdir(static_dir):
+        return None
+    return StaticAssets(static_dir)
@@ -1,24 +1,59 @@
 import pytest
 import tempfile
+import time
 import os
+import io
+import zipfile
 from unittest.mock import patch, MagicMock
 
+# Keep the test run out of the real job journal
+os.environ.setdefault('JOB_JOURNAL', 'false')
+
 # Import from the new modular structure
 from app import app
-from core.downloader import download_tasks, validate_youtube_url, DownloadThread
+from core.downloader import download_tasks, validate_youtube_url, validate_playlist_url, DownloadThread, update_task
 from core.config import CONFIG, log_messages, add_log
-from api.routes import temp_directories
+from core.scheduler import scheduler, DownloadScheduler
+from core.cache import DownloadCache, download_cache, extract_video_id
+from core.info import InfoCache, info_cache
+from core.postprocess import postprocess_pool
+from core.ytdl import ydl_pool
+from api.routes import temp_directories, reaper
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path):
+    """Point the download cache at a per-test directory"""
+    download_cache.reset(str(tmp_path / 'cache'))
+    info_cache.clear()
+    # Pooled instances may be mocks left over from another test
+    ydl_pool.clear()
+    yield download_cache
+    download_cache.reset(CONFIG['CACHE_DIR'])
+
+def wait_for_postprocessing(timeout=5):
+    """Wait until the post-processing pool has finished every conversion"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        stats = postprocess_pool.stats()
+        if not stats['queued'] and not stats['running']:
+            return
+        time.sleep(0.01)
+    raise AssertionError('post-processing did not finish')
 
 @pytest.fixture
 def client():
     """Create a Flask client for testing"""
     app.config['TESTING'] = True
+    # Keep submitted jobs queued so tests never start real downloads
+    scheduler.pause()
     with app.test_client() as client:
         with app.app_context():
             download_tasks.clear()
             log_messages.clear()
             temp_directories.clear()
         yield client
+    scheduler.clear()
+    scheduler.resume()
 
 def test_index_route(client):
     response = client.get('/')
@@ -51,11 +86,12 @@ def test_download_endpoint_valid_request(client):
     assert response.status_code == 200
     data = response.get_json()
     assert 'task_id' in data
-    assert data['status'] == 'processing'
+    assert data['status'] == 'queued'
+    assert data['queue_position'] == 1
     
     task_id = data['task_id']
     assert task_id in download_tasks
-    assert download_tasks[task_id]['status'] == 'processing'
+    assert download_tasks[task_id]['status'] == 'queued'
 
 def test_status_endpoint_not_found(client):
     response = client.get('/status/invalid_task_id')
@@ -73,8 +109,9 @@ def test_status_endpoint_found(client):
     response = client.get(f'/status/{task_id}')
     assert response.status_code == 200
     data = response.get_json()
-    assert data['status'] == 'processing'
+    assert data['status'] == 'queued'
     assert data['format'] == 'mp3'
+    assert data['queue_position'] == 1
 
 def test_logs_endpoint(client):
     response = client.get('/logs')
@@ -128,11 +165,11 @@ def test_validate_youtube_url():
     for url in invalid_urls:
         assert validate_youtube_url(url) is False
 
-@patch('core.downloader.yt_dlp.YoutubeDL')
+@patch('yt_dlp.YoutubeDL')
 def test_download_thread_success(mock_ytdl, client):
     mock_instance = MagicMock()
-    mock_ytdl.return_value.__enter__.return_value = mock_instance
-    mock_instance.download.return_value = 0
+    mock_ytdl.return_value = mock_instance
+    mock_instance.extract_info.return_value = {'id': 'test', 'title': 'Test'}
     
     thread = DownloadThread(
         url='https://www.youtube.com/watch?v=test',
@@ -169,3 +206,1429 @@ def test_cleanup_temp_files():
         temp_directories.add(temp_dir)
         cleanup_temp_files()
         assert temp_dir not in temp_directories
+
+def test_download_endpoint_priority_orders_queue(client):
+    first = client.post('/download', json={
+        'url': 'https://www.youtube.com/watch?v=first',
+        'format': 'mp4'
+    }).get_json()
+    urgent = client.post('/download', json={
+        'url': 'https://www.youtube.com/watch?v=urgent',
+        'format': 'mp4',
+        'priority': -1
+    }).get_json()
+
+    assert urgent['queue_position'] == 1
+    assert client.get(f"/status/{first['task_id']}").get_json()['queue_position'] == 2
+
+def test_download_endpoint_invalid_priority(client):
+    response = client.post('/download', json={
+        'url': 'https://www.youtube.com/watch?v=test',
+        'priority': 'high'
+    })
+    assert response.status_code == 400
+    assert 'Priority' in response.get_json()['error']
+
+def test_download_endpoint_queue_full(client):
+    with patch.object(scheduler, 'max_queue_size', 1):
+        client.post('/download', json={'url': 'https://www.youtube.com/watch?v=one'})
+        response = client.post('/download', json={'url': 'https://www.youtube.com/watch?v=two'})
+
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= CONFIG['QUEUE_RETRY_AFTER']
+    assert len(download_tasks) == 1
+
+def test_scheduler_limits_concurrency():
+    import threading
+    import time
+
+    running = []
+    peak = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    class Job:
+        def __init__(self, task_id):
+            self.task_id = task_id
+            self.task_ids = [task_id]
+
+        def run(self):
+            with lock:
+                running.append(self.task_id)
+                peak.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.remove(self.task_id)
+                if self.task_id == 'job-5':
+                    done.set()
+
+    pool = DownloadScheduler(max_workers=2, max_queue_size=10)
+    for i in range(6):
+        pool.submit(Job(f'job-{i}'))
+
+    assert done.wait(2)
+    assert max(peak) <= 2
+
+def test_task_events_not_found(client):
+    response = client.get('/events/invalid_task_id')
+    assert response.status_code == 404
+
+def test_task_events_stream_ends_when_task_finishes(client):
+    download_tasks['done-task'] = {
+        'status': 'completed',
+        'format': 'mp4',
+        'url': 'https://www.youtube.com/watch?v=test'
+    }
+
+    response = client.get('/events/done-task')
+    assert response.mimetype == 'text/event-stream'
+    body = response.get_data(as_text=True)
+    assert body.count('event: status') == 1
+    assert '"status": "completed"' in body
+
+def test_task_events_push_changes_and_heartbeats(client):
+    download_tasks['live-task'] = {
+        'status': 'processing',
+        'format': 'mp4',
+        'url': 'https://www.youtube.com/watch?v=test'
+    }
+
+    with patch.dict(CONFIG, {'SSE_HEARTBEAT_INTERVAL': 0.05}):
+        response = client.get('/events/live-task', buffered=False)
+        stream = (chunk.decode() for chunk in response.response)
+        assert next(stream).startswith('retry:')
+        assert '"processing"' in next(stream)
+        assert next(stream) == ': heartbeat\n\n'
+
+        # Several updates between two reads are coalesced into one event
+        update_task('live-task', progress=10.0)
+        update_task('live-task', progress=20.0)
+        chunk = next(stream)
+        assert '"progress": 20.0' in chunk
+
+        update_task('live-task', status='completed')
+        assert '"completed"' in next(stream)
+        assert list(stream) == []
+
+def test_progress_reporter_throttles_updates():
+    from core.metrics import PROGRESS_UPDATES
+    from core.progress import ProgressReporter
+
+    suppressed_before = PROGRESS_UPDATES.value(result='suppressed')
+    reporter = ProgressReporter()
+    hook = {'status': 'downloading', 'downloaded_bytes': 0, 'total_bytes': 1000, 'speed': 2048.0}
+
+    with patch('core.progress.time.monotonic', return_value=100.0):
+        first = reporter.update(dict(hook, downloaded_bytes=100))
+        # Same instant: suppressed regardless of the change
+        assert reporter.update(dict(hook, downloaded_bytes=900)) is None
+
+    with patch('core.progress.time.monotonic', return_value=100.5):
+        # Enough time has passed but progress moved less than the minimum delta
+        assert reporter.update(dict(hook, downloaded_bytes=105)) is None
+        second = reporter.update(dict(hook, downloaded_bytes=500))
+
+    assert first['progress'] == 10.0
+    assert first['speed'] == '2.00KiB/s'
+    assert first['total_bytes'] == 1000
+    assert second['progress'] == 50.0
+    assert second['progress_updates_suppressed'] == 2
+    assert reporter.suppressed == 2
+    assert PROGRESS_UPDATES.value(result='suppressed') - suppressed_before == 2
+
+def test_progress_hook_updates_task_state():
+    download_tasks['hook-task'] = {
+        'status': 'processing',
+        'format': 'mp4',
+        'url': 'https://www.youtube.com/watch?v=test'
+    }
+    thread = DownloadThread('https://www.youtube.com/watch?v=test', 'mp4', 'hook-task')
+
+    thread.progress_hook({'status': 'downloading', 'downloaded_bytes': 50,
+                          'total_bytes_estimate': 200, 'speed': None})
+    assert download_tasks['hook-task']['progress'] == 25.0
+    assert download_tasks['hook-task']['speed'] == 'N/A'
+
+    thread.progress_hook({'status': 'finished', 'total_bytes': 200})
+    assert download_tasks['hook-task']['progress'] == 100.0
+    assert download_tasks['hook-task']['speed'] == 'Completed'
+    download_tasks.clear()
+
+def test_logs_endpoint_returns_only_new_entries(client):
+    add_log("first")
+    cursor = client.get('/logs').get_json()['cursor']
+    add_log("second", task_id='task-a')
+    add_log("third", 'ERROR', 'task-b')
+
+    data = client.get(f'/logs?since={cursor}').get_json()
+    assert [entry['message'] for entry in data['entries']] == ['second', 'third']
+    assert data['logs'][0].endswith('second')
+    assert data['cursor'] == cursor + 2
+
+    data = client.get(f'/logs?since={data["cursor"]}').get_json()
+    assert data['entries'] == []
+
+def test_logs_endpoint_filters_by_task_and_level(client):
+    add_log("for a", task_id='task-a')
+    add_log("for b", task_id='task-b')
+    add_log("debug noise", 'DEBUG', 'task-a')
+    add_log("failure", 'ERROR', 'task-a')
+
+    data = client.get('/logs?task_id=task-a').get_json()
+    assert [entry['message'] for entry in data['entries']] == ['for a', 'debug noise', 'failure']
+
+    data = client.get('/logs?task_id=task-a&level=warning').get_json()
+    assert [entry['message'] for entry in data['entries']] == ['failure']
+
+    assert client.get('/logs?level=verbose').status_code == 400
+
+def test_log_writer_batches_output():
+    import io
+    from core.config import LogWriter, log_store
+
+    stream = io.StringIO()
+    writer = LogWriter(stream)
+    for i in range(3):
+        writer.write(log_store.append(f"batched {i}"))
+    writer.flush()
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 3
+    assert lines[2].endswith('batched 2')
+
+def test_extract_video_id():
+    assert extract_video_id('https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=10') == 'dQw4w9WgXcQ'
+    assert extract_video_id('https://youtu.be/dQw4w9WgXcQ?si=abc') == 'dQw4w9WgXcQ'
+    assert extract_video_id('https://www.youtube.com/embed/dQw4w9WgXcQ') == 'dQw4w9WgXcQ'
+    assert extract_video_id('https://www.youtube.com/shorts/abc123') == 'abc123'
+    assert extract_video_id('https://www.youtube.com/watch?v=../../etc') is None
+    assert extract_video_id('https://www.youtube.com/') is None
+
+def test_download_cache_lru_eviction(tmp_path):
+    cache = DownloadCache(str(tmp_path / 'lru'), max_bytes=10)
+    for name in ('a', 'b', 'c'):
+        source = tmp_path / f'{name}.mp3'
+        source.write_bytes(b'x' * 4)
+        cache.put(name, str(source))
+        if name == 'b':
+            # Touch "a" so that "b" becomes the least recently used entry
+            assert cache.get('a')
+
+    assert cache.get('b') is None
+    assert cache.get('a').endswith('a.mp3')
+    assert cache.get('c').endswith('c.mp3')
+    stats = cache.stats()
+    assert stats['evictions'] == 1
+    assert stats['bytes'] == 8
+    assert stats['hits'] == 3 and stats['misses'] == 1
+
+    # The index is rebuilt from disk by a fresh instance
+    assert DownloadCache(str(tmp_path / 'lru')).get('c') is not None
+
+def test_cache_fill_locks_are_released(tmp_path):
+    import threading
+
+    cache = DownloadCache(str(tmp_path / 'locks'))
+    entered = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def fill(name):
+        with cache.fill_lock('a'):
+            order.append(name)
+            entered.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=fill, args=('holder',))
+    holder.start()
+    entered.wait(5)
+    # A second filler of the same key waits for the first one
+    waiter = threading.Thread(target=fill, args=('waiter',))
+    waiter.start()
+    time.sleep(0.05)
+    assert order == ['holder']
+    with cache.fill_lock('b'):
+        assert set(cache._fill_locks) == {'a', 'b'}
+
+    release.set()
+    holder.join(5)
+    waiter.join(5)
+    assert order == ['holder', 'waiter']
+    assert cache._fill_locks == {}
+
+def test_download_endpoint_served_from_cache(client, isolated_cache, tmp_path):
+    source = tmp_path / 'song.mp3'
+    source.write_bytes(b'cached audio')
+    isolated_cache.put('dQw4w9WgXcQ-mp3-qdefault', str(source))
+
+    data = client.post('/download', json={
+        'url': 'https://youtu.be/dQw4w9WgXcQ',
+        'format': 'mp3'
+    }).get_json()
+    assert data['status'] == 'completed'
+
+    response = client.get(f"/download/{data['task_id']}")
+    assert response.status_code == 200
+    assert response.data == b'cached audio'
+    assert client.get('/cache/stats').get_json()['hits'] == 1
+
+def test_download_file_supports_ranges_and_validators(client, isolated_cache, tmp_path):
+    source = tmp_path / 'song.m4a'
+    source.write_bytes(b'0123456789')
+    isolated_cache.put('dQw4w9WgXcQ-m4a-qdefault', str(source))
+    task_id = client.post('/download', json={
+        'url': 'https://youtu.be/dQw4w9WgXcQ',
+        'format': 'm4a'
+    }).get_json()['task_id']
+
+    response = client.get(f'/download/{task_id}')
+    etag = response.headers['ETag']
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['Content-Length'] == '10'
+    assert 'filename=download.m4a' in response.headers['Content-Disposition']
+
+    response = client.get(f'/download/{task_id}', headers={'Range': 'bytes=4-'})
+    assert response.status_code == 206
+    assert response.data == b'456789'
+    assert response.headers['Content-Range'] == 'bytes 4-9/10'
+
+    # A later cache hit touches the file but keeps the ETag, so resuming still works
+    client.post('/download', json={'url': 'https://youtu.be/dQw4w9WgXcQ', 'format': 'm4a'})
+    response = client.get(f'/download/{task_id}', headers={'Range': 'bytes=0-1', 'If-Range': etag})
+    assert response.status_code == 206
+    assert response.data == b'01'
+    response = client.get(f'/download/{task_id}', headers={'Range': 'bytes=0-1', 'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.data == b'0123456789'
+
+    assert client.get(f'/download/{task_id}', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get(f'/download/{task_id}', headers={'Range': 'bytes=20-'}).status_code == 416
+    assert client.get(f'/download/{task_id}?inline=true').headers['Content-Disposition'].startswith('inline')
+    assert download_tasks[task_id]['fetched_at']
+
+@patch('core.downloader.extract_audio', side_effect=lambda path, *args: path)
+@patch('yt_dlp.YoutubeDL')
+def test_identical_downloads_share_cached_result(mock_ytdl, mock_extract, client):
+    def fake_download(info, download=True):
+        outtmpl = mock_ytdl.return_value.params['outtmpl']
+        with open(outtmpl.replace('%(ext)s', 'm4a'), 'wb') as f:
+            f.write(b'audio')
+        return 0
+
+    mock_ytdl.return_value.process_ie_result.side_effect = fake_download
+
+    url = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+    for task_id in ('first', 'second'):
+        download_tasks[task_id] = {'status': 'queued', 'format': 'm4a', 'url': url}
+        DownloadThread(url, 'm4a', task_id, temp_directories=temp_directories).run()
+        wait_for_postprocessing()
+
+    assert mock_ytdl.return_value.process_ie_result.call_count == 1
+    assert download_tasks['first']['file_path'] == download_tasks['second']['file_path']
+    assert download_tasks['second']['speed'] == 'Cached'
+    assert not temp_directories
+
+def test_info_cache_expires_and_evicts():
+    cache = InfoCache(ttl=60, max_entries=2)
+    cache.put('a', {'id': 'a'})
+    cache.put('b', {'id': 'b'})
+    cache.get('a')['id'] = 'changed'  # callers get private copies
+    cache.put('c', {'id': 'c'})
+
+    assert cache.get('a') == {'id': 'a'}
+    assert cache.get('b') is None
+    with patch('core.info.time.monotonic', return_value=time.monotonic() + 61):
+        assert cache.get('a') is None
+
+@patch('yt_dlp.YoutubeDL')
+def test_info_endpoint_extracts_once(mock_ytdl, client):
+    ydl = mock_ytdl.return_value
+    ydl.extract_info.return_value = {
+        'id': 'dQw4w9WgXcQ', 'title': 'Song', 'duration': 212,
+        'formats': [{'format_id': '18', 'ext': 'mp4', 'height': 360, 'url': 'https://example.invalid'}],
+    }
+
+    first = client.get('/info?url=https://youtu.be/dQw4w9WgXcQ').get_json()
+    second = client.get('/info?url=https://www.youtube.com/watch?v=dQw4w9WgXcQ').get_json()
+
+    assert first['title'] == 'Song'
+    assert first['formats'][0]['height'] == 360
+    assert 'url' not in first['formats'][0]
+    assert (first['cached'], second['cached']) == (False, True)
+    assert ydl.extract_info.call_count == 1
+    assert client.get('/info?url=https://example.com/x').status_code == 400
+    # The per-video extraction lock is gone once the extraction finished
+    assert info_cache._fill_locks == {}
+
+@patch.dict(CONFIG, {'CACHE_ENABLED': False})
+@patch('yt_dlp.YoutubeDL')
+def test_download_reuses_cached_info(mock_ytdl, client):
+    ydl = mock_ytdl.return_value
+    ydl.extract_info.return_value = {'id': 'dQw4w9WgXcQ', 'title': 'Song', 'formats': []}
+    client.get('/info?url=https://youtu.be/dQw4w9WgXcQ')
+
+    download_tasks['task'] = {'status': 'queued', 'format': 'mp4', 'url': 'https://youtu.be/dQw4w9WgXcQ'}
+    DownloadThread('https://youtu.be/dQw4w9WgXcQ', 'mp4', 'task', temp_directories=temp_directories).run()
+
+    assert ydl.extract_info.call_count == 1
+    ydl.process_ie_result.assert_called_once_with(ydl.extract_info.return_value, download=True)
+    assert client.get('/cache/stats').get_json()['info']['hits'] == 1
+
+def test_batch_download_reports_each_item(client):
+    response = client.post('/download/batch', json={'items': [
+        {'url': 'https://www.youtube.com/watch?v=one', 'format': 'mp3'},
+        {'url': 'https://example.com/video'},
+        {'url': 'https://www.youtube.com/watch?v=two', 'priority': -1},
+    ]})
+    data = response.get_json()
+
+    assert (data['accepted'], data['rejected']) == (2, 1)
+    first, invalid, urgent = data['results']
+    assert invalid == {'index': 1, 'error': 'Invalid YouTube URL'}
+    assert (first['status'], first['queue_position']) == ('queued', 2)
+    assert urgent['queue_position'] == 1
+    assert client.post('/download/batch', json={'items': []}).status_code == 400
+
+def test_bulk_status(client):
+    ids = [client.post('/download', json={'url': f'https://www.youtube.com/watch?v={name}'}).get_json()['task_id']
+           for name in ('one', 'two')]
+
+    data = client.get(f"/status?ids={','.join(ids)},unknown").get_json()
+    assert data['missing'] == ['unknown']
+    assert [data['tasks'][task_id]['queue_position'] for task_id in ids] == [1, 2]
+
+    data = client.post('/status/batch', json={'ids': ids}).get_json()
+    assert data['tasks'] == {task_id: client.get(f'/status/{task_id}').get_json() for task_id in ids}
+    assert client.post('/status/batch', json={'ids': 'nope'}).status_code == 400
+    assert client.get('/status').status_code == 400
+
+def test_sqlite_task_store_get_many(tmp_path):
+    from core.task_store import SQLiteTaskStore
+
+    store = SQLiteTaskStore(str(tmp_path / 'tasks.db'))
+    for n in range(600):
+        store[f'task-{n}'] = {'status': 'queued', 'n': n}
+
+    tasks = store.get_many([f'task-{n}' for n in range(0, 600, 2)] + ['missing'])
+    assert len(tasks) == 300
+    assert tasks['task-598'] == {'status': 'queued', 'n': 598}
+
+def test_network_options_are_validated_and_applied(client):
+    from core.network import parse_network_options, network_ydl_opts
+
+    options, error = parse_network_options({'concurrent_fragments': 8, 'http_chunk_size': 1048576})
+    assert error is None
+    opts = network_ydl_opts(options)
+    assert opts['concurrent_fragment_downloads'] == 8
+    assert opts['http_chunk_size'] == 1048576
+    assert network_ydl_opts()['concurrent_fragment_downloads'] == CONFIG['CONCURRENT_FRAGMENT_DOWNLOADS']
+
+    for network in ({'concurrent_fragments': 100}, {'buffer_size': 'big'},
+                    {'external_downloader': 'rm'}, {'retries': 3}):
+        response = client.post('/download', json={'url': 'https://www.youtube.com/watch?v=test', 'network': network})
+        assert response.status_code == 400
+
+    response = client.post('/download', json={
+        'url': 'https://www.youtube.com/watch?v=test', 'network': {'concurrent_fragments': 2}
+    })
+    assert response.status_code == 200
+    assert scheduler._queue[0][2].network == {'concurrent_fragments': 2}
+
+def test_token_bucket_sleeps_off_debt():
+    from core.governor import TokenBucket
+
+    bucket = TokenBucket(rate=1000, burst=100)
+    with patch('core.governor.time.sleep') as sleep:
+        assert bucket.consume(100) == 0.0
+        waited = bucket.consume(200)
+    assert 0.19 < waited <= 0.2
+    sleep.assert_called_once_with(waited)
+
+def test_governor_shares_bandwidth_and_limits_ffmpeg():
+    import threading
+    from core.governor import ResourceGovernor
+
+    governor = ResourceGovernor(ffmpeg_slots=1)
+    with patch.dict(CONFIG, {'GLOBAL_RATE_LIMIT': 1024 ** 2}):
+        with governor.job('a'), governor.job('b'):
+            assert governor.stats()['bandwidth']['per_job_limit'] == 512 * 1024
+            # Each job pays only for the bytes since its previous hook
+            with patch('core.governor.time.sleep') as sleep:
+                governor.throttle('a', {'downloaded_bytes': 512 * 1024, 'filename': 'x'})
+                assert not sleep.called
+                governor.throttle('a', {'downloaded_bytes': 1024 * 1024, 'filename': 'x'})
+                assert sleep.called
+            assert governor.stats()['bandwidth']['bytes_per_sec'] == 1024 ** 2 / governor.RATE_WINDOW
+
+            governor.postprocessor_hook('a', {'status': 'started', 'postprocessor': 'Merger'})
+            waiter = threading.Thread(
+                target=governor.postprocessor_hook, args=('b', {'status': 'started', 'postprocessor': 'Merger'})
+            )
+            waiter.start()
+            deadline = time.time() + 2
+            while governor.stats()['ffmpeg']['waiting'] != 1 and time.time() < deadline:
+                time.sleep(0.01)
+            assert governor.stats()['ffmpeg'] == {'slots': 1, 'running': 1, 'waiting': 1}
+
+            governor.postprocessor_hook('a', {'status': 'finished', 'postprocessor': 'Merger'})
+            waiter.join(2)
+            assert governor.stats()['ffmpeg']['running'] == 1
+        # Leaving the job gives back a slot it never released
+        assert governor.stats()['ffmpeg']['running'] == 0
+
+def test_resources_endpoint(client):
+    data = client.get('/resources').get_json()
+    assert set(data) == {'bandwidth', 'ffmpeg', 'cpu', 'scheduler', 'postprocessing', 'youtubedl_pool',
+                         'process_pool', 'upstream'}
+    assert data['upstream']['state'] == 'closed'
+    assert data['process_pool']['enabled'] is False
+    assert data['ffmpeg']['slots'] == CONFIG['FFMPEG_CONCURRENCY']
+
+@patch.dict(CONFIG, {'CACHE_ENABLED': False})
+@patch('core.downloader.extract_audio')
+@patch('yt_dlp.YoutubeDL')
+def test_audio_conversion_runs_in_postprocessing_pool(mock_ytdl, mock_extract, client):
+    import threading
+
+    def fake_download(info, download=True):
+        outtmpl = mock_ytdl.return_value.params['outtmpl']
+        with open(outtmpl.replace('%(ext)s', 'webm'), 'wb') as f:
+            f.write(b'opus audio')
+        return info
+
+    release = threading.Event()
+
+    def fake_extract(path, format_type, audio_quality, ffmpeg_location, task_id):
+        release.wait(5)
+        converted = path.replace('.webm', '.mp3')
+        os.replace(path, converted)
+        return converted
+
+    mock_ytdl.return_value.process_ie_result.side_effect = fake_download
+    mock_extract.side_effect = fake_extract
+
+    task_id = client.post('/download', json={
+        'url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'format': 'mp3', 'audio_quality': 192
+    }).get_json()['task_id']
+    scheduler._queue.pop()[2].run()
+
+    # The download worker is free while the conversion is still pending
+    assert download_tasks[task_id]['status'] == 'processing'
+    assert download_tasks[task_id]['speed'] == 'Converting'
+    release.set()
+    wait_for_postprocessing()
+
+    assert mock_extract.call_args[0][1:3] == ('mp3', 192)
+    assert download_tasks[task_id]['status'] == 'completed'
+    response = client.get(f'/download/{task_id}')
+    assert response.mimetype == 'audio/mpeg'
+    assert 'filename=download.mp3' in response.headers['Content-Disposition']
+    assert response.data == b'opus audio'
+
+@patch('yt_dlp.YoutubeDL')
+def test_stream_through_serves_growing_file(mock_ytdl, client):
+    import threading
+
+    first_read = threading.Event()
+    seen_opts = {}
+
+    def fake_download(info, download=True):
+        opts = mock_ytdl.return_value.params
+        seen_opts.update(opts)
+        hook = opts['progress_hooks'][0]
+        path = opts['outtmpl'].replace('%(ext)s', 'mp4')
+        part = path + '.part'
+        with open(part, 'wb') as f:
+            f.write(b'first-')
+        hook({'status': 'downloading', 'filename': path, 'tmpfilename': part,
+              'downloaded_bytes': 6, 'total_bytes': 12})
+        first_read.wait(5)
+        with open(part, 'ab') as f:
+            f.write(b'second')
+        os.replace(part, path)
+        hook({'status': 'finished', 'filename': path, 'downloaded_bytes': 12, 'total_bytes': 12})
+        return info
+
+    mock_ytdl.return_value.process_ie_result.side_effect = fake_download
+
+    url = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+    assert client.post('/download', json={'url': url, 'format': 'mp3', 'stream': True}).status_code == 400
+    assert client.post('/download', json={'url': url, 'format': 'mp4', 'quality': 'highest', 'stream': True}).status_code == 400
+
+    task_id = client.post('/download', json={'url': url, 'format': 'mp4', 'quality': 'low', 'stream': True}).get_json()['task_id']
+    job = scheduler._queue.pop()[2]
+    worker = threading.Thread(target=job.run)
+    worker.start()
+
+    response = client.get(f'/stream/{task_id}', buffered=False)
+    assert response.mimetype == 'video/mp4'
+    assert 'Content-Length' not in response.headers
+    chunks = iter(response.response)
+    assert next(chunks) == b'first-'
+    first_read.set()
+    assert b''.join(chunks) == b'second'
+    response.close()
+    worker.join(5)
+
+    assert seen_opts['fixup'] == 'warn'
+    assert download_tasks[task_id]['status'] == 'completed'
+    assert download_tasks[task_id]['fetched_at'] is not None
+    assert client.get(f'/stream/{task_id}').data == b'first-second'
+
+def test_histogram_renders_prometheus_text():
+    from core.metrics import MetricsRegistry
+
+    registry = MetricsRegistry()
+    histogram = registry.histogram('test_seconds', 'Test timings.', ('phase',), buckets=(0.1, 1))
+    histogram.observe(0.05, phase='a')
+    histogram.observe(0.5, phase='a')
+    counter = registry.counter('test_total', 'Test counter.')
+    counter.inc(3)
+
+    text = registry.render()
+    assert '# TYPE test_seconds histogram' in text
+    assert 'test_seconds_bucket{phase="a",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{phase="a",le="1"} 2' in text
+    assert 'test_seconds_bucket{phase="a",le="+Inf"} 2' in text
+    assert 'test_seconds_count{phase="a"} 2' in text
+    assert 'test_total 3' in text
+    with pytest.raises(ValueError):
+        histogram.observe(1, route='/x')
+
+@patch.dict(CONFIG, {'CACHE_ENABLED': False})
+@patch('yt_dlp.YoutubeDL')
+def test_metrics_endpoint_reports_routes_and_phases(mock_ytdl, client):
+    from core.metrics import DOWNLOAD_JOBS, PHASE_SECONDS, REQUESTS
+
+    def fake_download(info, download=True):
+        outtmpl = mock_ytdl.return_value.params['outtmpl']
+        with open(outtmpl.replace('%(ext)s', 'mp4'), 'wb') as f:
+            f.write(b'video')
+        return info
+
+    mock_ytdl.return_value.process_ie_result.side_effect = fake_download
+    queued = PHASE_SECONDS.count(phase='queue')
+    downloaded = PHASE_SECONDS.count(phase='download')
+    completed = DOWNLOAD_JOBS.value(result='completed')
+    requests_before = REQUESTS.value(route='/status/<task_id>', method='GET', status=200)
+
+    task_id = client.post('/download', json={'url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'}).get_json()['task_id']
+    scheduler._queue.pop()[2].run()
+    assert client.get(f'/status/{task_id}').status_code == 200
+
+    assert PHASE_SECONDS.count(phase='queue') == queued + 1
+    assert PHASE_SECONDS.count(phase='download') == downloaded + 1
+    assert DOWNLOAD_JOBS.value(result='completed') == completed + 1
+    assert REQUESTS.value(route='/status/<task_id>', method='GET', status=200) == requests_before + 1
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert 'ytdl_http_request_duration_seconds_count{route="/download",method="POST"}' in text
+    assert 'ytdl_download_phase_seconds_bucket{phase="download",le="+Inf"}' in text
+    assert 'ytdl_cache_lookups_total{cache="info",result="miss"}' in text
+    assert 'ytdl_threads ' in text
+    assert 'ytdl_progress_updates_total{result="published"}' in text
+    assert 'ytdl_temp_disk_bytes ' in text
+
+def test_job_journal_replays_and_compacts(tmp_path):
+    from core.progress import ProgressReporter
+    from core.task_store import InMemoryTaskStore, JobJournal, JournaledTaskStore
+
+    journal = JobJournal(str(tmp_path / 'journal.db'))
+    store = JournaledTaskStore(InMemoryTaskStore(), journal)
+    store['a'] = {'status': 'queued', 'format': 'mp4', 'url': 'u'}
+    store['b'] = {'status': 'queued', 'format': 'mp4', 'url': 'u'}
+    store.merge('a', {'status': 'processing'})
+    # Progress only, as the reporter publishes it: not journaled
+    reporter = ProgressReporter()
+    fields = reporter.update({'status': 'downloading', 'downloaded_bytes': 1, 'total_bytes': 2, 'speed': 1024})
+    assert store.merge('a', fields)
+    del store['b']
+
+    assert len(journal) == 4
+    states = JobJournal(journal.path).replay()
+    assert states == {'a': {'status': 'processing', 'format': 'mp4', 'url': 'u'}}
+    journal.compact(states)
+    assert len(journal) == 1
+
+    # A long-running store compacts on its own
+    store = JournaledTaskStore(InMemoryTaskStore(), journal, compact_every=5)
+    store['c'] = {'status': 'queued', 'format': 'mp4', 'url': 'u'}
+    for i in range(12):
+        store.merge('c', {'status': 'processing', 'retries': i})
+    assert len(journal) < 5
+    assert JobJournal(journal.path).replay()['c']['retries'] == 11
+
+@patch('yt_dlp.YoutubeDL')
+def test_recover_jobs_resumes_partial_downloads(mock_ytdl, client, tmp_path, monkeypatch):
+    from core import downloader, recovery
+    from core.task_store import InMemoryTaskStore, JobJournal, JournaledTaskStore
+
+    path = str(tmp_path / 'journal.db')
+    previous = JournaledTaskStore(InMemoryTaskStore(), JobJournal(path))
+    url = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+    finished = tmp_path / 'finished.mp4'
+    finished.write_bytes(b'done')
+    partial_dir = tmp_path / 'partial'
+    partial_dir.mkdir()
+    (partial_dir / 'download.mp4.part').write_bytes(b'half-')
+    job = {'quality': 'low', 'priority': 0, 'network': {}, 'audio_quality': None, 'stream': False}
+    previous['done'] = {'status': 'completed', 'format': 'mp4', 'url': url, 'file_path': str(finished)}
+    previous['gone'] = {'status': 'completed', 'format': 'mp4', 'url': url, 'file_path': str(tmp_path / 'x.mp4')}
+    previous['partial'] = {'status': 'processing', 'format': 'mp4', 'url': url, 'job': job,
+                           'temp_dir': str(partial_dir), 'created_at': 1.0}
+    previous['orphan'] = {'status': 'queued', 'format': 'mp4', 'url': url}
+
+    # A restarted process starts with an empty store over the same journal
+    restarted = JournaledTaskStore(InMemoryTaskStore(), JobJournal(path))
+    monkeypatch.setattr(downloader, 'download_tasks', restarted)
+    monkeypatch.setattr(recovery, 'download_tasks', restarted)
+    resumed_dirs = set()
+
+    assert recovery.recover_jobs(resumed_dirs) == ['partial']
+    assert restarted['done']['status'] == 'completed'
+    assert 'gone' not in restarted
+    assert restarted['orphan']['status'] == 'error'
+    assert restarted['partial']['status'] == 'queued'
+    assert str(partial_dir) in resumed_dirs
+
+    def fake_download(info, download=True):
+        opts = mock_ytdl.return_value.params
+        assert opts['continuedl']
+        part = opts['outtmpl'].replace('%(ext)s', 'mp4') + '.part'
+        with open(part, 'ab') as f:
+            f.write(b'rest')
+        os.replace(part, part[:-len('.part')])
+        return info
+
+    mock_ytdl.return_value.process_ie_result.side_effect = fake_download
+    scheduler._queue.pop()[2].run()
+
+    task = restarted['partial']
+    assert task['status'] == 'completed'
+    with open(task['file_path'], 'rb') as f:
+        assert f.read() == b'half-rest'
+
+def test_youtubedl_pool_reuses_configured_instances():
+    from core.ytdl import YoutubeDLPool
+
+    pool = YoutubeDLPool(max_idle=1)
+    hook = lambda d: None
+    with pool.borrow({'outtmpl': '/tmp/a.%(ext)s', 'format': '18', 'progress_hooks': [hook]}) as first:
+        assert first.params['outtmpl']['default'] == '/tmp/a.%(ext)s'
+        assert first._progress_hooks == [hook]
+        assert callable(first.format_selector)
+    assert first._progress_hooks == []
+
+    with pool.borrow({'outtmpl': '/tmp/b.%(ext)s'}) as second:
+        assert second is first
+        assert second.params['outtmpl']['default'] == '/tmp/b.%(ext)s'
+        assert second.format_selector is None
+
+    with pytest.raises(RuntimeError):
+        with pool.borrow() as broken:
+            raise RuntimeError('job failed')
+    assert pool.stats() == {'idle': 0, 'max_idle': 1, 'created': 1, 'reused': 2, 'discarded': 1,
+                            'reusable': True}
+
+def test_youtubedl_pool_falls_back_without_yt_dlp_internals(monkeypatch):
+    import yt_dlp
+    from core import ytdl
+
+    # Fails when a yt-dlp release renames the internals that reuse relies on
+    assert ytdl.missing_reuse_attributes(yt_dlp.YoutubeDL) == []
+
+    monkeypatch.setattr(ytdl, '_REUSE_ATTRIBUTES', ytdl._REUSE_ATTRIBUTES + ('_renamed_in_a_release',))
+    pool = ytdl.YoutubeDLPool(max_idle=1)
+    pool.warm()
+    hook = lambda d: None
+    with pool.borrow({'outtmpl': '/tmp/a.%(ext)s', 'progress_hooks': [hook]}) as first:
+        assert first.params['outtmpl']['default'] == '/tmp/a.%(ext)s'
+        assert hook in first._progress_hooks
+    with pool.borrow({'outtmpl': '/tmp/b.%(ext)s'}) as second:
+        assert second is not first
+        assert second.params['outtmpl']['default'] == '/tmp/b.%(ext)s'
+    assert pool.stats() == {'idle': 0, 'max_idle': 1, 'created': 2, 'reused': 0, 'discarded': 2,
+                            'reusable': False}
+
+def test_app_starts_without_importing_yt_dlp():
+    import subprocess
+    import sys
+
+    result = subprocess.run(
+        [sys.executable, '-c', "import sys, app; print('yt_dlp' in sys.modules)"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True,
+        env=dict(os.environ, JOB_JOURNAL='false')
+    )
+    assert result.stdout.strip().splitlines()[-1] == 'False'
+
+def test_server_is_ready_when_started(tmp_path):
+    import socket
+    from static_server import StaticAssets
+    from startup import StartupTimer, run_parallel, start_wsgi_server, wait_for_http, wait_for_port
+
+    (tmp_path / 'index.html').write_text('<html></html>')
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    assert not wait_for_port('127.0.0.1', port, timeout=0.1)
+
+    timer = StartupTimer()
+    with timer.phase('static'):
+        server = start_wsgi_server(StaticAssets(str(tmp_path)), '127.0.0.1', port, 'static-test')
+    try:
+        # Bound before start_static_server returned, so the first probe succeeds
+        results = run_parallel({
+            'port': lambda: wait_for_port('127.0.0.1', port, timeout=1),
+            'http': lambda: wait_for_http('127.0.0.1', port, '/missing', timeout=1, ok=lambda s: s == 200),
+        }, timeout=5)
+        assert results == {'port': (True, None), 'http': (True, None)}
+    finally:
+        server.shutdown()
+
+    assert list(timer.durations()) == ['static']
+    assert timer.total() >= timer.durations()['static']
+    assert timer.summary().startswith('Startup phases: static ')
+
+def test_static_assets_are_served_from_memory(tmp_path):
+    import gzip
+    from werkzeug.test import Client
+    from static_server import IMMUTABLE_CACHE_CONTROL, StaticAssets
+
+    script = b'console.log("hello");\n' * 200
+    (tmp_path / 'assets').mkdir()
+    (tmp_path / 'index.html').write_text('<html><script src="/assets/app-1a2b.js"></script></html>')
+    (tmp_path / 'assets' / 'app-1a2b.js').write_bytes(script)
+    (tmp_path / 'assets' / 'app-1a2b.js.br').write_bytes(b'brotli-bytes')
+    (tmp_path / 'logo.png').write_bytes(bytes(2048))
+    assets = StaticAssets(str(tmp_path))
+    assert sorted(assets.assets) == ['assets/app-1a2b.js', 'index.html', 'logo.png']
+
+    # Deleting the files shows that requests no longer touch the disk
+    for path in tmp_path.rglob('*.*'):
+        path.unlink()
+    client = Client(assets)
+
+    response = client.get('/assets/app-1a2b.js', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'br'
+    assert response.data == b'brotli-bytes'
+    assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers['Vary'] == 'Accept-Encoding'
+
+    response = client.get('/assets/app-1a2b.js', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == script
+    etag = response.headers['ETag']
+    revalidated = client.get('/assets/app-1a2b.js', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+
+    response = client.get('/assets/app-1a2b.js')
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == script
+    assert response.headers['ETag'] != etag
+
+    # Binary files are not compressed; unknown paths fall back to index.html
+    response = client.get('/logo.png', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers and 'Vary' not in response.headers
+    response = client.get('/settings')
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert b'app-1a2b.js' in response.data
+
+def test_index_negotiates_frontend_and_health_check(tmp_path, monkeypatch):
+    import app as app_module
+    from static_server import StaticAssets
+
+    (tmp_path / 'index.html').write_text('<html></html>')
+    monkeypatch.setattr(app_module, 'static_assets', StaticAssets(str(tmp_path)))
+    client = app_module.app.test_client()
+
+    assert client.get('/').get_json()['status'] == 'ok'
+    assert client.get('/', headers={'Accept': '*/*'}).get_json()['status'] == 'ok'
+    response = client.get('/', headers={'Accept': 'text/html,application/xhtml+xml,*/*;q=0.8'})
+    assert response.data == b'<html></html>'
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+@pytest.fixture
+def media_server():
+    """Serve 256 KiB of media bytes at /media.mp4 on a local port"""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    body = bytes(range(256)) * 1024
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'video/mp4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/media.mp4', body
+    server.shutdown()
+    server.server_close()
+
+def _media_info(video_id, media_url):
+    return {
+        'id': video_id,
+        'title': 'Worker test',
+        'extractor': 'youtube',
+        'extractor_key': 'Youtube',
+        'webpage_url': f'https://www.youtube.com/watch?v={video_id}',
+        'formats': [{'format_id': '18', 'url': media_url, 'ext': 'mp4',
+                     'vcodec': 'avc1.42001E', 'acodec': 'mp4a.40.2'}],
+    }
+
+@patch.dict(CONFIG, {'CACHE_ENABLED': False, 'EXECUTION_BACKEND': 'process'})
+def test_process_backend_runs_download_in_worker(client, media_server, monkeypatch):
+    from core.workers import ProcessPool
+
+    media_url, body = media_server
+    pool = ProcessPool(max_workers=1, max_jobs=1)
+    monkeypatch.setattr('core.downloader.process_pool', pool)
+    url = 'https://www.youtube.com/watch?v=workerjob01'
+    info_cache.put('workerjob01', _media_info('workerjob01', media_url))
+
+    download_tasks['worker-task'] = {'status': 'queued', 'format': 'mp4', 'url': url}
+    thread = DownloadThread(url, 'mp4', 'worker-task', 'low', temp_directories)
+    try:
+        thread.run()
+    finally:
+        pool.shutdown()
+
+    task = download_tasks['worker-task']
+    assert task['status'] == 'completed', task.get('error')
+    assert task['progress'] == 100.0
+    with open(task['file_path'], 'rb') as f:
+        assert f.read() == body
+    # Replaced after its one allowed job
+    assert pool.stats()['recycled'] == 1
+    assert pool.stats()['idle'] == 0
+
+def test_process_pool_replaces_crashed_worker(media_server):
+    import multiprocessing
+    from core.workers import ProcessPool, WorkerCrashed
+
+    media_url, body = media_server
+    info = _media_info('workerjob02', media_url)
+    pool = ProcessPool(max_workers=1)
+
+    def crash(kind, payload):
+        for child in multiprocessing.active_children():
+            if child.name == 'download-process':
+                child.kill()
+                child.join()
+
+    received = []
+    try:
+        with pytest.raises(WorkerCrashed):
+            pool.run(info['webpage_url'], {'outtmpl': os.devnull}, info, crash)
+        assert pool.stats()['crashed'] == 1
+
+        # The next job gets a new worker, which pauses when the handler asks it to
+        def record(kind, payload):
+            received.append((kind, payload))
+            if kind == 'progress' and len(received) == 1:
+                return 0.3
+
+        started = time.monotonic()
+        pool.run(info['webpage_url'], {'outtmpl': os.devnull, 'nopart': True}, info, record)
+        assert time.monotonic() - started >= 0.3
+    finally:
+        pool.shutdown()
+
+    progress = [payload for kind, payload in received if kind == 'progress']
+    assert progress[-1]['status'] == 'finished'
+    assert progress[-1]['downloaded_bytes'] == len(body)
+    assert ('postprocessor', {'status': 'finished', 'postprocessor': 'MoveFiles'}) in received
+    assert pool.stats()['started'] == 2
+
+def test_process_pool_enforces_resident_memory_limit(media_server):
+    from core.workers import ProcessPool, WorkerCrashed
+
+    media_url, body = media_server
+    info = _media_info('workerjob03', media_url)
+    # Any worker is above a 1 MiB limit; the postprocessor reply keeps the job running meanwhile
+    pool = ProcessPool(max_workers=1, memory_limit=1024 ** 2)
+
+    def slow_postprocessor(kind, payload):
+        if kind == 'postprocessor':
+            time.sleep(2)
+
+    try:
+        with pytest.raises(WorkerCrashed, match='memory limit of 1 MiB'):
+            pool.run(info['webpage_url'], {'outtmpl': os.devnull, 'nopart': True}, info, slow_postprocessor)
+    finally:
+        pool.shutdown()
+    assert pool.stats()['crashed'] == 1
+
+def test_process_pool_workers_skip_main_script(tmp_path):
+    import subprocess
+    import sys
+    import textwrap
+
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    marker = tmp_path / 'imports.txt'
+    script = tmp_path / 'server.py'
+    script.write_text(textwrap.dedent(f'''
+        import sys
+        sys.path.insert(0, {backend_dir!r})
+        with open({str(marker)!r}, 'a') as f:
+            f.write(__name__ + '\\n')
+        if __name__ == '__main__':
+            from core.workers import ProcessPool
+            pool = ProcessPool(max_workers=1)
+            pool.warm(1)
+            pool.shutdown()
+    '''))
+    env = dict(os.environ, JOB_JOURNAL='false')
+    subprocess.run([sys.executable, str(script)], check=True, timeout=60, env=env)
+    # Only the parent ran the script; the worker did not import it as __mp_main__
+    assert marker.read_text() == '__main__\n'
+
+def test_upstream_errors_are_classified():
+    import random
+    from core.upstream import backoff_delay, classify_error
+
+    cases = {
+        'ERROR: unable to download video data: HTTP Error 429: Too Many Requests': ('throttled', True),
+        'ERROR: unable to download video data: HTTP Error 403: Forbidden': ('forbidden', True),
+        'ERROR: [youtube] abc: Video unavailable': ('unavailable', False),
+        'ERROR: unable to download video data: HTTP Error 503: Service Unavailable': ('server', True),
+        'ERROR: Unable to download webpage: <urlopen error timed out>': ('network', True),
+        'something else entirely': ('unknown', False),
+    }
+    for message, expected in cases.items():
+        failure = classify_error(Exception(message))
+        assert (failure.category, failure.retryable) == expected, message
+
+    rng = random.Random(1)
+    delays = [backoff_delay(attempt, base=1, cap=5, rng=rng) for attempt in range(6) for _ in range(50)]
+    assert all(0 <= delay <= 5 for delay in delays)
+    assert max(delays[:50]) <= 1 < max(delays[100:150])
+
+def test_circuit_breaker_pauses_queue_and_ramps_back():
+    from core.upstream import CircuitBreaker, classify_error
+
+    sched = DownloadScheduler(max_workers=4)
+    breaker = CircuitBreaker(sched, window=60, threshold=0.5, min_samples=4, cooldown=0.05, max_cooldown=1)
+    throttled = classify_error('HTTP Error 429: Too Many Requests')
+
+    # Throttling lowers concurrency before the circuit opens
+    breaker.record_success()
+    breaker.record_failure(throttled)
+    assert (breaker.state, sched.limit) == ('closed', 2)
+    breaker.record_failure(classify_error('Video unavailable'))
+    assert breaker.stats()['samples'] == 2
+
+    breaker.record_failure(throttled)
+    breaker.record_failure(throttled)
+    assert (breaker.state, sched.limit) == ('open', 0)
+    assert 0 < breaker.wait_time() <= 0.05
+
+    deadline = time.time() + 2
+    while breaker.state == 'open' and time.time() < deadline:
+        time.sleep(0.01)
+    assert (breaker.state, sched.limit) == ('half_open', 1)
+
+    # A failure while recovering reopens with a longer cooldown
+    breaker.record_failure(throttled)
+    assert (breaker.state, breaker.cooldown) == ('open', 0.1)
+    while breaker.state == 'open' and time.time() < deadline:
+        time.sleep(0.01)
+
+    breaker.record_success()
+    breaker.record_success()
+    assert (breaker.state, sched.limit) == ('half_open', 3)
+    breaker.record_success()
+    assert (breaker.state, sched.limit, breaker.cooldown) == ('closed', 4, 0.05)
+
+def test_scheduler_limit_holds_back_jobs():
+    sched = DownloadScheduler(max_workers=2)
+    sched.set_limit(0)
+    started = []
+
+    class Job:
+        task_ids = ['limited']
+        task_id = 'limited'
+
+        def run(self):
+            started.append(time.monotonic())
+
+    sched.submit(Job())
+    time.sleep(0.05)
+    assert started == [] and sched.stats()['queued'] == 1
+    sched.set_limit(1)
+    deadline = time.time() + 2
+    while not started and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(started) == 1
+
+@patch.dict(CONFIG, {'CACHE_ENABLED': False, 'UPSTREAM_RETRY_BASE_DELAY': 0.01})
+def test_download_retries_throttled_upstream(client, monkeypatch):
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from core.upstream import breaker
+
+    body = b'media' * 10000
+    requests_seen = []
+
+    class ThrottlingHandler(BaseHTTPRequestHandler):
+        """Answers the first two requests with 429, like a rate-limited upstream"""
+
+        def do_GET(self):
+            requests_seen.append(self.path)
+            if len(requests_seen) <= 2:
+                self.send_response(429)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ThrottlingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    media_url = f'http://127.0.0.1:{server.server_address[1]}/media.mp4'
+    extractions = []
+
+    def fake_get_info(url, task_id=None):
+        extractions.append(url)
+        return _media_info('throttled01', media_url), False
+
+    monkeypatch.setattr('core.downloader.get_info', fake_get_info)
+    url = 'https://www.youtube.com/watch?v=throttled01'
+    download_tasks['retry-task'] = {'status': 'queued', 'format': 'mp4', 'url': url}
+    breaker.reset()
+    try:
+        DownloadThread(url, 'mp4', 'retry-task', 'low', temp_directories).run()
+        stats = breaker.stats()
+    finally:
+        breaker.reset()
+        server.shutdown()
+        server.server_close()
+
+    task = download_tasks['retry-task']
+    assert task['status'] == 'completed', task.get('error')
+    assert task['retries'] == 2
+    assert len(extractions) == 3
+    with open(task['file_path'], 'rb') as f:
+        assert f.read() == body
+    assert stats['state'] == 'closed' and stats['samples'] == 3
+
+@patch.dict(CONFIG, {'CACHE_ENABLED': False, 'UPSTREAM_MAX_RETRIES': 3})
+def test_permanent_upstream_error_is_not_retried(client, monkeypatch):
+    calls = []
+
+    def unavailable(url, task_id=None):
+        calls.append(url)
+        raise Exception('ERROR: [youtube] gone0000001: Video unavailable')
+
+    monkeypatch.setattr('core.downloader.get_info', unavailable)
+    url = 'https://www.youtube.com/watch?v=gone0000001'
+    download_tasks['gone-task'] = {'status': 'queued', 'format': 'mp4', 'url': url}
+    DownloadThread(url, 'mp4', 'gone-task', 'low', temp_directories).run()
+
+    task = download_tasks['gone-task']
+    assert task['status'] == 'error'
+    assert task['error_category'] == 'unavailable'
+    assert 'Video unavailable' in task['error']
+    assert len(calls) == 1
+
+def test_audio_quality_is_validated_and_keyed(client):
+    from core.cache import cache_key
+
+    url = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+    for audio_quality in ('loud', 11, 500, True):
+        assert client.post('/download', json={'url': url, 'format': 'mp3', 'audio_quality': audio_quality}).status_code == 400
+    assert cache_key(url, 'mp3', 'high', 128) != cache_key(url, 'mp3', 'high', 320)
+    assert cache_key(url, 'mp3', 'high') == cache_key(url, 'mp3', 'low')
+
+def test_video_quality_is_validated_and_normalized(client):
+    from core.cache import cache_key
+    from core.singleflight import request_key
+
+    url = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+    for quality in ('a/b', '../x', 'foo', 720, ['low']):
+        response = client.post('/download', json={'url': url, 'format': 'mp4', 'quality': quality})
+        assert response.status_code == 400
+        assert 'Invalid quality' in response.get_json()['error']
+    assert scheduler.stats()['queued'] == 0
+    assert client.post('/download', json={'url': url, 'format': 'mp4', 'quality': 'high'}).status_code == 200
+
+    assert cache_key(url, 'mp4', None) == cache_key(url, 'mp4', 'auto') == cache_key(url, 'mp4', 'foo')
+    assert request_key('https://example.com/v', 'mp4', '../x') == request_key('https://example.com/v', 'mp4')
+
+def test_validate_playlist_url():
+    assert validate_playlist_url('https://www.youtube.com/playlist?list=PL123')
+    assert validate_playlist_url('https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL123')
+    assert validate_playlist_url('https://www.youtube.com/@somechannel')
+    assert not validate_playlist_url('https://www.youtube.com/watch?v=dQw4w9WgXcQ')
+    assert not validate_playlist_url('https://example.com/playlist?list=PL123')
+
+@patch('core.downloader.extract_audio', side_effect=lambda path, *args: path)
+@patch('yt_dlp.YoutubeDL')
+def test_playlist_batch_fans_out_and_streams_zip(mock_ytdl, mock_extract, client):
+    ydl = mock_ytdl.return_value
+    ydl.extract_info.return_value = {'title': 'Mix', 'entries': [
+        {'id': 'aaaaaaaaaaa', 'title': 'One'},
+        {'id': 'bbbbbbbbbbb', 'title': 'Two/Three', 'ie_key': 'Youtube'},
+        {'id': 'ccccccccccc', 'title': 'Four'},
+        {'id': 'UCchannel', 'title': 'Shorts', 'ie_key': 'YoutubeTab'},
+    ]}
+
+    def fake_download(info, download=True):
+        outtmpl = mock_ytdl.return_value.params['outtmpl']
+        with open(outtmpl.replace('%(ext)s', 'mp3'), 'wb') as f:
+            f.write(outtmpl.encode())
+        return info
+
+    ydl.process_ie_result.side_effect = fake_download
+
+    response = client.post('/playlist', json={
+        'url': 'https://www.youtube.com/playlist?list=PL123', 'format': 'mp3', 'concurrency': 2
+    })
+    batch_id = response.get_json()['batch_id']
+    scheduler._queue.pop()[2].run()
+
+    summary = client.get(f'/playlist/{batch_id}').get_json()
+    assert summary['total'] == 3
+    assert summary['title'] == 'Mix'
+    # Only `concurrency` children are handed to the scheduler at once
+    assert scheduler.stats()['queued'] == 2
+
+    # Children finish in the post-processing pool, which then submits the next one
+    while True:
+        wait_for_postprocessing()
+        if not scheduler._queue:
+            break
+        scheduler._queue.pop(0)[2].run()
+
+    summary = client.get(f'/playlist/{batch_id}').get_json()
+    assert summary['status'] == 'completed'
+    assert (summary['completed'], summary['progress']) == (3, 100.0)
+
+    response = client.get(f'/playlist/{batch_id}/zip')
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert archive.namelist() == ['001 - One.mp3', '002 - Two_Three.mp3', '003 - Four.mp3']
+    child = summary['children'][0]['task_id']
+    assert archive.read('001 - One.mp3') == open(download_tasks[child]['file_path'], 'rb').read()
+    assert download_tasks[child]['fetched_at']
+
+def test_playlist_endpoint_rejects_single_videos(client):
+    response = client.post('/playlist', json={'url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'})
+    assert response.status_code == 400
+    assert client.get('/playlist/unknown').status_code == 404
+
+    response = client.post('/playlist', json={'url': 'https://www.youtube.com/playlist?list=PL123',
+                                              'format': 'm4a', 'stream': True})
+    assert response.status_code == 400
+    assert 'not available for playlists' in response.get_json()['error']
+    assert scheduler.stats()['queued'] == 0
+
+def test_identical_requests_share_one_job(client):
+    request = {'url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'format': 'mp4', 'quality': 'low'}
+    first = client.post('/download', json=request).get_json()
+    second = client.post('/download', json=request).get_json()
+
+    assert first['task_id'] != second['task_id']
+    assert second['status'] == 'queued'
+    assert second['queue_position'] == 1
+    assert scheduler.stats()['queued'] == 1
+
+    # Progress published by the shared job reaches both tasks
+    thread = scheduler._queue[0][2]
+    thread.progress_hook({'status': 'downloading', 'downloaded_bytes': 1, 'total_bytes': 4, 'speed': None})
+    assert download_tasks[first['task_id']]['progress'] == 25.0
+    assert download_tasks[second['task_id']]['progress'] == 25.0
+
+    # A playlist item joining the job keeps its own identity and batch
+    from core.downloader import create_task, submit_task
+    update_task(first['task_id'], batch_id='batch-0', index=1, title='Primary', created_at=1.0)
+    item = create_task(request['url'], 'mp4', batch_id='batch-1', index=3, title='Item')
+    submit_task(item, request['url'], 'mp4', 'low')
+    task = download_tasks[item]
+    assert (task['batch_id'], task['index'], task['title']) == ('batch-1', 3, 'Item')
+    assert task['created_at'] > 1.0
+    assert task['progress'] == 25.0 and task['status'] == 'queued'
+
+def test_stream_and_regular_requests_use_separate_jobs(client):
+    from core.cache import cache_key
+
+    url = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+    regular = client.post('/download', json={'url': url, 'format': 'mp4', 'quality': 'low'}).get_json()
+    streamed = client.post('/download', json={'url': url, 'format': 'mp4', 'quality': 'low', 'stream': True}).get_json()
+
+    assert streamed['queue_position'] == 2
+    jobs = {entry[2].task_id: entry[2] for entry in scheduler._queue}
+    assert set(jobs) == {regular['task_id'], streamed['task_id']}
+    assert jobs[regular['task_id']].task_ids == [regular['task_id']]
+    assert not jobs[regular['task_id']].stream and jobs[streamed['task_id']].stream
+    assert cache_key(url, 'mp4', 'low', stream=True) != cache_key(url, 'mp4', 'low')
+
+@patch.dict(CONFIG, {'CACHE_ENABLED': False})
+@patch('yt_dlp.YoutubeDL')
+def test_shared_temp_file_removed_after_last_fetch(mock_ytdl, client):
+    from core.singleflight import inflight
+
+    def fake_download(info, download=True):
+        outtmpl = mock_ytdl.return_value.params['outtmpl']
+        with open(outtmpl.replace('%(ext)s', 'mp4'), 'wb') as f:
+            f.write(b'video')
+        return 0
+
+    mock_ytdl.return_value.process_ie_result.side_effect = fake_download
+
+    request = {'url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'format': 'mp4'}
+    first = client.post('/download', json=request).get_json()['task_id']
+    second = client.post('/download', json=request).get_json()['task_id']
+    scheduler._queue.pop()[2].run()
+
+    file_path = download_tasks[first]['file_path']
+    assert download_tasks[second]['file_path'] == file_path
+
+    client.get(f'/download/{first}').close()
+    assert inflight.active_jobs() == 0
+    assert download_tasks[first]['fetched_at']
+
+    # Only the fetched task expires; the shared file stays for the other one
+    expire_at = time.time() + CONFIG['DOWNLOAD_RETENTION_AFTER_FETCH']
+    assert reaper.sweep(expire_at) == [first]
+    assert os.path.exists(file_path)
+
+    client.get(f'/download/{second}').close()
+    assert reaper.sweep(time.time() + CONFIG['DOWNLOAD_RETENTION_AFTER_FETCH']) == [second]
+    assert not os.path.exists(file_path)
+    assert reaper.stats()['dirs_reclaimed'] >= 1
+
+def test_reaper_expires_old_tasks_and_enforces_budget(tmp_path):
+    def finished_task(task_id, finished_at, size):
+        temp_dir = tmp_path / task_id
+        temp_dir.mkdir()
+        (temp_dir / 'partial.part').write_bytes(b'x' * size)
+        temp_directories.add(str(temp_dir))
+        download_tasks[task_id] = {'status': 'error', 'format': 'mp4', 'url': '',
+                                   'temp_dir': str(temp_dir), 'finished_at': finished_at}
+        return temp_dir
+
+    now = time.time()
+    stale = finished_task('stale', now - CONFIG['TASK_TTL'] - 1, 10)
+    older = finished_task('older', now - 20, 60)
+    newer = finished_task('newer', now - 10, 60)
+    download_tasks['running'] = {'status': 'processing', 'format': 'mp4', 'url': ''}
+
+    with patch.dict(CONFIG, {'TEMP_DISK_BUDGET_BYTES': 100}):
+        assert reaper.sweep(now) == ['stale', 'older']
+
+    assert not stale.exists() and not older.exists() and newer.exists()
+    assert set(download_tasks) == {'newer', 'running'}
+    assert str(newer) in temp_directories and str(older) not in temp_directories
+    download_tasks.clear()
+    temp_directories.clear()
+
+def test_reaper_budget_spares_tasks_without_reclaimable_files(tmp_path):
+    now = time.time()
+    active_dir = tmp_path / 'active'
+    active_dir.mkdir()
+    (active_dir / 'download.mp4.part').write_bytes(b'x' * 200)
+    temp_directories.add(str(active_dir))
+    download_tasks['running'] = {'status': 'processing', 'format': 'mp4', 'url': '',
+                                 'temp_dir': str(active_dir)}
+    # Completed from the cache: the temp dir is gone and the file lives on
+    for i in range(3):
+        download_tasks[f'cached-{i}'] = {'status': 'completed', 'format': 'mp4', 'url': '',
+                                         'temp_dir': str(tmp_path / f'gone-{i}'),
+                                         'file_path': str(tmp_path / 'cache' / 'x-mp4-auto.mp4'),
+                                         'finished_at': now - 10 + i}
+    failed_dir = tmp_path / 'failed'
+    failed_dir.mkdir()
+    (failed_dir / 'download.mp4.part').write_bytes(b'x' * 50)
+    temp_directories.add(str(failed_dir))
+    download_tasks['failed'] = {'status': 'error', 'format': 'mp4', 'url': '',
+                                'temp_dir': str(failed_dir), 'finished_at': now}
+
+    with patch.dict(CONFIG, {'TEMP_DISK_BUDGET_BYTES': 100}):
+        assert reaper.sweep(now) == ['failed']
+
+    assert set(download_tasks) == {'running', 'cached-0', 'cached-1', 'cached-2'}
+    assert active_dir.exists() and not failed_dir.exists()
+    download_tasks.clear()
+    temp_directories.clear()
+
+def _merge_fields_in_worker(path, worker):
+    from core.task_store import SQLiteTaskStore
+    store = SQLiteTaskStore(path)
+    for i in range(20):
+        store.merge('shared-task', {f'worker{worker}-{i}': i})
+
+def test_sqlite_task_store_merges_from_multiple_processes(tmp_path):
+    import multiprocessing
+    from core.task_store import SQLiteTaskStore
+
+    path = str(tmp_path / 'tasks.db')
+    store = SQLiteTaskStore(path)
+    store['shared-task'] = {'status': 'processing'}
+
+    ctx = multiprocessing.get_context('spawn')
+    workers = [ctx.Process(target=_merge_fields_in_worker, args=(path, n)) for n in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+        assert worker.exitcode == 0
+
+    # Every read-modify-write from every process survived
+    task = store['shared-task']
+    assert len(task) == 1 + 4 * 20
+    assert store.merge('missing-task', {'status': 'error'}) is False
+
+def _submit_in_worker(results):
+    from app import app as worker_app
+    from core.scheduler import scheduler as worker_scheduler
+    worker_scheduler.pause()
+    response = worker_app.test_client().post('/download', json={
+        'url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+        'format': 'mp3'
+    })
+    results.put(response.get_json()['task_id'])
+
+def _status_in_worker(task_id, results):
+    from app import app as worker_app
+    response = worker_app.test_client().get(f'/status/{task_id}')
+    results.put((response.status_code, response.get_json()))
+
+def test_status_visible_across_worker_processes(tmp_path, monkeypatch):
+    import multiprocessing
+
+    monkeypatch.setenv('TASK_STORE', 'sqlite')
+    monkeypatch.setenv('TASK_STORE_PATH', str(tmp_path / 'tasks.db'))
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+
+    submitter = ctx.Process(target=_submit_in_worker, args=(results,))
+    submitter.start()
+    task_id = results.get(timeout=60)
+    submitter.join(30)
+
+    reader = ctx.Process(target=_status_in_worker, args=(task_id, results))
+    reader.start()
+    status_code, data = results.get(timeout=60)
+    reader.join(30)
+
+    assert status_code == 200
+    assert data['status'] == 'queued'
+    assert data['format'] == 'mp3'
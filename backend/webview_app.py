@@ -1,61 +1,93 @@
+import multiprocessing
+if __name__ == '__main__':
+    # 製品版ではダウンロード用のワーカープロセスもこの実行ファイルから起動される
+    multiprocessing.freeze_support()
+
+from startup import run_parallel, start_wsgi_server, startup_timer, wait_for_port
 import webview
-import threading
-import time
 import sys
-import os
-from app import app as flask_app
-
-def run_flask():
-    """Flaskアプリを実行する関数"""
-    # 製品版モードかどうかをチェック
-    is_production = getattr(sys, 'frozen', False)
-    
-    if is_production:
-        # 製品版: 静的ファイルサーバーを起動
-        # PyInstallerでビルドされた場合、実行ファイルと同じディレクトリにfrontend/distが配置される
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        frontend_dist = os.path.join(base_dir, 'frontend', 'dist')
-        if os.path.exists(frontend_dist):
-            from static_server import start_static_server
-            start_static_server(frontend_dist, port=5173)
-        else:
-            print("警告: フロントエンドのビルドファイルが見つかりません")
-            print(f"探しているパス: {frontend_dist}")
-    
+import time
+from app import app as flask_app, static_assets
+from api.routes import temp_directories
+from core.config import CONFIG, add_log
+from core.recovery import recover_jobs
+from core.ytdl import preload
+from static_server import frontend_dist_dir
+
+# モジュールの読み込みにかかった時間
+startup_timer.record('imports', startup_timer.origin)
+
+FRONTEND_PORT = 5173
+
+def start_api():
+    """APIサーバーを起動する関数（ソケットが待ち受けを始めたら戻る）"""
     # 製品版ではWaitress WSGIサーバーを使用、開発時はFlask開発サーバーを使用
-    if is_production:
-        # Waitressで本番サーバーを起動
-        from waitress import serve
-        serve(flask_app, host='127.0.0.1', port=5000)
-    else:
-        # 開発時はFlask開発サーバーを使用
-        flask_app.run(
-            host='127.0.0.1', 
-            port=5000, 
-            debug=False,
-            threaded=True,
-            use_reloader=False
-        )
+    threads = CONFIG['SERVER_THREADS'] if getattr(sys, 'frozen', False) else None
+    with startup_timer.phase('api'):
+        return start_wsgi_server(flask_app, '127.0.0.1', 5000, 'api-server', threads=threads)
+
+def frontend_url():
+    """ウィンドウに表示するURL"""
+    # 製品版: ビルド済みのフロントエンドはAPIサーバーがメモリから配信する
+    if static_assets is not None:
+        return 'http://127.0.0.1:5000/'
+    return f'http://127.0.0.1:{FRONTEND_PORT}'
+
+def start_frontend():
+    """フロントエンドを配信できる状態にする関数"""
+    if static_assets is not None:
+        return True
+    if getattr(sys, 'frozen', False):
+        print("警告: フロントエンドのビルドファイルが見つかりません")
+        print(f"探しているパス: {frontend_dist_dir()}")
+        return False
+    # 開発時はViteの開発サーバーが待ち受けを始めるまで待つ
+    with startup_timer.phase('frontend'):
+        return wait_for_port('127.0.0.1', FRONTEND_PORT, timeout=CONFIG['STARTUP_TIMEOUT'])
+
+def recover():
+    """前回の実行で終わらなかったダウンロードを再開する関数"""
+    with startup_timer.phase('recovery'):
+        return recover_jobs(temp_directories)
+
+def start_backend():
+    """API・静的ファイルサーバー・ジョブの復元を並行して行い、すべて準備できるまで待つ"""
+    # yt-dlpの読み込みはバックグラウンドで行い、ウィンドウの表示を待たせない
+    preload()
+    results = run_parallel({'api': start_api, 'frontend': start_frontend, 'recovery': recover},
+                           timeout=CONFIG['STARTUP_TIMEOUT'])
+    for name, (result, error) in results.items():
+        if error is not None:
+            add_log(f"Startup step {name} failed: {error}", 'ERROR')
+        elif name == 'frontend' and not result:
+            add_log("Frontend is not reachable, opening the window anyway", 'WARNING')
+    return results
+
+def on_loaded(loading_started):
+    """画面の読み込みが終わったら起動時間の内訳を記録する"""
+    def handler(*args):
+        if 'ui' not in startup_timer.durations():
+            startup_timer.record('ui', loading_started)
+            add_log(startup_timer.summary())
+    return handler
 
 if __name__ == '__main__':
-    # Flaskを別スレッドで起動
-    flask_thread = threading.Thread(target=run_flask, daemon=True)
-    flask_thread.start()
-    
-    # Flaskが起動するまで少し待つ
-    time.sleep(2)
-    
+    results = start_backend()
+    if results['api'][1] is not None:
+        sys.exit(1)
+
     # WebView2ウィンドウを作成
     window = webview.create_window(
         'YouTube Downloader',
-        'http://127.0.0.1:5173',  # フロントエンドの静的サーバー
+        frontend_url(),
         width=600,
         height=900,
         resizable=True,
         text_select=True,
         min_size=(900, 600)
     )
-    
+    window.events.loaded += on_loaded(time.monotonic())
+
     # WebView2を起動
     webview.start(
         gui='edgechromium',  # WebView2を使用
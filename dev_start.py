@@ -7,7 +7,7 @@
 import subprocess
 import sys
 import os
-import time
+import re
 import threading
 
 # 仮想環境のPythonパスを追加（WebView用）
@@ -21,6 +21,13 @@ if os.path.exists(venv_site_packages):
 # Pythonのパスを追加してモジュールをインポート可能に
 sys.path.insert(0, backend_dir)
 
+# 標準ライブラリだけで書かれているので、仮想環境の準備前でも読み込める
+from startup import StartupTimer, run_parallel, wait_for_http
+
+STARTUP_TIMEOUT = 60
+VITE_URL = re.compile(r'Local:\s+https?://[^:/\s]+:(\d+)')
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*m')
+
 def run_frontend_dev():
     """フロントエンド開発サーバーを起動"""
     print("🚀 フロントエンド開発サーバーを起動中...")
@@ -30,12 +37,24 @@ def run_frontend_dev():
         process = subprocess.Popen(['npm.cmd', 'run', 'dev'], 
                                  cwd=frontend_dir, 
                                  stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT,
                                  text=True,
                                  shell=True)
         
-        # ポート番号を検出するための待機
-        time.sleep(5)
+        # Viteが表示するURLからポート番号を検出する
+        process.vite_port = None
+        process.vite_ready = threading.Event()
+        
+        def watch_output(pipe):
+            for line in iter(pipe.readline, ''):
+                line = ANSI_ESCAPE.sub('', line).strip()
+                match = VITE_URL.search(line)
+                if match and not process.vite_ready.is_set():
+                    process.vite_port = int(match.group(1))
+                    process.vite_ready.set()
+            pipe.close()
+        
+        threading.Thread(target=watch_output, args=(process.stdout,), daemon=True).start()
         return process
         
     except FileNotFoundError:
@@ -45,12 +64,17 @@ def run_frontend_dev():
         print(f"❌ フロントエンドサーバー起動エラー: {e}")
         return None
 
-def run_flask_dev():
-    """Flask開発サーバーを起動（仮想環境内のPythonを使用）"""
+def run_flask_dev(frontend_dist=None):
+    """Flask開発サーバーを起動（仮想環境内のPythonを使用）
+
+    frontend_distを指定すると、ビルド済みのフロントエンドも同じサーバーから配信する
+    """
     print("🔧 Flask開発サーバーを起動中...")
     backend_dir = os.path.join(os.path.dirname(__file__), 'backend')
     venv_python = os.path.join(backend_dir, 'venv', 'Scripts', 'python.exe')
     
+    env = dict(os.environ, FRONTEND_DIST=frontend_dist) if frontend_dist else None
+    
     try:
         # 仮想環境内のPythonを使用してFlaskサーバーを起動（コンソール出力あり）
         process = subprocess.Popen([venv_python, 'app.py'], 
@@ -60,7 +84,8 @@ def run_flask_dev():
                                  text=True,
                                  shell=True,
                                  bufsize=1,  # 行バッファリング
-                                 universal_newlines=True)
+                                 universal_newlines=True,
+                                 env=env)
         
         # 非同期で出力を読み取り、ログを表示
         def log_output(pipe):
@@ -71,17 +96,6 @@ def run_flask_dev():
         # 別スレッドでログ出力
         log_thread = threading.Thread(target=log_output, args=(process.stdout,), daemon=True)
         log_thread.start()
-        
-        # サーバー起動を待機
-        time.sleep(5)
-        
-        # プロセスがまだ実行中か確認
-        if process.poll() is not None:
-            # プロセスが既に終了している場合はエラーを出力
-            print("❌ Flaskサーバーが異常終了しました")
-            return None
-        
-        print("✅ Flaskサーバーが起動しました")
         return process
         
     except FileNotFoundError:
@@ -91,36 +105,44 @@ def run_flask_dev():
         print(f"❌ Flaskサーバー起動エラー: {e}")
         return None
 
-def run_static_server():
-    """静的ファイルサーバーを起動（本番モード用）"""
-    print("📁 静的ファイルサーバーを起動中...")
-    frontend_dist = os.path.join(os.path.dirname(__file__), 'frontend', 'dist')
-    backend_dir = os.path.join(os.path.dirname(__file__), 'backend')
-    venv_python = os.path.join(backend_dir, 'venv', 'Scripts', 'python.exe')
-    
-    if os.path.exists(frontend_dist):
-        try:
-            # 仮想環境内のPythonを使用して静的サーバーを起動
-            subprocess.run([venv_python, '-c', 
-                          f'from static_server import start_static_server; start_static_server(r"{frontend_dist}", port=5173)'],
-                         cwd=backend_dir, check=True, shell=True)
-        except subprocess.CalledProcessError as e:
-            print(f"❌ 静的サーバー起動エラー: {e}")
-        except FileNotFoundError:
-            print("❌ 仮想環境のPythonが見つかりません。セットアップを確認してください")
-    else:
-        print("⚠️  フロントエンドのビルドファイルが見つかりません。先に npm run build を実行してください")
+def wait_for_flask(process, timer):
+    """Flaskのヘルスチェック（/）が応答するまで待機"""
+    with timer.phase('api'):
+        ready = wait_for_http('127.0.0.1', 5000, '/', timeout=STARTUP_TIMEOUT, process=process,
+                              ok=lambda status: status == 200)
+    if ready:
+        print("✅ Flaskサーバーが起動しました")
+    elif process.poll() is not None:
+        print("❌ Flaskサーバーが異常終了しました")
+    return ready
+
+def wait_for_vite(process, timer):
+    """Vite開発サーバーがURLを表示して応答するまで待機し、ポート番号を返す"""
+    with timer.phase('frontend'):
+        if not process.vite_ready.wait(STARTUP_TIMEOUT):
+            return None
+        port = process.vite_port
+        if not wait_for_http('localhost', port, '/', timeout=STARTUP_TIMEOUT, process=process):
+            return None
+    print(f"✅ フロントエンドサーバーが起動しました (ポート {port})")
+    return port
 
-def run_webview(port=5173):
+def print_startup_times(timer):
+    """起動にかかった時間の内訳を表示"""
+    print("⏱️  起動時間の内訳:")
+    for name, seconds in timer.durations().items():
+        print(f"   {name}: {seconds:.2f}s")
+    print(f"   合計: {timer.total():.2f}s")
+
+def run_webview(url='http://localhost:5173'):
     """WebView2アプリを起動"""
     print("🌐 WebView2アプリを起動中...")
     try:
         import webview
         
-        # 動的にポートを指定してフロントエンド開発サーバーを使用
         window = webview.create_window(
             'YouTube Downloader (開発モード)',
-            f'http://localhost:{port}',  # Vite開発サーバー
+            url,
             width=600,
             height=900,
             resizable=True,
@@ -217,56 +239,40 @@ if __name__ == '__main__':
     if mode == "1":
         # モード1: フロントエンド開発サーバー使用
         print("\n📍 開発モード: フロントエンドホットリロード有効")
+        timer = StartupTimer()
         
-        # フロントエンド開発サーバーを起動
+        # フロントエンド開発サーバーとFlaskサーバーを同時に起動
         frontend_process = run_frontend_dev()
         if not frontend_process:
             print("❌ フロントエンドサーバーの起動に失敗しました")
             sys.exit(1)
         
-        # Flaskサーバーを起動
         flask_process = run_flask_dev()
         if not flask_process:
             print("❌ Flaskサーバーの起動に失敗しました")
             frontend_process.terminate()
             sys.exit(1)
         
-        # サーバー起動待機（より長く待機）
-        time.sleep(5)
-        
-        # サーバーが正常に起動しているか確認（ソケットレベルでの接続テスト）
-        max_retries = 5
-        connected = False
-        for attempt in range(max_retries):
-            try:
-                # ソケットを使用した基本的な接続テスト
-                import socket
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(3)
-                result = sock.connect_ex(('127.0.0.1', 5000))
-                sock.close()
-                
-                if result == 0:
-                    print("✅ バックエンドサーバーが正常に起動しました")
-                    connected = True
-                    break
-                else:
-                    print(f"⏳ ポート接続試行 {attempt + 1}/{max_retries} 失敗、再試行します...")
-                    time.sleep(2)
-                    
-            except Exception as e:
-                if attempt == max_retries - 1:
-                    print(f"⚠️  バックエンドサーバーに接続できません: {e}")
-                else:
-                    print(f"⏳ 接続試行 {attempt + 1}/{max_retries} 失敗、再試行します...")
-                    time.sleep(2)
+        # 固定時間待つ代わりに、それぞれが応答するまで並行して待機
+        results = run_parallel({
+            'frontend': lambda: wait_for_vite(frontend_process, timer),
+            'api': lambda: wait_for_flask(flask_process, timer),
+        })
+        port = results['frontend'][0]
+        if port is None:
+            print("❌ フロントエンドサーバーが応答しません")
+            frontend_process.terminate()
+            flask_process.terminate()
+            sys.exit(1)
         
-        if not connected:
+        if not results['api'][0]:
             print("⚠️  バックエンドサーバーへの接続に失敗しましたが、開発を続行します")
             print("Flaskサーバーのログを確認: [Flask] * Running on http://127.0.0.1:5000")
         
+        print_startup_times(timer)
+        
         # WebView2を起動
-        run_webview()
+        run_webview(f'http://localhost:{port}')  # Vite開発サーバー
         
         # WebView終了後にすべてのプロセスを確実に終了
         try:
@@ -291,28 +297,30 @@ if __name__ == '__main__':
     elif mode == "2":
         # モード2: 静的ファイル使用
         print("\n📍 本番モード: ビルド済み静的ファイル使用")
+        timer = StartupTimer()
         
-        # 静的ファイルサーバーを起動
-        static_process = run_static_server()
-        if not static_process:
-            print("❌ 静的ファイルサーバーの起動に失敗しました")
+        frontend_dist = os.path.join(os.path.dirname(__file__), 'frontend', 'dist')
+        if not os.path.exists(frontend_dist):
+            print("⚠️  フロントエンドのビルドファイルが見つかりません。先に npm run build を実行してください")
             sys.exit(1)
         
-        # Flaskサーバーを起動
-        flask_process = run_flask_dev()
+        # ビルド済みのフロントエンドはFlaskサーバーがメモリから配信する
+        flask_process = run_flask_dev(frontend_dist)
         if not flask_process:
             print("❌ Flaskサーバーの起動に失敗しました")
-            static_process.terminate()
             sys.exit(1)
         
-        # サーバー起動待機
-        time.sleep(2)
+        if not wait_for_flask(flask_process, timer):
+            print("❌ サーバーが応答しません")
+            flask_process.terminate()
+            sys.exit(1)
         
-        # WebView2を起動
-        run_webview()
+        print_startup_times(timer)
+        
+        # WebView2を起動（APIと同じオリジンで表示する）
+        run_webview('http://localhost:5000/')
         
         # WebView終了後にすべてのプロセスを終了
-        static_process.terminate()
         flask_process.terminate()
         
     else:
@@ -1,4 +1,4 @@
-import { useState } from 'react';
+import { useRef, useState } from 'react';
 import {
   Container,
   TextField,
@@ -19,14 +19,18 @@ import {
 import { Download, MusicNote, VideoLibrary } from '@mui/icons-material';
 
 interface DownloadStatus {
-  status: 'processing' | 'completed' | 'error';
+  status: 'queued' | 'processing' | 'completed' | 'error';
   format: string;
   url: string;
   error?: string;
   progress?: number;
   speed?: string;
+  queue_position?: number | null;
 }
 
+// 表示するログの最大行数（バックエンドの MAX_LOG_MESSAGES と同じ）
+const MAX_LOG_LINES = 100;
+
 function App() {
   const [url, setUrl] = useState('');
   const [format, setFormat] = useState('mp4');
@@ -36,6 +40,7 @@ function App() {
   const [logs, setLogs] = useState<string[]>([]);
   const [showLogs, setShowLogs] = useState(false);
   const [logIntervalId, setLogIntervalId] = useState<number | null>(null);
+  const logCursor = useRef(0);
   const [snackbar, setSnackbar] = useState({ open: false, message: '', severity: 'info' as 'success' | 'error' | 'warning' | 'info' });
 
   const handleDownload = async () => {
@@ -56,12 +61,17 @@ function App() {
         body: JSON.stringify({ url, format, quality }),
       });
 
+      if (response.status === 429) {
+        const retryAfter = response.headers.get('Retry-After');
+        throw new Error(`サーバーが混雑しています。${retryAfter ?? '数'}秒後に再試行してください`);
+      }
+
       if (!response.ok) {
         throw new Error('ダウンロードリクエストに失敗しました');
       }
 
       const data = await response.json();
-      checkStatus(data.task_id);
+      watchStatus(data.task_id);
     } catch (err) {
       const errorMessage = err instanceof Error ? err.message : 'エラーが発生しました';
       showSnackbar(errorMessage, 'error');
@@ -69,6 +79,44 @@ function App() {
     }
   };
 
+  // ステータスを反映し、処理が終了した場合は true を返す
+  const applyStatus = (taskId: string, statusData: DownloadStatus) => {
+    setStatus(statusData);
+
+    if (statusData.status === 'completed') {
+      // ダウンロード完了したらファイルをダウンロード
+      window.open(`http://localhost:5000/download/${taskId}`, '_blank');
+      setLoading(false);
+      return true;
+    }
+    if (statusData.status === 'error') {
+      setLoading(false);
+      return true;
+    }
+    return false;
+  };
+
+  const watchStatus = (taskId: string) => {
+    // EventSource が使えない環境ではポーリングにフォールバック
+    if (typeof EventSource === 'undefined') {
+      checkStatus(taskId);
+      return;
+    }
+
+    const source = new EventSource(`http://localhost:5000/events/${taskId}`);
+    source.addEventListener('status', (event) => {
+      const statusData: DownloadStatus = JSON.parse((event as MessageEvent).data);
+      if (applyStatus(taskId, statusData)) {
+        source.close();
+      }
+    });
+    source.onerror = () => {
+      // ストリームが切断された場合はポーリングで継続
+      source.close();
+      checkStatus(taskId);
+    };
+  };
+
   const checkStatus = async (taskId: string) => {
     try {
       const response = await fetch(`http://localhost:5000/status/${taskId}`);
@@ -77,17 +125,9 @@ function App() {
       }
 
       const statusData: DownloadStatus = await response.json();
-      setStatus(statusData);
-
-      if (statusData.status === 'processing') {
-        // まだ処理中の場合は1秒後に再チェック
+      if (!applyStatus(taskId, statusData)) {
+        // 待機中または処理中の場合は1秒後に再チェック
         setTimeout(() => checkStatus(taskId), 1000);
-      } else if (statusData.status === 'completed') {
-        // ダウンロード完了したらファイルをダウンロード
-        window.open(`http://localhost:5000/download/${taskId}`, '_blank');
-        setLoading(false);
-      } else if (statusData.status === 'error') {
-        setLoading(false);
       }
     } catch (err) {
       const errorMessage = err instanceof Error ? err.message : 'ステータス確認中にエラーが発生しました';
@@ -150,10 +190,17 @@ function App() {
 
   const fetchLogs = async () => {
     try {
-      const response = await fetch('http://localhost:5000/logs');
+      // 前回取得以降の新しいログだけを取得
+      const response = await fetch(`http://localhost:5000/logs?since=${logCursor.current}`);
       if (response.ok) {
         const data = await response.json();
-        setLogs(data.logs);
+        if (data.cursor === undefined) {
+          // カーソル非対応のサーバーは毎回全件を返す
+          setLogs(data.logs);
+        } else {
+          logCursor.current = data.cursor;
+          setLogs((prev) => [...prev, ...data.logs].slice(-MAX_LOG_LINES));
+        }
         
         // ログ更新後に自動スクロール
         setTimeout(() => {
@@ -338,6 +385,14 @@ function App() {
           {/* ステータス表示 */}
           {status && (
             <Box mt={2}>
+              {status.status === 'queued' && (
+                <Box sx={{ display: 'flex', alignItems: 'center', mb: 1 }}>
+                  <CircularProgress size={16} sx={{ mr: 1 }} />
+                  <Typography variant="body2" color="text.secondary">
+                    待機中...{status.queue_position ? ` (${status.queue_position}番目)` : ''}
+                  </Typography>
+                </Box>
+              )}
               {status.status === 'processing' && (
                 <Box sx={{ width: '100%' }}>
                   <Box sx={{ display: 'flex', alignItems: 'center', mb: 1 }}>